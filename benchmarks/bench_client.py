@@ -0,0 +1,80 @@
+"""
+Load benchmark of the GitHubProject API calls against the fake GitHub API.
+
+Report the requests per second and the median and 99th percentile latency
+of ``get_project`` and ``create`` calls at several concurrency levels,
+and the throughput of ``iter_projects``.
+
+Usage::
+
+    python benchmarks/bench_client.py [requests] [latency in ms]
+"""
+from __future__ import with_statement
+import sys
+import time
+
+from github.tools.client import GitHubClient
+from github.tools.gh_pages import GitHubProject, Credentials
+from github.tools.pool import map_concurrently
+from github.tools.test.fake_github import FakeGitHub
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+
+def run(func, items, jobs):
+    def timed(item):
+        start = time.time()
+        func(item)
+        return time.time() - start
+    start = time.time()
+    latencies = map_concurrently(timed, items, jobs=jobs)
+    elapsed = time.time() - start
+    errors = [l for l in latencies if isinstance(l, Exception)]
+    if errors:
+        raise errors[0]
+    return len(items) / elapsed, latencies
+
+
+def report(name, jobs, rate, latencies):
+    print '%-14s %5d %10.1f %10.2f %10.2f' % (name, jobs, rate,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000)
+
+
+def main(count=500, latency=5):
+    credentials = Credentials('damien', 'xyz')
+    with FakeGitHub(latency=latency / 1000.0, rate_limit=10 ** 9,
+            page_size=100) as github:
+        for i in range(count):
+            github.add_repo('damien', 'project-%d' % i)
+        client = GitHubClient(github.url, max_idle=64)
+
+        print '%-14s %5s %10s %10s %10s' % (
+            'call', 'jobs', 'req/s', 'p50 (ms)', 'p99 (ms)')
+        for jobs in (1, 4, 16, 64):
+            rate, latencies = run(
+                lambda i: GitHubProject.get_project(
+                    'project-%d' % i, 'damien', client=client),
+                range(count), jobs)
+            report('get_project', jobs, rate, latencies)
+
+        for jobs in (1, 4, 16, 64):
+            rate, latencies = run(
+                lambda i: GitHubProject.create(
+                    'new-%d-%d' % (jobs, i), credentials, client=client),
+                range(count), jobs)
+            report('create', jobs, rate, latencies)
+
+        start = time.time()
+        listed = sum(1 for _ in GitHubProject.iter_projects(
+            'damien', client=client))
+        elapsed = time.time() - start
+        print '%-14s %5s %10.1f projects/s' % (
+            'iter_projects', '-', listed / elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,77 @@
+"""
+Decode large repository listings with the JSON backends, the incremental
+item decoder and the field projection.
+
+Two payloads are used: a GitHub API v2 listing (flat repository objects)
+and a v3-like one, where each repository embeds a large owner object and
+other nested values.
+
+Usage::
+
+    python benchmarks/bench_decoder.py [repositories] [repeat]
+"""
+import sys
+import timeit
+
+from github.tools import decoder
+from github.tools.gh_pages import PROJECT_FIELDS
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+
+def v2_repo(i):
+    return {
+        'name': 'project-%d' % i, 'owner': 'damien',
+        'description': 'Project number %d, with a longer description' % i,
+        'private': False, 'url': 'http://github.com/damien/project-%d' % i,
+        'homepage': '', 'watchers': i, 'forks': 0, 'fork': False,
+        'has_wiki': True, 'has_issues': True, 'has_downloads': True,
+        'open_issues': 0, 'pushed_at': '2010/09/09 10:00:00 -0700',
+        'created_at': '2009/04/19 10:00:00 -0700', 'size': 1024,
+        }
+
+
+def v3_repo(i):
+    repo = v2_repo(i)
+    owner = dict(('%s_url' % name,
+        'https://api.github.com/users/damien/%s' % name) for name in (
+            'followers', 'following', 'gists', 'starred', 'subscriptions',
+            'organizations', 'repos', 'events', 'received_events'))
+    owner.update(login='damien', id=1, type='User', site_admin=False)
+    repo['owner'] = owner
+    repo['permissions'] = {'admin': True, 'push': True, 'pull': True}
+    repo['topics'] = ['python', 'git', 'github', 'documentation']
+    repo.update(('%s_url' % name,
+        'https://api.github.com/repos/damien/project-%d/%s' % (i, name))
+        for name in ('branches', 'tags', 'issues', 'pulls', 'commits',
+            'releases', 'labels', 'milestones', 'hooks', 'contents'))
+    return repo
+
+
+def main(count=1000, repeat=5):
+    for label, factory in (('v2 listing', v2_repo), ('v3 listing', v3_repo)):
+        text = json.dumps({'repositories': [factory(i) for i in range(count)]})
+        print '%s: %d repositories, %d KB' % (label, count, len(text) // 1024)
+
+        def full(loads):
+            return lambda: [dict((f, r[f]) for f in PROJECT_FIELDS)
+                for r in loads(text)['repositories']]
+
+        cases = [('loads (%s)' % name, full(func))
+            for name, func, raw_decode in decoder._BACKENDS]
+        cases.append(('iter_json_items (%s)' % decoder.backend,
+            lambda: list(decoder.iter_json_items(text, 'repositories'))))
+        cases.append(('iter_projected_items',
+            lambda: list(decoder.iter_projected_items(
+                text, PROJECT_FIELDS, 'repositories'))))
+        for name, func in cases:
+            elapsed = min(timeit.Timer(func).repeat(repeat, 1))
+            print '    %-24s %8.2f ms %10.1f usec/repo' % (
+                name, elapsed * 1000, elapsed * 1e6 / count)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,41 @@
+"""
+Compare serial GitHubProject.get_project calls with the concurrent
+GitHubProject.get_projects, against the fake GitHub API with injected
+latency.
+
+Usage::
+
+    python benchmarks/bench_get_projects.py [projects] [latency in ms]
+"""
+from __future__ import with_statement
+import sys
+import time
+
+from github.tools.client import GitHubClient
+from github.tools.gh_pages import GitHubProject
+from github.tools.test.fake_github import FakeGitHub
+
+
+def main(count=200, latency=20):
+    names = [('damien', 'project-%d' % i) for i in range(count)]
+    with FakeGitHub(latency=latency / 1000.0, rate_limit=10 ** 9) as github:
+        for owner, name in names:
+            github.add_repo(owner, name)
+        client = GitHubClient(github.url, max_idle=32)
+
+        start = time.time()
+        for owner, name in names:
+            GitHubProject.get_project(name, owner, client=client)
+        serial = time.time() - start
+        print '%-16s %8.2fs %8.1f req/s' % ('serial', serial, count / serial)
+
+        for jobs in (4, 8, 16, 32):
+            start = time.time()
+            GitHubProject.get_projects(names, client=client, jobs=jobs)
+            elapsed = time.time() - start
+            print '%-16s %8.2fs %8.1f req/s' % (
+                'jobs=%d' % jobs, elapsed, count / elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
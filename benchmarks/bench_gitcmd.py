@@ -0,0 +1,64 @@
+"""
+Compare object lookups through a git process per call with the
+long-lived ``git cat-file`` processes of ``github.tools.gitcmd.CatFile``.
+
+The objects are named by their sha; with "<commit>:<path>" names, git
+parses the tree for each lookup and that cost dominates on large trees.
+
+Usage::
+
+    python benchmarks/bench_gitcmd.py [objects]
+"""
+from __future__ import with_statement
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools.gh_pages import Repo
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main(count=2000):
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = Repo.create(tmp)
+        for i in xrange(count):
+            with open('%s/file-%d.txt' % (tmp, i), 'w') as f:
+                f.write('content %d\n' % i)
+        repo.git.add('.')
+        repo.git.commit('-m', 'benchmark')
+        revs = [line.split()[2]
+            for line in repo.git.ls_tree('HEAD').splitlines()]
+        objects = repo.objects
+
+        cases = (
+            ('git cat-file -s per call',
+                lambda: [repo.git.cat_file('-s', rev) for rev in revs]),
+            ('git cat-file -p per call',
+                lambda: [repo.git.cat_file('-p', rev) for rev in revs]),
+            ('CatFile.info per call',
+                lambda: [objects.info(rev) for rev in revs]),
+            ('CatFile.read per call',
+                lambda: [objects.read(rev) for rev in revs]),
+            ('CatFile.info_many', lambda: objects.info_many(revs)),
+            ('CatFile.read_many', lambda: objects.read_many(revs)),
+            )
+        print '%d objects' % count
+        print '%-28s %10s %12s' % ('lookup', 'msec', 'usec/object')
+        for name, func in cases:
+            elapsed = _timed(func)
+            print '%-28s %10.1f %12.1f' % (
+                name, elapsed * 1000, elapsed * 1e6 / count)
+        repo.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
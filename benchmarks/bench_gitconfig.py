@@ -0,0 +1,53 @@
+"""
+Compare the cost of a config lookup through ``Git.config`` (one git
+process per lookup), a ``git config --list`` snapshot and the in-process
+config reader.
+
+Usage::
+
+    python benchmarks/bench_gitconfig.py [lookups]
+"""
+import sys
+import shutil
+import tempfile
+import timeit
+
+from git import Git
+
+from github.tools import gitconfig
+from github.tools.gh_pages import Repo
+
+
+def main(lookups=200):
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = Repo.create(tmp)
+        repo.git.config('github.user', 'damien')
+        _git = Git(tmp)
+
+        def git_config():
+            _git.config('github.user', with_exceptions=False)
+
+        def git_list():
+            gitconfig.GitConfig.from_git(tmp).get('github.user')
+
+        def python_reader():
+            gitconfig.GitConfig.read(tmp).get('github.user')
+
+        def cached():
+            gitconfig.get_config(tmp).get('github.user')
+
+        print '%-28s %12s' % ('lookup', 'usec/lookup')
+        for name, func in (
+                ('Git.config', git_config),
+                ('git config --list -z', git_list),
+                ('in-process reader', python_reader),
+                ('cached snapshot', cached)):
+            elapsed = timeit.Timer(func).timeit(lookups)
+            print '%-28s %12.1f' % (name, elapsed * 1e6 / lookups)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,67 @@
+"""
+Compare reading the submodule shas and status from a large git index with
+``git submodule status`` and with the in-process index reader.
+
+The index holds ``entries`` files and ``modules`` gitlinks (submodules that
+are registered but not checked out). The in-process reader is used whatever
+the index size; ``SubmoduleDict`` falls back to git past
+``gitfs.MAX_ENTRIES`` entries, where git gets faster.
+
+Usage::
+
+    python benchmarks/bench_gitfs.py [entries] [modules] [repeat]
+"""
+from __future__ import with_statement
+import sys
+import shutil
+import subprocess
+import tempfile
+import timeit
+
+from github.tools import gitfs, gh_pages
+from github.tools.gh_pages import Repo
+
+SHA = 'a' * 40
+
+
+def _populate(repo, entries, modules):
+    with open(repo.wd + '/blob.txt', 'w') as f:
+        f.write('testing...')
+    blob = repo.git.hash_object('-w', 'blob.txt')
+    lines = ['100644 %s\tdir%03d/file%d.txt' % (blob, i % 500, i)
+        for i in xrange(entries)]
+    lines.extend('160000 %s\tmodules/mod%d' % (SHA, i)
+        for i in xrange(modules))
+    proc = subprocess.Popen(['git', 'update-index', '--index-info'],
+        cwd=repo.wd, stdin=subprocess.PIPE)
+    proc.communicate('\n'.join(lines) + '\n')
+    with open(repo.wd + '/.gitmodules', 'w') as f:
+        for i in xrange(modules):
+            f.write('[submodule "mod%d"]\n\tpath = modules/mod%d\n'
+                '\turl = git@github.com:damien/mod%d.git\n' % (i, i, i))
+
+
+def main(entries=100000, modules=20, repeat=5):
+    tmp = tempfile.mkdtemp()
+    try:
+        gh_pages.MAX_ENTRIES = None
+        repo = Repo.create(tmp)
+        _populate(repo, entries, modules)
+        submodules = repo.submodules
+        names = [('mod%d' % i, 'modules/mod%d' % i) for i in xrange(modules)]
+
+        print 'index: %d entries, %d gitlinks' % (entries, modules)
+        print '%-28s %12s' % ('status of every submodule', 'msec')
+        for name, func in (
+                ('git submodule status', submodules._get_status),
+                ('read_gitlinks', lambda: gitfs.read_gitlinks(repo.path)),
+                ('read_gitlinks + HEADs',
+                    lambda: submodules._read_status(names))):
+            elapsed = min(timeit.Timer(func).repeat(repeat, 1))
+            print '%-28s %12.1f' % (name, elapsed * 1000)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,73 @@
+"""
+Compare parsing a .gitmodules file with thousands of submodules through
+``RawConfigParser`` (the former route), the complete config parser of
+``github.tools.gitconfig`` and ``github.tools.gitfs.parse_gitmodules``.
+
+The size reported is the memory held by the parsed result
+(``sys.getsizeof`` of its containers, keys and values).
+
+Usage::
+
+    python benchmarks/bench_gitmodules.py [submodules] [repeat]
+"""
+import sys
+import timeit
+from ConfigParser import RawConfigParser
+from StringIO import StringIO
+
+from github.tools import gitfs
+
+
+class _StrippedReader(StringIO):
+    # RawConfigParser doesn't parse indented lines
+    def readline(self, *args):
+        return StringIO.readline(self, *args).lstrip()
+
+
+def config_parser(text):
+    cfg = RawConfigParser()
+    cfg.readfp(_StrippedReader(text))
+    return cfg
+
+
+def config_reader(text):
+    return list(gitfs._iter_config_gitmodules(text))
+
+
+def _sizeof(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _sizeof(key, seen) + _sizeof(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += _sizeof(item, seen)
+    elif hasattr(obj, '__slots__'):
+        for name in obj.__slots__:
+            size += _sizeof(getattr(obj, name), seen)
+    elif hasattr(obj, '__dict__'):
+        size += _sizeof(obj.__dict__, seen)
+    return size
+
+
+def main(count=5000, repeat=5):
+    text = ''.join('[submodule "docs/module-%d"]\n'
+        '\tpath = docs/module-%d\n'
+        '\turl = git@github.com:damien/module-%d.git\n'
+        '\tbranch = gh-pages\n' % (i, i, i) for i in xrange(count))
+    print '.gitmodules: %d submodules, %d KB' % (count, len(text) // 1024)
+    print '%-24s %10s %12s' % ('parser', 'msec', 'result KB')
+    for name, func in (
+            ('RawConfigParser', config_parser),
+            ('gitconfig.iter_config', config_reader),
+            ('parse_gitmodules', gitfs.parse_gitmodules)):
+        elapsed = min(timeit.Timer(lambda: func(text)).repeat(repeat, 1))
+        size = _sizeof(func(text), set())
+        print '%-24s %10.1f %12d' % (name, elapsed * 1000, size // 1024)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
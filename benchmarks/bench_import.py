@@ -0,0 +1,63 @@
+"""
+Compare publishing a built site from a gh-pages working copy
+(``git add .`` and ``git commit``) with ``github.tools.publish.import_tree``
+(a single ``git fast-import`` process, no working copy), for the first
+publication and after a rebuild changing one page.
+
+Usage::
+
+    python benchmarks/bench_import.py [files]
+"""
+from __future__ import with_statement
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools.gh_pages import Repo
+from github.tools.publish import import_tree
+
+from bench_publish import _build
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main(count=20000):
+    tmp = tempfile.mkdtemp()
+    try:
+        checkout = os.path.join(tmp, 'checkout')
+        html = os.path.join(tmp, 'html')
+        project = os.path.join(tmp, 'project')
+        for directory in (checkout, html, project):
+            os.mkdir(directory)
+        working_copy = Repo.create(checkout)
+        repo = Repo.create(project)
+
+        def commit(version):
+            working_copy.git.add('.')
+            working_copy.git.commit('-q', '-m', 'version %d' % version)
+
+        def fast_import(version):
+            import_tree(repo.path, html, message='version %d' % version,
+                objects=repo.objects)
+
+        print '%d files' % count
+        for version, label in ((0, 'first publication'), (1, 'rebuilt site')):
+            _build(checkout, count, version)
+            _build(html, count, version)
+            print '%-18s %-16s %.3fs' % (
+                label, 'add and commit', _timed(lambda: commit(version)))
+            print '%-18s %-16s %.3fs' % (
+                label, 'fast-import', _timed(lambda: fast_import(version)))
+        repo.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,77 @@
+"""
+Measure the memory footprint of GitHubProject objects, compared to the
+previous layout (instance dictionaries and a ProjectUrl built eagerly).
+
+Use tracemalloc when it is available (Python 3.4+, or pytracemalloc);
+otherwise sum sys.getsizeof of each object and of its instance dictionary.
+
+Usage::
+
+    python benchmarks/bench_project_memory.py [projects]
+"""
+import gc
+import sys
+import time
+
+from github.tools.gh_pages import GitHubProject
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class LegacyUrl(object):
+
+    def __init__(self, project):
+        self.project = project
+
+
+class LegacyProject(object):
+
+    def __init__(self, name=None, owner=None, description=None,
+            is_public=None):
+        self.name = name
+        self.owner = owner
+        self.description = description
+        self.is_public = is_public
+        self._url = LegacyUrl(self)
+
+
+def _getsizeof(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def footprint(cls, count):
+    # the strings are shared by both layouts
+    names = ['project-%d' % i for i in range(count)]
+    gc.collect()
+    start = time.time()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        projects = [cls(name, 'damien', '', True) for name in names]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        projects = [cls(name, 'damien', '', True) for name in names]
+        size = sys.getsizeof(projects)
+        for project in projects:
+            size += _getsizeof(project)
+            url = project._url
+            if url is not None:
+                size += _getsizeof(url)
+    return size / float(count), time.time() - start
+
+
+def main(count=100000):
+    print '%-16s %14s %14s' % ('layout', 'bytes/project', 'build time')
+    for name, cls in (('legacy', LegacyProject), ('slots', GitHubProject)):
+        size, elapsed = footprint(cls, count)
+        print '%-16s %14.1f %13.3fs' % (name, size, elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
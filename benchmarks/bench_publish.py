@@ -0,0 +1,68 @@
+"""
+Compare ``git add .`` with ``github.tools.publish.stage_changes`` on a site
+rebuilt from scratch (every file rewritten, one page changed), and on a
+site where only one page was rewritten.
+
+Usage::
+
+    python benchmarks/bench_publish.py [files]
+"""
+from __future__ import with_statement
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools.gh_pages import Repo
+from github.tools.publish import stage_changes
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def _build(root, count, version, rewrite=True):
+    """
+    Write the site; only the first page content depends on ``version``.
+    """
+    for i in xrange(count):
+        if not rewrite and i:
+            break
+        directory = os.path.join(root, 'dir-%d' % (i % 100))
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        with open(os.path.join(directory, 'page-%d.html' % i), 'w') as f:
+            f.write('<html>page %d %s</html>\n' % (i, i and 'x' * 2000 or version))
+
+
+def main(count=20000):
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = Repo.create(tmp)
+        _build(tmp, count, 0)
+        repo.git.add('.')
+        repo.git.commit('-q', '-m', 'benchmark')
+        stage_changes(tmp, repo.git)
+
+        print '%d files' % count
+        version = 0
+        for label, rewrite in (('rebuilt site', True),
+                ('one page rewritten', False)):
+            for name, func in (
+                    ('git add .', lambda: repo.git.add('.')),
+                    ('stage_changes', lambda: stage_changes(tmp, repo.git))):
+                version += 1
+                _build(tmp, count, version, rewrite)
+                # let the files be older than the manifest
+                time.sleep(1)
+                print '%-20s %-14s %.3fs' % (label, name, _timed(func))
+                repo.git.commit('-q', '-m', 'version %d' % version)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,73 @@
+"""
+Compare the removal of a documentation tree by the former ``gh_pages_clean``
+loop (``rmtree`` or ``unlink`` per top-level entry) with
+``github.tools.fsutils.remove_paths`` on one and many threads, and with
+``move_aside`` (the time before the build can start when the tree is
+removed in the background).
+
+Usage::
+
+    python benchmarks/bench_remove.py [files] [jobs]
+"""
+from __future__ import with_statement
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools import fsutils
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def _build(root, count):
+    os.mkdir(root)
+    for i in xrange(count):
+        directory = os.path.join(root, 'dir-%d' % (i % 100),
+            'sub-%d' % (i % 7))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'page-%d.html' % i), 'w') as f:
+            f.write('page %d\n' % i)
+
+
+def _rmtree_entries(root):
+    for name in os.listdir(root):
+        entry = os.path.join(root, name)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        else:
+            os.unlink(entry)
+
+
+def _remove_entries(root, jobs):
+    fsutils.remove_paths(
+        [os.path.join(root, name) for name in os.listdir(root)], jobs=jobs)
+
+
+def main(count=50000, jobs=8):
+    tmp = tempfile.mkdtemp()
+    try:
+        root = os.path.join(tmp, 'html')
+        print '%d files, scandir %s' % (
+            count, fsutils._scandir is None and 'unavailable' or 'available')
+        for name, func in (
+                ('rmtree per entry', lambda: _rmtree_entries(root)),
+                ('remove_paths, 1 thread', lambda: _remove_entries(root, 1)),
+                ('remove_paths, %d threads' % jobs,
+                    lambda: _remove_entries(root, jobs)),
+                ('move_aside', lambda: fsutils.move_aside(root))):
+            _build(root, count)
+            print '%-26s %.3fs' % (name, _timed(func))
+            shutil.rmtree(root)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
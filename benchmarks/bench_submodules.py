@@ -0,0 +1,113 @@
+"""
+Measure building the submodules of a repository with thousands of
+submodules: the construction of ``Submodule`` objects compared to the
+previous layout (instance dictionaries and a ``git.Git`` handle built
+eagerly), a first ``SubmoduleDict`` parse and a refresh after an index
+change.
+
+Use tracemalloc when it is available (Python 3.4+, or pytracemalloc);
+otherwise sum sys.getsizeof of each object and of its instance dictionary.
+
+Usage::
+
+    python benchmarks/bench_submodules.py [submodules]
+"""
+from __future__ import with_statement
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from git import Git
+
+from github.tools.gh_pages import Repo, Submodule
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SHA = 'a' * 40
+
+
+class LegacySubmodule(object):
+
+    def __init__(self, repo, url, module_path, sha=None, status=None):
+        self.repo = repo
+        self.path = module_path.rstrip('/')
+        self.url = url
+        self.sha = sha
+        self.status = status
+        self.git = Git(self.path)
+
+
+def _getsizeof(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def footprint(cls, repo, records):
+    gc.collect()
+    start = time.time()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        modules = [cls(repo, url, path, SHA, ' ') for url, path in records]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        modules = [cls(repo, url, path, SHA, ' ') for url, path in records]
+        size = sys.getsizeof(modules)
+        for module in modules:
+            size += _getsizeof(module)
+            if isinstance(module, LegacySubmodule):
+                size += _getsizeof(module.git)
+    return size / float(len(records)), time.time() - start
+
+
+def _populate(repo, count):
+    with open(os.path.join(repo.wd, '.gitmodules'), 'w') as f:
+        for i in xrange(count):
+            f.write('[submodule "modules/mod%d"]\n\tpath = modules/mod%d\n'
+                '\turl = git@github.com:damien/mod%d.git\n' % (i, i, i))
+    proc = subprocess.Popen(['git', 'update-index', '--index-info'],
+        cwd=repo.wd, stdin=subprocess.PIPE)
+    proc.communicate(''.join(['160000 %s\tmodules/mod%d\n' % (SHA, i)
+        for i in xrange(count)]))
+
+
+def main(count=10000):
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = Repo.create(tmp)
+        records = [('git@github.com:damien/mod%d.git' % i, 'modules/mod%d' % i)
+            for i in xrange(count)]
+
+        print '%d submodules' % count
+        print '%-24s %16s %12s' % ('layout', 'bytes/submodule', 'build time')
+        for name, cls in (('legacy', LegacySubmodule), ('slots', Submodule)):
+            size, elapsed = footprint(cls, repo, records)
+            print '%-24s %16.1f %11.3fs' % (name, size, elapsed)
+
+        _populate(repo, count)
+        submodules = repo.submodules
+        start = time.time()
+        len(submodules)
+        print '%-24s %16s %11.3fs' % ('SubmoduleDict parse', '',
+            time.time() - start)
+        os.utime(os.path.join(repo.wd, '.gitmodules'), None)
+        submodules._stamp = None
+        start = time.time()
+        len(submodules)
+        print '%-24s %16s %11.3fs' % ('SubmoduleDict refresh', '',
+            time.time() - start)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
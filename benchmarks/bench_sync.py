@@ -0,0 +1,75 @@
+"""
+Compare the gh-pages working copy update of the default clean and build
+(every file removed, then written again) with a build in a staging
+directory synchronised by ``github.tools.fsutils.sync_tree``; each is
+followed by ``git add .``, which has to hash the files whose mtime changed.
+
+The files are written by both builds; the time to write them is reported
+apart.
+
+Usage::
+
+    python benchmarks/bench_sync.py [files]
+"""
+from __future__ import with_statement
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools.gh_pages import Repo
+from github.tools.fsutils import sync_tree
+
+from bench_publish import _build
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main(count=20000):
+    tmp = tempfile.mkdtemp()
+    try:
+        html = os.path.join(tmp, 'html')
+        staging = os.path.join(tmp, 'html-staging')
+        os.mkdir(html)
+        repo = Repo.create(html)
+        _build(html, count, 0)
+        repo.git.add('.')
+        repo.git.commit('-q', '-m', 'version 0')
+
+        def clean():
+            for name in os.listdir(html):
+                if name != '.git':
+                    shutil.rmtree(os.path.join(html, name))
+
+        def sync():
+            sync_tree(staging, html)
+            shutil.rmtree(staging)
+
+        print '%d files, one page changed' % count
+        print '%-18s %8s %8s %8s %8s' % (
+            '', 'prepare', 'write', 'sync', 'git add')
+        for version, (name, prepare, output, finish) in enumerate((
+                ('clean and build', clean, html, None),
+                ('staging and sync', lambda: os.mkdir(staging), staging,
+                    sync))):
+            # files written in the second the index was are hashed again
+            # by git ("racily clean").
+            time.sleep(1)
+            repo.git.update_index('--refresh')
+            times = [_timed(prepare),
+                _timed(lambda: _build(output, count, version + 1)),
+                finish and _timed(finish) or 0,
+                _timed(lambda: repo.git.add('.'))]
+            print '%-18s %7.3fs %7.3fs %7.3fs %7.3fs' % tuple([name] + times)
+            repo.git.commit('-q', '-m', 'version %d' % (version + 1))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,65 @@
+"""
+Compare the tree sha of a built site computed by git (``git add -A`` and
+``git write-tree``) with ``github.tools.publish.hash_tree``, on one thread
+and on a pool of threads, with and without a warm manifest.
+
+The hashing threads run concurrently only where hashlib releases the GIL
+(OpenSSL backed hashlib, for buffers over 2KB).
+
+Usage::
+
+    python benchmarks/bench_tree.py [files] [jobs]
+"""
+from __future__ import with_statement
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from github.tools.gh_pages import Repo
+from github.tools.publish import hash_tree, scan_changes
+
+from bench_publish import _build
+
+
+def _timed(func):
+    start = time.time()
+    result = func()
+    return time.time() - start, result
+
+
+def main(count=20000, jobs=8):
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = Repo.create(tmp)
+        _build(tmp, count, 0)
+        index = os.path.join(repo.path, 'index')
+
+        def write_tree():
+            if os.path.exists(index):
+                os.unlink(index)
+            repo.git.add('-A')
+            return repo.git.write_tree()
+
+        # let the files be older than the manifest
+        time.sleep(1)
+        manifest = scan_changes(tmp, repo.git)[1]
+
+        print '%d files' % count
+        for name, func in (
+                ('git add -A, write-tree (new index)', write_tree),
+                ('git write-tree (warm index)', repo.git.write_tree),
+                ('hash_tree, 1 thread', lambda: hash_tree(tmp, jobs=1)),
+                ('hash_tree, %d threads' % jobs,
+                    lambda: hash_tree(tmp, jobs=jobs)),
+                ('hash_tree, warm manifest',
+                    lambda: hash_tree(tmp, jobs=jobs, manifest=manifest))):
+            elapsed, sha = _timed(func)
+            print '%-36s %.3fs %s' % (name, elapsed, sha)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
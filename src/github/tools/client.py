@@ -0,0 +1,654 @@
+"""
+:Description: HTTP client for the GitHub API.
+
+The client keeps its connections alive and reuses them between requests,
+asks for gzip compressed responses and raises ``urllib2.HTTPError`` for
+error responses, like ``urllib2.urlopen`` does.
+
+GET responses can be kept in a ResponseCache; cached responses are
+revalidated with conditional requests and served again on a
+"304 Not Modified" response.
+
+A RateLimiter, shared by the clients, paces and prioritises the requests
+according to the rate limit headers of the API responses.
+
+Paginated resources are iterated page by page, the next page being fetched
+while the current one is consumed.
+"""
+from __future__ import with_statement
+from StringIO import StringIO
+from email.utils import parsedate_tz, mktime_tz
+from urllib import urlencode
+import hashlib
+import heapq
+import httplib
+import itertools
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib2
+import urlparse
+import zlib
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+__all__ = ['GitHubClient', 'Response', 'ResponseCache', 'RateLimiter']
+
+API_URL = 'http://github.com/api/v2/json/'
+
+
+class Response(object):
+    """
+    A fully read HTTP response.
+    
+    It is a read-only file-like object over the (decoded) response body.
+    """
+    
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self._fp = StringIO(body)
+    
+    def read(self, size=-1):
+        return self._fp.read(size)
+    
+    def readline(self, size=-1):
+        return self._fp.readline(size)
+    
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+    
+    def close(self):
+        self._fp.close()
+
+
+def _decode_body(body, encoding):
+    if encoding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # some servers send a raw deflate stream
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of GET responses with an ETag or Last-Modified header.
+    
+    :param directory: directory holding one file per cached URL, a JSON
+        document with the status, headers and body of the response.
+    :param max_size: total size, in bytes, of the cached files; the least
+        recently used ones are removed when it is exceeded.
+    
+    ``hits`` counts the responses served from the cache after a revalidation,
+    ``misses`` the responses that had to be downloaded.
+    
+    The cache is best-effort: read and write errors are ignored, and
+    responses whose body isn't UTF-8 encoded aren't cached.
+    """
+    
+    def __init__(self, directory, max_size=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def default(cls):
+        """
+        Cache in GITHUB_TOOLS_CACHE_DIR (default to ~/.cache/github-tools).
+        """
+        directory = os.environ.get('GITHUB_TOOLS_CACHE_DIR') \
+            or os.path.join(os.path.expanduser('~'), '.cache', 'github-tools')
+        return cls(directory)
+    
+    def get(self, url):
+        """
+        Return the cached Response for the url, or None.
+        """
+        file_path = self._path(url)
+        try:
+            f = open(file_path, 'rb')
+            try:
+                entry = json.loads(f.read())
+            finally:
+                f.close()
+            if entry['url'] != url:
+                return None
+            headers = dict([(name.encode('latin-1'), value.encode('latin-1'))
+                for name, value in entry['headers'].items()])
+            return Response(url, int(entry['status']),
+                entry['reason'].encode('latin-1'), headers,
+                entry['body'].encode('utf-8'))
+        except (IOError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+    
+    def revalidated(self, url, cached, headers):
+        """
+        Record a "304 Not Modified" response and return the cached response,
+        with its headers updated.
+        """
+        cached.headers.update(headers)
+        cached.headers.pop('content-length', None)
+        with self._lock:
+            self.hits += 1
+        self._touch(url)
+        return cached
+    
+    def set(self, url, response):
+        """
+        Record a downloaded response, and cache it if it can be revalidated.
+        """
+        with self._lock:
+            self.misses += 1
+        if 'etag' not in response.headers \
+                and 'last-modified' not in response.headers:
+            return
+        try:
+            body = response.body.decode('utf-8')
+        except UnicodeDecodeError:
+            return
+        # header values are kept as latin-1, like httplib reads them
+        headers = dict([(name.decode('latin-1'), value.decode('latin-1'))
+            for name, value in response.headers.items()
+            if name != 'content-encoding'])
+        data = json.dumps({
+            'url': url,
+            'status': response.status,
+            'reason': response.reason.decode('latin-1'),
+            'headers': headers,
+            'body': body,
+            })
+        file_path = self._path(url)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.rename(tmp_path, file_path)
+        except (IOError, OSError):
+            return
+        with self._lock:
+            index = self._get_index()
+            name = os.path.basename(file_path)
+            if name in index:
+                self._size -= index[name][1]
+            index[name] = [time.time(), len(data)]
+            self._size += len(data)
+            self._evict()
+    
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        with self._lock:
+            for name in list(self._get_index()):
+                self._remove(name)
+    
+    @staticmethod
+    def validators(response):
+        """
+        Return the conditional request headers to revalidate a response.
+        """
+        headers = {}
+        if 'etag' in response.headers:
+            headers['If-None-Match'] = response.headers['etag']
+        if 'last-modified' in response.headers:
+            headers['If-Modified-Since'] = response.headers['last-modified']
+        return headers
+    
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url).hexdigest())
+    
+    def _touch(self, url):
+        file_path = self._path(url)
+        now = time.time()
+        try:
+            os.utime(file_path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            entry = self._get_index().get(os.path.basename(file_path))
+            if entry is not None:
+                entry[0] = now
+    
+    def _get_index(self):
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        self._size = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for name in names:
+            if len(name) != 40:
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._index[name] = [st.st_mtime, st.st_size]
+            self._size += st.st_size
+        return self._index
+    
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+        entries = [(used, name) for name, (used, size) in self._index.items()]
+        entries.sort()
+        for used, name in entries:
+            if self._size <= self.max_size:
+                break
+            self._remove(name)
+    
+    def _remove(self, name):
+        used, size = self._index.pop(name)
+        self._size -= size
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+
+# The message of a secondary rate limit (or older "abuse detection") error.
+_SECONDARY_LIMIT = re.compile(r'secondary rate limit|abuse detection', re.I)
+
+
+def _retry_after(value, now):
+    """
+    Parse a Retry-After header value (a delay in seconds or an HTTP date).
+    """
+    try:
+        return max(0, float(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, mktime_tz(date) - now)
+
+
+class RateLimiter(object):
+    """
+    Schedule the requests to the API.
+    
+    :param rate: maximum number of requests per second.
+    :param burst: number of requests that can be sent at once.
+    :param max_backoff: maximum pause, in seconds, after a secondary rate
+        limit response without a Retry-After header.
+    
+    The requests are paced with a token bucket. The X-RateLimit-Remaining
+    and X-RateLimit-Reset headers pause every request once the quota is
+    exhausted, until it is reset. A "403 Forbidden" or "429 Too Many Requests"
+    response with a Retry-After header or a secondary rate limit message
+    pauses every request for the Retry-After delay (or an exponential
+    backoff) and halves the rate; the rate then recovers with each
+    successful response. Other "403" responses are permission errors.
+    
+    Waiting requests are served by priority (lowest value first) and then
+    in arrival order.
+    
+    ``waits`` and ``wait_time`` count the requests that had to wait and the
+    total time they spent waiting; ``throttled`` counts the rate limited
+    responses.
+    """
+    
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 5
+    PRIORITY_BULK = 10
+    
+    def __init__(self, rate=10.0, burst=10, max_backoff=60.0):
+        self.max_rate = self.rate = float(rate)
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self.tokens = float(burst)
+        self.remaining = None
+        self.reset = None
+        self.paused_until = 0
+        self.backoff = 0
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+        self._updated = time.time()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+    
+    def acquire(self, priority=PRIORITY_NORMAL):
+        """
+        Block until a request with that priority can be sent.
+        """
+        ticket = (priority, self._counter.next())
+        start = time.time()
+        waited = False
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = None
+                    if self._waiting[0] == ticket:
+                        delay = self._delay(time.time())
+                        if delay <= 0:
+                            break
+                    waited = True
+                    self._cond.wait(delay)
+                self.tokens -= 1
+                if self.remaining is not None:
+                    self.remaining -= 1
+                self.requests += 1
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            if waited:
+                self.waits += 1
+                self.wait_time += time.time() - start
+    
+    def update(self, status, headers, body=''):
+        """
+        Update the limits with the headers (and body) of a response.
+        
+        Return True if the response is a rate limit error and the request
+        should be sent again: a "403" or "429" response with an exhausted
+        quota, a Retry-After header or a secondary rate limit message.
+        """
+        now = time.time()
+        with self._cond:
+            try:
+                self.remaining = int(headers['x-ratelimit-remaining'])
+                self.reset = float(headers['x-ratelimit-reset'])
+            except (KeyError, ValueError):
+                pass
+            
+            if status not in (403, 429):
+                self.backoff = 0
+                self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+                return False
+            
+            retry_after = None
+            if 'retry-after' in headers:
+                retry_after = _retry_after(headers['retry-after'], now)
+            if retry_after is None and self.remaining == 0 \
+                    and self.reset is not None:
+                # primary rate limit: wait for the quota to be reset
+                # (X-RateLimit-Reset has a one second resolution).
+                pause_until = max(self.reset, now + 1)
+            elif retry_after is not None:
+                pause_until = now + retry_after
+                self.rate = max(self.max_rate / 64, self.rate / 2)
+            elif not _SECONDARY_LIMIT.search(body or ''):
+                # a plain permission error
+                return False
+            else:
+                # secondary rate limit without any delay: back off
+                self.backoff = min(self.max_backoff, max(1, self.backoff * 2))
+                pause_until = now + self.backoff
+                self.rate = max(self.max_rate / 64, self.rate / 2)
+            
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, pause_until)
+            self._cond.notify_all()
+            return True
+    
+    def _delay(self, now):
+        """
+        Return the time to wait before the next request can be sent.
+        """
+        elapsed = max(0, now - self._updated)
+        self._updated = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        
+        delay = self.paused_until - now
+        if self.remaining is not None and self.remaining <= 0 \
+                and self.reset is not None:
+            if self.reset > now:
+                delay = max(delay, self.reset - now)
+            else:
+                self.remaining = None
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return delay
+
+
+_NEXT_LINK = re.compile(r'<([^>]*)>[^,]*;\s*rel="?next"?')
+
+
+def _next_link(link):
+    """
+    Return the "next" url of a Link header, or None.
+    """
+    if not link:
+        return None
+    m = _NEXT_LINK.search(link)
+    if m is None:
+        return None
+    return m.group(1)
+
+
+class _Prefetch(object):
+    """
+    Call a function in a background thread and keep its result.
+    """
+    
+    def __init__(self, func, *args, **kw):
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run, args=(func, args, kw))
+        self._thread.setDaemon(True)
+        self._thread.start()
+    
+    def _run(self, func, args, kw):
+        try:
+            self._result = func(*args, **kw)
+        except:
+            self._exc_info = sys.exc_info()
+    
+    def result(self):
+        self._thread.join()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+# The methods a request can be sent again with, after a connection error.
+_IDEMPOTENT = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+
+class GitHubClient(object):
+    """
+    HTTP client for the GitHub API, with a pool of keep-alive connections.
+    
+    :param base_url: URL the request paths are relative to.
+    :param timeout: socket timeout, in seconds.
+    :param max_idle: number of idle connections kept per host.
+    
+    The client is thread-safe: each request uses its own connection,
+    taken from the pool of idle connections when one is available.
+    """
+    
+    user_agent = 'github-tools'
+    
+    def __init__(self, base_url=API_URL, timeout=30, max_idle=8, cache=None,
+            limiter=None, max_retries=3):
+        if not base_url.endswith('/'):
+            base_url += '/'
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.cache = cache
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self._idle = {}
+        self._lock = threading.Lock()
+    
+    def url(self, path):
+        """
+        Return the absolute URL of an API path.
+        """
+        return urlparse.urljoin(self.base_url, path)
+    
+    def get(self, path, headers=None, priority=RateLimiter.PRIORITY_NORMAL):
+        return self.request('GET', path, headers=headers, priority=priority)
+    
+    def post(self, path, data, headers=None,
+            priority=RateLimiter.PRIORITY_NORMAL):
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        return self.request(
+            'POST', path, urlencode(data), headers, priority=priority)
+    
+    def iter_pages(self, path, priority=RateLimiter.PRIORITY_BULK):
+        """
+        Iterate over the pages (Response) of a paginated resource,
+        following the "next" links of their Link header.
+        
+        The next page is fetched in the background while the current one
+        is consumed.
+        """
+        response = self.get(path, priority=priority)
+        while response is not None:
+            next_url = _next_link(response.getheader('link'))
+            prefetch = None
+            if next_url:
+                prefetch = _Prefetch(self.get, next_url, priority=priority)
+            yield response
+            response = None
+            if prefetch is not None:
+                response = prefetch.result()
+    
+    def request(self, method, path, body=None, headers=None,
+            priority=RateLimiter.PRIORITY_NORMAL):
+        """
+        Send a request and return its Response.
+        
+        Raise urllib2.HTTPError if the response status is 400 or above
+        (once the retries of a rate limited request are exhausted).
+        """
+        url = self.url(path)
+        scheme, netloc, req_path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            req_path = '%s?%s' % (req_path, query)
+        req_headers = {
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': self.user_agent,
+            }
+        req_headers.update(headers or {})
+        
+        cached = None
+        if self.cache is not None and method == 'GET':
+            cached = self.cache.get(url)
+            if cached is not None:
+                req_headers.update(ResponseCache.validators(cached))
+        
+        key = (scheme, netloc)
+        retries = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(priority)
+            resp, data = self._fetch(key, method, req_path, body, req_headers)
+            resp_headers = dict(resp.getheaders())
+            if resp.status != 304:
+                data = _decode_body(data, resp_headers.get('content-encoding'))
+            if self.limiter is None \
+                    or not self.limiter.update(
+                        resp.status, resp_headers, data) \
+                    or retries >= self.max_retries:
+                break
+            retries += 1
+        
+        if resp.status == 304 and cached is not None:
+            return self.cache.revalidated(url, cached, resp_headers)
+        response = Response(url, resp.status, resp.reason, resp_headers, data)
+        if resp.status >= 400:
+            raise urllib2.HTTPError(
+                url, resp.status, resp.reason, resp.msg, StringIO(data))
+        if self.cache is not None and method == 'GET':
+            self.cache.set(url, response)
+        return response
+    
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+    
+    def _fetch(self, key, method, path, body, headers):
+        """
+        Send a request on a pooled connection and read its response.
+        """
+        conn, reused = self._get_connection(key)
+        sent = False
+        try:
+            try:
+                conn.request(method, path, body, headers)
+                sent = True
+                resp = conn.getresponse()
+            except (socket.error, httplib.BadStatusLine,
+                    httplib.CannotSendRequest):
+                # The server might have closed an idle connection. A request
+                # that isn't idempotent is only sent again if it failed
+                # before it could reach the server.
+                conn.close()
+                if not reused or (sent and method not in _IDEMPOTENT):
+                    raise
+                conn = self._new_connection(key)
+                resp = self._send(conn, method, path, body, headers)
+            data = resp.read()
+        except:
+            conn.close()
+            raise
+        
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release_connection(key, conn)
+        return resp, data
+    
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body, headers)
+        return conn.getresponse()
+    
+    def _new_connection(self, key):
+        scheme, netloc = key
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        return httplib.HTTPConnection(netloc, timeout=self.timeout)
+    
+    def _get_connection(self, key):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self._new_connection(key), False
+    
+    def _release_connection(self, key, conn):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle:
+                connections.append(conn)
+                return
+        conn.close()
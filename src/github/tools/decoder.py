@@ -0,0 +1,182 @@
+"""
+:Description: JSON decoding of the GitHub API responses.
+
+The fastest JSON library available is picked at import time (ujson,
+simplejson with its C extension, or the standard json module); set the
+``GITHUB_TOOLS_JSON`` environment variable to one of those names to force
+one.
+
+Listings are decoded one item at a time with the backend's decoder
+(simplejson or json), and the projection functions only keep the members
+they are asked for, so that the decoded listing isn't held in memory.
+ujson has no incremental decoder: with it, a listing is decoded at once.
+"""
+import os
+import re
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+__all__ = [
+    'loads', 'load', 'set_backend', 'available_backends',
+    'iter_json_items', 'project', 'iter_projected_items']
+
+
+def _backends():
+    backends = []
+    try:
+        import ujson
+    except ImportError:
+        pass
+    else:
+        backends.append(('ujson', ujson.loads, None))
+    try:
+        import simplejson
+    except ImportError:
+        pass
+    else:
+        if getattr(simplejson, '_speedups', None) is not None:
+            backends.append(('simplejson', simplejson.loads,
+                simplejson.JSONDecoder().raw_decode))
+    backends.append(('json', json.loads, json.JSONDecoder().raw_decode))
+    return backends
+
+
+_BACKENDS = _backends()
+backend = None
+loads = None
+# The backend's ``raw_decode(text, pos)`` function, if it has one.
+_raw_decode = None
+
+
+def available_backends():
+    """
+    Return the names of the available backends, fastest first.
+    """
+    return [backend[0] for backend in _BACKENDS]
+
+
+def set_backend(name=None):
+    """
+    Use the named backend, or the fastest available one.
+    """
+    global backend, loads, _raw_decode
+    for backend_name, func, raw_decode in _BACKENDS:
+        if name is None or name == backend_name:
+            backend, loads, _raw_decode = backend_name, func, raw_decode
+            return
+    raise ValueError('JSON backend "%s" is not available.' % name)
+
+
+set_backend(os.environ.get('GITHUB_TOOLS_JSON') or None)
+
+
+def load(fp):
+    """
+    Decode a JSON document from a file-like object.
+    """
+    return loads(fp.read())
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _find_member(text, pos, key):
+    """
+    Return the position of the ``key`` member value of the object starting
+    at ``pos``, or None if the object has no such member.
+    """
+    if text[pos:pos + 1] != '{':
+        raise ValueError('Expected a JSON object at %d' % pos)
+    pos = _WHITESPACE.match(text, pos + 1).end()
+    while text[pos:pos + 1] != '}':
+        name, pos = _raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise ValueError('Expected ":" at %d' % pos)
+        pos = _WHITESPACE.match(text, pos + 1).end()
+        if name == key:
+            return pos
+        value, pos = _raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] == ',':
+            pos = _WHITESPACE.match(text, pos + 1).end()
+    return None
+
+
+def iter_json_items(text, key=None):
+    """
+    Decode the items of a JSON array one at a time.
+
+    The array is either the whole document or, if ``key`` is set,
+    the ``key`` member of the document's object.
+    """
+    if _raw_decode is None:
+        for item in _iter_decoded_items(text, key):
+            yield item
+        return
+    pos = _WHITESPACE.match(text, 0).end()
+    if key is not None:
+        pos = _find_member(text, pos, key)
+        if pos is None:
+            return
+    if text[pos:pos + 1] != '[':
+        raise ValueError('Expected a JSON array at %d' % pos)
+    pos = _WHITESPACE.match(text, pos + 1).end()
+    if text[pos:pos + 1] == ']':
+        return
+    while True:
+        item, pos = _raw_decode(text, pos)
+        yield item
+        pos = _WHITESPACE.match(text, pos).end()
+        c = text[pos:pos + 1]
+        if c == ']':
+            return
+        if c != ',':
+            raise ValueError('Expected "," or "]" at %d' % pos)
+        pos = _WHITESPACE.match(text, pos + 1).end()
+
+
+def _iter_decoded_items(text, key):
+    """
+    Decode the whole document, for a backend without a raw decoder, and
+    iterate over the items of the array.
+    """
+    items = loads(text)
+    if key is not None:
+        if not isinstance(items, dict):
+            raise ValueError('Expected a JSON object')
+        if key not in items:
+            return
+        items = items[key]
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array')
+    for item in items:
+        yield item
+
+
+def _project(obj, fields):
+    return dict([(name, obj[name]) for name in fields if name in obj])
+
+
+def iter_projected_items(text, fields, key=None):
+    """
+    Like iter_json_items, for an array of objects; only the ``fields``
+    members of each object are kept.
+    """
+    for item in iter_json_items(text, key):
+        yield _project(item, fields)
+
+
+def project(text, fields, key=None):
+    """
+    Return the ``fields`` members of a JSON object; the object is either the
+    whole document or, if ``key`` is set, the ``key`` member of the
+    document's object.
+    """
+    obj = loads(text)
+    if key is not None:
+        obj = obj[key]
+    return _project(obj, fields)
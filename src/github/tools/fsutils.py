@@ -0,0 +1,260 @@
+"""
+:Description: File system helpers for the documentation trees.
+
+``sync_tree`` makes a directory a copy of another one, like rsync: the
+new and modified files are moved into place (renamed, when both trees are
+on the same file system), the stale ones are removed, and the unchanged
+ones are left untouched, keeping their inode and mtime, so that git's stat
+checks still skip them.
+
+``remove_paths`` removes large trees: the files are unlinked on a pool of
+threads, the directories listed with ``scandir`` when it's available (Python
+3.5+, or the scandir package) to avoid a stat call per entry.
+``move_aside`` and ``remove_in_background`` let a tree be replaced at once
+and deleted while the new one is written.
+"""
+from __future__ import with_statement
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+from github.tools.pool import map_concurrently
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+__all__ = [
+    'same_file', 'sync_tree', 'remove_paths', 'move_aside',
+    'remove_in_background']
+
+_READ_SIZE = 65536
+# Files unlinked per pool task.
+_REMOVE_BATCH = 256
+
+
+def _same_content(path_a, path_b, size):
+    """
+    Compare the first ``size`` bytes of two files.
+    """
+    with open(path_a, 'rb') as file_a:
+        with open(path_b, 'rb') as file_b:
+            while size > 0:
+                chunk = file_a.read(min(size, _READ_SIZE))
+                if not chunk or chunk != file_b.read(len(chunk)):
+                    return False
+                size -= len(chunk)
+    return True
+
+
+def same_file(path_a, path_b, st_a=None, st_b=None):
+    """
+    Tell if two files or symlinks have the same type, permissions
+    and content.
+    """
+    if st_a is None:
+        st_a = os.lstat(path_a)
+    if st_b is None:
+        st_b = os.lstat(path_b)
+    if st_a.st_mode != st_b.st_mode:
+        return False
+    if stat.S_ISLNK(st_a.st_mode):
+        return os.readlink(path_a) == os.readlink(path_b)
+    if not stat.S_ISREG(st_a.st_mode) or st_a.st_size != st_b.st_size:
+        return False
+    return _same_content(path_a, path_b, st_a.st_size)
+
+
+def _lstat(file_path):
+    try:
+        return os.lstat(file_path)
+    except OSError, e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return None
+        raise
+
+
+def _remove(file_path, st):
+    if stat.S_ISDIR(st.st_mode):
+        shutil.rmtree(file_path)
+    else:
+        os.unlink(file_path)
+
+
+def _move(source, dest, st):
+    """
+    Move a file or a directory; copy it if it's on another file system.
+    """
+    try:
+        os.rename(source, dest)
+    except OSError, e:
+        if e.errno != errno.EXDEV:
+            raise
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(source), dest)
+        elif stat.S_ISDIR(st.st_mode):
+            shutil.copytree(source, dest, symlinks=True)
+        else:
+            shutil.copy2(source, dest)
+
+
+def _sync_dir(source, dest, exclude, counts):
+    """
+    Synchronise the ``dest`` directory with ``source``; ``counts`` holds
+    the numbers of kept, updated and removed entries.
+    """
+    source_names = set(os.listdir(source)) - exclude
+    for name in sorted(set(os.listdir(dest)) - exclude - source_names):
+        dest_path = os.path.join(dest, name)
+        _remove(dest_path, os.lstat(dest_path))
+        counts[2] += 1
+    for name in sorted(source_names):
+        source_path = os.path.join(source, name)
+        dest_path = os.path.join(dest, name)
+        source_st = os.lstat(source_path)
+        dest_st = _lstat(dest_path)
+        if dest_st is not None:
+            if stat.S_ISDIR(source_st.st_mode) \
+                    and stat.S_ISDIR(dest_st.st_mode):
+                _sync_dir(source_path, dest_path, frozenset(), counts)
+                continue
+            if same_file(source_path, dest_path, source_st, dest_st):
+                counts[0] += 1
+                continue
+            _remove(dest_path, dest_st)
+        _move(source_path, dest_path, source_st)
+        counts[1] += 1
+
+
+def sync_tree(source, dest, exclude=('.git',)):
+    """
+    Make ``dest`` a copy of the ``source`` directory.
+
+    The new and modified entries are moved from ``source`` (a new directory
+    as a whole), the entries missing from ``source`` are removed, and the
+    unchanged files are left in place. The ``exclude`` names at the top of
+    ``dest`` are kept.
+
+    Return the numbers of kept, updated and removed entries.
+    """
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    counts = [0, 0, 0]
+    _sync_dir(source, dest, frozenset(exclude), counts)
+    return tuple(counts)
+
+
+def _list_dir(path):
+    """
+    Return the paths of the sub-directories and of the other entries
+    (symlinks to directories included) of a directory.
+    """
+    dirs = []
+    others = []
+    if _scandir is not None:
+        for entry in _scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            else:
+                others.append(entry.path)
+        return dirs, others
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        if stat.S_ISDIR(os.lstat(entry_path).st_mode):
+            dirs.append(entry_path)
+        else:
+            others.append(entry_path)
+    return dirs, others
+
+
+def _unlink_all(paths):
+    for file_path in paths:
+        os.unlink(file_path)
+    return len(paths)
+
+
+def remove_paths(paths, jobs=8, callback=None):
+    """
+    Remove files and directory trees; the files are unlinked on ``jobs``
+    threads, then the directories removed, the deepest first.
+
+    ``callback``, if set, is called with the number of files removed so
+    far, after each batch. Return the number of files removed.
+    """
+    dirs = []
+    files = []
+    for entry_path in paths:
+        if stat.S_ISDIR(os.lstat(entry_path).st_mode):
+            dirs.append(entry_path)
+        else:
+            files.append(entry_path)
+    # the directories are listed before their sub-directories
+    i = 0
+    while i < len(dirs):
+        sub_dirs, others = _list_dir(dirs[i])
+        dirs.extend(sub_dirs)
+        files.extend(others)
+        i += 1
+
+    lock = threading.Lock()
+    removed = [0]
+    def report(batch, count):
+        if isinstance(count, Exception):
+            return
+        with lock:
+            removed[0] += count
+            if callback is not None:
+                callback(removed[0])
+    batches = [files[i:i + _REMOVE_BATCH]
+        for i in xrange(0, len(files), _REMOVE_BATCH)]
+    for result in map_concurrently(_unlink_all, batches, jobs=jobs,
+            callback=report):
+        if isinstance(result, Exception):
+            raise result
+    for dir_path in reversed(dirs):
+        os.rmdir(dir_path)
+    return removed[0]
+
+
+def move_aside(root, exclude=('.git',), trash_dir=None):
+    """
+    Move the entries of ``root``, but the ``exclude`` names, to a new
+    directory in ``trash_dir`` (default to the parent of ``root``), which
+    must be on the same file system; return that directory.
+    """
+    root = os.path.abspath(root)
+    parent, name = os.path.split(root)
+    if trash_dir is None:
+        trash_dir = parent
+    trash = tempfile.mkdtemp(prefix='.%s-trash-' % name, dir=trash_dir)
+    for name in os.listdir(root):
+        if name not in exclude:
+            os.rename(os.path.join(root, name), os.path.join(trash, name))
+    return trash
+
+
+def remove_in_background(paths, jobs=8, callback=None):
+    """
+    Start removing files and directory trees on a thread, and return it.
+
+    The thread isn't a daemon: the interpreter waits for the removal to
+    finish before exiting. ``callback``, if set, is called with the number
+    of files removed, or with the error if the removal failed.
+    """
+    def remove():
+        try:
+            count = remove_paths(paths, jobs=jobs)
+        except Exception, e:
+            count = e
+        if callback is not None:
+            callback(count)
+    thread = threading.Thread(target=remove)
+    thread.start()
+    return thread
@@ -2,18 +2,20 @@
 Github-tools Models. 
 """
 from __future__ import with_statement
-from urllib import urlencode
-from ConfigParser import RawConfigParser
-import urllib2
 import os
-from git.errors import GitCommandError
+import tempfile
+import threading
 
-try:
-    import json #@UnresolvedImport
-except ImportError:
-    import simplejson as json
+from git import Repo as _Repo
 
-from git import Git, Repo as _Repo
+from github.tools.client import GitHubClient, ResponseCache, RateLimiter
+from github.tools import decoder
+from github.tools.gitcmd import CatFile, Git
+from github.tools.gitconfig import get_config, ConfigError, _parse_bool
+from github.tools.gitfs import UnsupportedIndex, MAX_ENTRIES, GITLINK_MODE,\
+    UnsupportedRefs, Gitmodule, active_branch, format_gitmodules,\
+    read_gitlinks, read_gitmodules, read_head, resolve_ref, work_git_dir
+from github.tools.pool import map_concurrently
 
 
 class Credentials(object):
@@ -34,39 +36,87 @@ class Credentials(object):
         Get credentials from the github.user and github.token config values
         """
         if repo:
-            _git = repo.git
+            config = get_config(repo.git.get_dir)
         else:
-            _git = Git(os.getcwd())
+            config = get_config(os.getcwd())
         return cls(
-            user=_git.config('github.user', with_exceptions=False),
-            token=_git.config('github.token', with_exceptions=False)
+            user=config.get('github.user'),
+            token=config.get('github.token')
             )
 
 
+# Project details used by GitHubProject.
+PROJECT_FIELDS = ('name', 'owner', 'description', 'private')
+
+
 class GitHubProject(object):
     """
     GitHub project class
+    
+    Projects use slots and create their ProjectUrl on first use,
+    to keep large lists of projects compact.
     """
     
+    __slots__ = ('_name', '_owner', 'description', 'is_public', '_url')
+    
+    # GitHubClient shared by the API calls (with a ResponseCache and
+    # a RateLimiter); created on first use.
+    client = None
+    
     def __init__(self,
                 name= None,
                 owner=None,
                 description=None,
                 is_public=None):
-        self.name = name
-        self.owner = owner
+        self._url = None
+        self._name = name
+        self._owner = owner
         self.description = description
         self.is_public = is_public
-        self._url = ProjectUrl(self)
+    
+    def _get_name(self):
+        return self._name
+    
+    def _set_name(self, name):
+        self._name = name
+        if self._url is not None:
+            self._url.clear()
+    
+    name = property(_get_name, _set_name, doc="Project name.")
+    
+    def _get_owner(self):
+        return self._owner
+    
+    def _set_owner(self, owner):
+        self._owner = owner
+        if self._url is not None:
+            self._url.clear()
+    
+    owner = property(_get_owner, _set_owner, doc="Project owner login.")
+    del _get_name, _set_name, _get_owner, _set_owner
     
     @property
     def url(self):
+        if self._url is None:
+            self._url = ProjectUrl(self)
         return self._url
     
+    @classmethod
+    def get_client(cls, client=None):
+        """
+        Return ``client`` or, if it's None, the shared GitHubClient.
+        """
+        if client is not None:
+            return client
+        if cls.client is None:
+            cls.client = GitHubClient(
+                cache=ResponseCache.default(), limiter=RateLimiter())
+        return cls.client
+    
     @classmethod
     def create(cls,
         project_name, credentials,
-        description='', is_public=True):
+        description='', is_public=True, client=None):
         """
         Create a new GitHub project.
         """ 
@@ -76,22 +126,62 @@ class GitHubProject(object):
             name=project_name,
             description=description,
             public=int(is_public))
-        url = 'http://github.com/api/v2/json/repos/create'
-        json_details = urllib2.urlopen(url, urlencode(data))
+        json_details = cls.get_client(client).post(
+            'repos/create', data, priority=RateLimiter.PRIORITY_HIGH)
         return cls.get_project_from_json(json_details)
     
     @classmethod
-    def get_project(cls, project_name, owner):
+    def get_project(cls, project_name, owner, client=None,
+        priority=RateLimiter.PRIORITY_NORMAL):
         """Fetch the project details from GitHub"""
-        url = "http://github.com/api/v2/json/repos/show/%s/%s" % (
-            owner, project_name)
-        json_details = urllib2.urlopen(url)
+        json_details = cls.get_client(client).get(
+            'repos/show/%s/%s' % (owner, project_name), priority=priority)
         return cls.get_project_from_json(json_details)
     
+    @classmethod
+    def get_projects(cls, names, client=None, jobs=8):
+        """
+        Fetch the details of many projects concurrently.
+        
+        :param names: sequence of (owner, project_name) tuples.
+        :param jobs: maximum number of concurrent requests.
+        
+        Return a list of GitHubProject, in the order of ``names``. The entry
+        of a project that couldn't be fetched is the exception raised
+        (e.g. a ``urllib2.HTTPError``).
+        """
+        client = cls.get_client(client)
+        def fetch(name):
+            owner, project_name = name
+            return cls.get_project(project_name, owner, client=client,
+                priority=RateLimiter.PRIORITY_BULK)
+        return map_concurrently(fetch, names, jobs=jobs)
+    
+    @classmethod
+    def iter_projects(cls, owner, client=None):
+        """
+        Iterate over the projects of a GitHub user or organisation.
+        
+        The listing is fetched page by page (the next page being fetched
+        while the current one is consumed) and each project decoded
+        when it's needed; only two pages are held in memory.
+        """
+        pages = cls.get_client(client).iter_pages('repos/show/%s' % owner)
+        for page in pages:
+            for details in decoder.iter_projected_items(
+                    page.body, PROJECT_FIELDS, 'repositories'):
+                yield cls.from_details(details)
+    
     @classmethod
     def get_project_from_json(cls, json_details):    
-        details = json.load(json_details)['repository']
-        return GitHubProject(
+        details = decoder.project(
+            json_details.read(), PROJECT_FIELDS, 'repository')
+        return cls.from_details(details)
+    
+    @classmethod
+    def from_details(cls, details):
+        """Create a project from its decoded API details."""
+        return cls(
             name=details['name'],
             owner=details['owner'],
             description=details['description'],
@@ -101,7 +191,12 @@ class GitHubProject(object):
 class ProjectUrl(object):
     """
     Holds the different GitHub urls of a project.
+    
+    The urls are memoized until the project name or owner change.
     """
+    
+    __slots__ = ('project', '_cache')
+    
     _tmpls = dict(
         ssh='git@github.com:%s/%s.git',
         git='git://github.com/%s/%s.git',
@@ -112,6 +207,11 @@ class ProjectUrl(object):
     
     def __init__(self, project):
         self.project = project
+        self._cache = None
+    
+    def clear(self):
+        """Forget the memoized urls."""
+        self._cache = None
     
     @property  
     def ssh(self):
@@ -139,6 +239,10 @@ class ProjectUrl(object):
         return self._url('gh_pages')
         
     def _url(self, protocol='ssh'):
+        if self._cache is None:
+            self._cache = {}
+        elif protocol in self._cache:
+            return self._cache[protocol]
         if self.project.name is None:
             raise AttributeError('Project name not defined')
         if self.project.owner is None:
@@ -146,7 +250,12 @@ class ProjectUrl(object):
         if not self.project.owner:
             raise AttributeError(
                 'The project owner or the github user need to be set.')
-        return self._tmpls[protocol] % (self.project.owner, self.project.name)
+        url = self._tmpls[protocol] % (self.project.owner, self.project.name)
+        if self._cache is None:
+            # setting the owner cleared the cache
+            self._cache = {}
+        self._cache[protocol] = url
+        return url
         
     def __str__(self):
         return self.http
@@ -160,7 +269,52 @@ class Repo(_Repo):
     
     def __init__(self, path=None):
         super(Repo, self).__init__(path)
+        self.git = Git(self.wd)
         self.submodules = SubmoduleDict(self)
+        self._objects = None
+    
+    @classmethod
+    def get(cls, path=None):
+        """
+        Return the shared instance of the repository at ``path`` (default
+        to the current working directory), created on first use.
+        """
+        key = (cls, os.path.realpath(path or os.getcwd()))
+        with _repos_lock:
+            repo = _repos.get(key)
+            if repo is None:
+                repo = _repos[key] = cls(key[1])
+            return repo
+    
+    @staticmethod
+    def invalidate(path=None):
+        """
+        Drop the shared instances of the repository at ``path``
+        (of every repository by default) and stop their git processes.
+        """
+        if path is not None:
+            path = os.path.realpath(path)
+        with _repos_lock:
+            for key in _repos.keys():
+                if path is None or key[1] == path:
+                    _repos.pop(key).close()
+    
+    @property
+    def config(self):
+        """Snapshot of the repository git config values."""
+        return get_config(self.wd)
+    
+    @property
+    def objects(self):
+        """Object reader, running long-lived "git cat-file" processes."""
+        if self._objects is None:
+            self._objects = CatFile(self.path)
+        return self._objects
+    
+    def close(self):
+        """Stop the git processes kept by the repository."""
+        if self._objects is not None:
+            self._objects.close()
         
     @classmethod
     def create(cls, path=None, mk_dir=False):
@@ -171,9 +325,15 @@ class Repo(_Repo):
             os.mkdir(path)
         _git = Git(path or os.curdir)
         _git.init()
+        Repo.invalidate(path or os.curdir)
         return cls(path=path)
 
 
+# Shared Repo instances, by class and path
+_repos = {}
+_repos_lock = threading.Lock()
+
+
 class GitHubRepo(Repo):
     """
     GitHubRepo instance for a repository cloned to/from GitHub.
@@ -181,10 +341,6 @@ class GitHubRepo(Repo):
     Allow to manage gh-pages as a submodule.
     """
     
-    def __init__(self, path=None):
-        super(GitHubRepo, self).__init__(path)
-        self.submodules = SubmoduleDict(self)
-    
     def register(self,
         project_name, credentials=None,
         description='', is_public=True,
@@ -220,20 +376,22 @@ class GitHubRepo(Repo):
         :param gh_pages_path: Path to gh-pages submodule.
         :param remote_name: Remote name of the GitHub repository.
         """
-        project_url = self.git.config('remote.%s.url' % remote_name).strip()
+        project_url = self.config.get('remote.%s.url' % remote_name)
+        if not project_url:
+            raise ValueError('The "%s" remote is not defined.' % remote_name)
         self.submodules.add(project_url, gh_pages_path)
         
         #create gh-pages branch
-        gh_pages = Repo(gh_pages_path)
-        gh_pages.git.symbolic_ref('HEAD', 'refs/heads/gh-pages')
-        index = os.path.join(gh_pages.path, 'index')
+        gh_pages = Git(gh_pages_path)
+        gh_pages.symbolic_ref('HEAD', 'refs/heads/gh-pages')
+        index = os.path.join(work_git_dir(gh_pages_path), 'index')
         if os.path.exists(index):
             os.unlink(index)
         with open(os.path.join(gh_pages_path, 'index.html'), 'w') as f:
             f.write('Documentation coming soon...')
-        gh_pages.git.add('index.html')
-        gh_pages.git.commit('-m', 'initial commit')
-        gh_pages.git.push('origin', 'gh-pages')
+        gh_pages.add('index.html')
+        gh_pages.commit('-m', 'initial commit')
+        gh_pages.push('origin', 'gh-pages')
         
         # update submodule
         self.git.add(gh_pages_path)
@@ -241,14 +399,8 @@ class GitHubRepo(Repo):
         
     def validate_gh_pages_submodule(self, gh_pages_path):
         module = self.submodules[gh_pages_path]
-        gh_pages_repo = Repo(module.path)
         
-        try:
-            active_branch = gh_pages_repo.active_branch
-        except GitCommandError:
-            active_branch = 'no active branch'
-        
-        if active_branch != 'gh-pages':
+        if module.active_branch != 'gh-pages':
             raise ValueError('"gh-pages" is not the current branch of the "%s" submodule.' % gh_pages_path)
         
         return module
@@ -260,6 +412,7 @@ class Submodule(object):
     
     Hold its details: the module path, its repository url, sha and status.
     """
+    __slots__ = ('repo', 'path', 'url', 'sha', 'status', '_git')
         
     def __init__(self, repo, url, module_path, sha=None, status=None):
         self.repo = repo
@@ -267,7 +420,14 @@ class Submodule(object):
         self.url = url
         self.sha = sha
         self.status = status
-        self.git = Git(self.path)
+        self._git = None
+    
+    @property
+    def git(self):
+        """Git command wrapper of the submodule, created on first use."""
+        if self._git is None:
+            self._git = Git(os.path.join(self.repo.wd, self.path))
+        return self._git
         
     def init(self, msg=None):
         if msg is None:
@@ -281,6 +441,36 @@ class Submodule(object):
         if self.status == '-':
             self.repo.git.submodule('init', self.path)
         self.repo.git.submodule('update', self.path)
+    
+    @property
+    def active_branch(self):
+        """
+        Branch checked out in the submodule, or None (HEAD detached
+        or submodule not checked out).
+        """
+        module_path = os.path.join(self.repo.wd, self.path)
+        try:
+            return active_branch(module_path)
+        except UnsupportedRefs:
+            ref = Git(module_path).symbolic_ref(
+                '-q', 'HEAD', with_exceptions=False)
+            if not ref.startswith('refs/heads/'):
+                return None
+            return ref[len('refs/heads/'):]
+    
+    def has_branch(self, branch):
+        """
+        Check the submodule has a local ``branch``.
+        """
+        module_path = os.path.join(self.repo.wd, self.path)
+        git_dir = work_git_dir(module_path)
+        if git_dir is None:
+            return False
+        try:
+            return resolve_ref(git_dir, 'refs/heads/%s' % branch) is not None
+        except UnsupportedRefs:
+            return bool(Git(module_path).rev_parse('-q', '--verify',
+                'refs/heads/%s' % branch, with_exceptions=False))
 
 
 class SubmoduleDict(dict):
@@ -288,14 +478,20 @@ class SubmoduleDict(dict):
     List the submodules of a repository.
     
     The keys are submodules name (and path).
+    
+    The submodules are parsed on first use, and only parsed again when
+    .gitmodules or the git index change. Their status is read from the git
+    index and the HEAD of their repository, or with a single
+    "git submodule status" call for the indexes github.tools.gitfs cannot
+    read.
     """
     
     def __init__(self, repo):
         self.repo = repo
-        self._get_submodules()
+        self._stamp = None
         
     def __getitem__(self, path):
-        self._get_submodules()
+        self._refresh()
         return super(SubmoduleDict, self).__getitem__(path.rstrip('/'))
     
     def __setitem__(self, path, module):
@@ -306,6 +502,58 @@ class SubmoduleDict(dict):
     def __delitem__(self, name):
         raise AttributeError('Not implemented. You need to remove the module yourself.')
     
+    def __contains__(self, path):
+        self._refresh()
+        return super(SubmoduleDict, self).__contains__(path.rstrip('/'))
+    
+    def __iter__(self):
+        self._refresh()
+        return super(SubmoduleDict, self).__iter__()
+    
+    def __len__(self):
+        self._refresh()
+        return super(SubmoduleDict, self).__len__()
+    
+    def get(self, path, default=None):
+        self._refresh()
+        return super(SubmoduleDict, self).get(path.rstrip('/'), default)
+    
+    def keys(self):
+        self._refresh()
+        return super(SubmoduleDict, self).keys()
+    
+    def values(self):
+        self._refresh()
+        return super(SubmoduleDict, self).values()
+    
+    def items(self):
+        self._refresh()
+        return super(SubmoduleDict, self).items()
+    
+    def iterkeys(self):
+        self._refresh()
+        return super(SubmoduleDict, self).iterkeys()
+    
+    def itervalues(self):
+        self._refresh()
+        return super(SubmoduleDict, self).itervalues()
+    
+    def iteritems(self):
+        self._refresh()
+        return super(SubmoduleDict, self).iteritems()
+    
+    def viewkeys(self):
+        self._refresh()
+        return super(SubmoduleDict, self).viewkeys()
+    
+    def viewvalues(self):
+        self._refresh()
+        return super(SubmoduleDict, self).viewvalues()
+    
+    def viewitems(self):
+        self._refresh()
+        return super(SubmoduleDict, self).viewitems()
+    
     def add(self,url, path):
         module = Submodule(self.repo, url, path)
         self.__setitem__(path, module)
@@ -313,37 +561,283 @@ class SubmoduleDict(dict):
     def clear(self):
         self._get_submodules()
     
-    def _get_submodules(self):
+    def _run_all(self, func, modules, jobs, callback):
         """
-        Parse .gitmodule to get the list of submodules.
+        Call ``func`` with each module, ``jobs`` at a time, and return
+        a dict of path/error (None for the modules ``func`` succeeded with).
+        """
+        def report(module, error):
+            if callback is not None:
+                callback(module.path, error)
+        results = map_concurrently(func, modules, jobs=jobs, callback=report)
+        return dict([(module.path, error)
+            for module, error in zip(modules, results)])
+    
+    def _commit(self, paths, msg):
+        """
+        Commit the new gitlinks of ``paths``, if any changed.
         """
-        super(SubmoduleDict, self).clear()
-        gitmodule = os.path.join(self.repo.git.get_dir, '.gitmodules')     
-        if not os.path.exists(gitmodule):
+        if not paths:
             return
-        cfg = RawConfigParser() 
-        cfg.readfp(GitmoduleReader(gitmodule), gitmodule)
-        for section in cfg.sections():
-            path   = cfg.get(section, 'path')
-            url    = cfg.get(section, 'url')
-            info   = self.repo.git.submodule('status', path)
-            status = None
-            sha = None
-            if info:
-                status = info[0]
-                sha    = info[1:41]
-            module = Submodule(self.repo, url, path, sha=sha, status=status)
-            super(SubmoduleDict, self).__setitem__(
-                module.path,
-                module)
-
-
-class GitmoduleReader(file):
-    """
-    Extends file to trim the start of each read line (with readline()).
+        self.repo.git.add('--', *paths)
+        if self.repo.git.diff('--cached', '--name-only', '--', *paths):
+            self.repo.git.commit('-m', msg)
     
-    Used by SubmoduleDict to parse .gitmodule files. RawConfigParser doesn't seems
-    to be able to parse those .gitmodule lines that start a tab.
-    """
-    def readline(self,*args, **kw):
-        return file.readline(self,*args, **kw).lstrip()
\ No newline at end of file
+    def _clone_all(self, modules, jobs, callback):
+        """
+        Clone the (url, path) modules ``jobs`` at a time; return a dict of
+        path/error and the list of (url, path, sha) of the cloned modules.
+        """
+        def clone(module):
+            url, path = module
+            self.repo.git.clone(url, path)
+            module_path = os.path.join(self.repo.wd, path)
+            try:
+                sha = read_head(module_path)
+            except UnsupportedRefs:
+                sha = Git(module_path).rev_parse(
+                    '-q', '--verify', 'HEAD', with_exceptions=False) or None
+            if sha is None:
+                raise ValueError('"%s" has no commit to check out.' % url)
+            return sha
+        def report(module, sha):
+            if callback is not None:
+                error = None
+                if isinstance(sha, Exception):
+                    error = sha
+                callback(module[1], error)
+        shas = map_concurrently(clone, modules, jobs=jobs, callback=report)
+        results = {}
+        cloned = []
+        for (url, path), sha in zip(modules, shas):
+            if isinstance(sha, Exception):
+                results[path] = sha
+            else:
+                results[path] = None
+                cloned.append((url, path, sha))
+        return results, cloned
+    
+    def _register(self, modules, msg, write_gitmodules=True):
+        """
+        Register the cloned (url, path, sha) modules in a single commit:
+        one .gitmodules write, one index update, one "git submodule init"
+        call, and one "git submodule absorbgitdirs" call to move the git
+        directories of the clones to .git/modules, like "git submodule add"
+        does.
+        """
+        if not modules:
+            return
+        paths = [path for url, path, sha in modules]
+        if write_gitmodules:
+            gitmodules = self._files()[0]
+            sections = format_gitmodules(
+                [Gitmodule(path, path, url) for url, path, sha in modules])
+            if os.path.exists(gitmodules):
+                with open(gitmodules) as f:
+                    f.seek(0, os.SEEK_END)
+                    if f.tell():
+                        f.seek(-1, os.SEEK_END)
+                        if f.read() != '\n':
+                            sections = '\n' + sections
+            with open(gitmodules, 'a') as f:
+                f.write(sections)
+        index_info = tempfile.TemporaryFile()
+        try:
+            index_info.write(''.join(['%o %s\t%s\n' % (GITLINK_MODE, sha, path)
+                for url, path, sha in modules]))
+            index_info.seek(0)
+            self.repo.git.update_index('--index-info', istream=index_info)
+        finally:
+            index_info.close()
+        self.repo.git.add('.gitmodules')
+        self.repo.git.submodule('init', '--', *paths)
+        self.repo.git.submodule('absorbgitdirs', '--', *paths)
+        if msg is None:
+            msg = 'Add submodules at "%s"' % '", "'.join(paths)
+        self.repo.git.commit('-m', msg)
+    
+    def add_many(self, modules, jobs=8, msg=None, callback=None):
+        """
+        Add many submodules in a single commit.
+        
+        The (url, path) modules are cloned ``jobs`` at a time; the ones
+        already registered are skipped.
+        
+        Return a dict of path/error (None for the submodules added);
+        ``callback``, if set, is called with each path and error as soon as
+        its clone finishes.
+        """
+        modules = [(url, path.rstrip('/')) for url, path in modules
+            if path not in self]
+        results, cloned = self._clone_all(modules, jobs, callback)
+        self._register(cloned, msg)
+        self._get_submodules()
+        return results
+    
+    def init_all(self, jobs=8, msg=None, callback=None):
+        """
+        Initialise every submodule of .gitmodules not initialised yet.
+        
+        The submodules not registered in the index are cloned ``jobs`` at
+        a time, then added in a single commit; the others are initialised
+        with a single "git submodule init" call.
+        
+        Return a dict of path/error (None for the submodules initialised);
+        ``callback``, if set, is called with each path and error as soon as
+        its clone finishes.
+        """
+        modules = list(self.itervalues())
+        uninitialised = [m.path for m in modules if m.status == '-']
+        if uninitialised:
+            self.repo.git.submodule('init', '--', *uninitialised)
+        results = dict([(path, None) for path in uninitialised])
+        
+        new_modules = [(m.url, m.path) for m in modules if m.status is None]
+        clone_results, cloned = self._clone_all(new_modules, jobs, callback)
+        results.update(clone_results)
+        self._register(cloned, msg, write_gitmodules=False)
+        self._get_submodules()
+        return results
+    
+    def update_all(self, jobs=8, remote=False, msg=None, callback=None):
+        """
+        Update every submodule, ``jobs`` at a time.
+        
+        The submodules not initialised yet are initialised first, with a
+        single "git submodule init" call. With ``remote``, the submodules
+        are updated to the head of their remote branch and their new commits
+        recorded in a single commit.
+        
+        Return a dict of path/error (None for the submodules updated);
+        ``callback``, if set, is called with each path and error as soon as
+        its update finishes.
+        """
+        modules = [m for m in self.itervalues() if m.status is not None]
+        uninitialised = [m.path for m in modules if m.status == '-']
+        if uninitialised:
+            self.repo.git.submodule('init', '--', *uninitialised)
+        args = ['update']
+        if remote:
+            args.append('--remote')
+        def update(module):
+            self.repo.git.submodule(*(args + ['--', module.path]))
+        results = self._run_all(update, modules, jobs, callback)
+        if remote:
+            if msg is None:
+                msg = 'Update submodules'
+            self._commit(
+                [path for path, error in results.items() if error is None],
+                msg)
+        self._get_submodules()
+        return results
+    
+    def _files(self):
+        return (
+            os.path.join(self.repo.git.get_dir, '.gitmodules'),
+            os.path.join(self.repo.path, 'index'),)
+    
+    def _get_stamp(self):
+        stamp = []
+        for file_path in self._files():
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_mtime, st.st_size, st.st_ino))
+        return tuple(stamp)
+    
+    def _refresh(self):
+        if self._get_stamp() != self._stamp:
+            self._get_submodules()
+    
+    def _is_active(self, config, name):
+        key = 'submodule.%s.active' % name
+        if key in config:
+            try:
+                return _parse_bool(config.get(key))
+            except ConfigError:
+                raise UnsupportedIndex('Invalid "%s" value' % key)
+        return config.get('submodule.%s.url' % name) is not None
+    
+    def _read_status(self, modules):
+        """
+        Derive the status and sha of the submodules from the git index and
+        the HEAD of their repository.
+        """
+        gitlinks = read_gitlinks(self.repo.path, max_entries=MAX_ENTRIES)
+        config = self.repo.config
+        if 'submodule.active' in config:
+            raise UnsupportedIndex('"submodule.active" is not supported')
+        status = {}
+        for name, path in modules:
+            if path not in gitlinks:
+                continue
+            sha = gitlinks[path]
+            if sha is None:
+                status[path] = ('U', '0' * 40)
+            elif not self._is_active(config, name):
+                status[path] = ('-', sha)
+            else:
+                head = read_head(os.path.join(self.repo.wd, path))
+                if head is None:
+                    # initialised but not checked out
+                    status[path] = ('-', sha)
+                elif head == sha:
+                    status[path] = (' ', sha)
+                else:
+                    status[path] = ('+', head)
+        return status
+    
+    def _get_status(self):
+        """
+        Return the status and sha of every submodule, by path,
+        using "git submodule status".
+        """
+        status = {}
+        output = self.repo.git.submodule('status')
+        for line in output.splitlines():
+            if len(line) < 43:
+                continue
+            module_path = line[42:]
+            if module_path.endswith(')') and ' (' in module_path:
+                module_path = module_path[:module_path.rindex(' (')]
+            status[module_path] = (line[0], line[1:41])
+        return status
+    
+    def _get_submodules(self):
+        """
+        Parse .gitmodule to get the list of submodules.
+        
+        The Submodule instances of the modules whose url didn't change are
+        kept and updated in place.
+        """
+        stamp = self._get_stamp()
+        modules = [module for module in read_gitmodules(self._files()[0])
+            if module.path]
+        status = {}
+        if modules:
+            try:
+                status = self._read_status(
+                    [(module.name, module.path.rstrip('/'))
+                        for module in modules])
+            except (UnsupportedIndex, UnsupportedRefs):
+                status = self._get_status()
+        paths = set()
+        get, set_item = super(SubmoduleDict, self).get, \
+            super(SubmoduleDict, self).__setitem__
+        for module in modules:
+            path = module.path.rstrip('/')
+            paths.add(path)
+            info = status.get(path, (None, None))
+            submodule = get(path)
+            if submodule is None or submodule.url != module.url:
+                set_item(path, Submodule(
+                    self.repo, module.url, path, sha=info[1], status=info[0]))
+            else:
+                submodule.status, submodule.sha = info
+        removed = [path for path in super(SubmoduleDict, self).iterkeys()
+            if path not in paths]
+        for path in removed:
+            super(SubmoduleDict, self).__delitem__(path)
+        self._stamp = stamp
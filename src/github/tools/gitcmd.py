@@ -0,0 +1,388 @@
+"""
+:Description: git processes: traced commands and long-lived processes.
+
+``Git`` is the GitPython command wrapper recording, when tracing is enabled
+(``GITHUB_TOOLS_TRACE_GIT`` environment variable set, or ``enable_trace()``),
+each command with its working directory, wall time, exit code and output
+size; ``GitTrace.summary`` aggregates them by git command.
+
+``CatFile`` keeps a ``git cat-file --batch-check`` and a
+``git cat-file --batch`` process open for a repository, so that object
+lookups don't pay for a process creation each. Requests are pipelined:
+many lookups are written to the process before their answers are read.
+
+``FastImport`` streams commands to a ``git fast-import`` process, to write
+many objects and commits without a working copy or an index.
+"""
+from __future__ import with_statement
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from git import Git as _Git
+from git.errors import GitCommandError
+
+__all__ = [
+    'Git', 'GitTrace', 'CatFile', 'FastImport', 'get_trace', 'enable_trace',
+    'disable_trace']
+
+# Bytes of requests written before reading their answers; a chunk must fit
+# in the pipe buffer of git's stdin (64KB on Linux, 4KB on older systems)
+# or git and the reader would wait for each other.
+CHUNK_SIZE = 4096
+
+
+class GitTrace(object):
+    """
+    Record of the git processes run by github.tools.
+
+    ``records`` holds a (command, cwd, elapsed, status, output_size) tuple
+    per process.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, command, cwd, elapsed, status, output_size):
+        with self._lock:
+            self.records.append(
+                (list(command), cwd, elapsed, status, output_size))
+
+    def clear(self):
+        with self._lock:
+            del self.records[:]
+
+    def summary(self):
+        """
+        Return a (git command, count, total time, slowest time, output size)
+        row per git command, the most time consuming first.
+        """
+        rows = {}
+        with self._lock:
+            records = list(self.records)
+        for command, cwd, elapsed, status, output_size in records:
+            name = ' '.join(command[1:2]) or command[0]
+            count, total, slowest, size = rows.get(name, (0, 0, 0, 0))
+            rows[name] = (count + 1, total + elapsed,
+                max(slowest, elapsed), size + output_size)
+        return sorted([(name,) + row for name, row in rows.items()],
+            key=lambda row: (-row[2], row[0]))
+
+    def format_summary(self, title='git commands'):
+        """
+        Return the summary as a text table.
+        """
+        rows = self.summary()
+        lines = ['%s: %d processes, %.3fs' % (title,
+            sum([row[1] for row in rows]), sum([row[2] for row in rows]))]
+        if rows:
+            lines.append('%-16s %6s %10s %10s %10s' % (
+                'command', 'count', 'total', 'slowest', 'output'))
+            for name, count, total, slowest, size in rows:
+                lines.append('%-16s %6d %9.3fs %9.3fs %10d' % (
+                    name, count, total, slowest, size))
+        return '\n'.join(lines)
+
+
+_trace = None
+if os.environ.get('GITHUB_TOOLS_TRACE_GIT'):
+    _trace = GitTrace()
+
+
+def get_trace():
+    """
+    Return the current GitTrace, or None if tracing is disabled.
+    """
+    return _trace
+
+
+def enable_trace():
+    """
+    Start recording the git processes; return the GitTrace.
+    """
+    global _trace
+    if _trace is None:
+        _trace = GitTrace()
+    return _trace
+
+
+def disable_trace():
+    global _trace
+    _trace = None
+
+
+class Git(_Git):
+    """
+    GitPython command wrapper recording the commands it runs
+    when tracing is enabled.
+    """
+
+    def execute(self, command, **kwargs):
+        trace = _trace
+        if trace is None:
+            return super(Git, self).execute(command, **kwargs)
+        with_extended_output = kwargs.pop('with_extended_output', False)
+        with_exceptions = kwargs.pop('with_exceptions', True)
+        if kwargs.get('with_keep_cwd') or self.git_dir is None:
+            cwd = os.getcwd()
+        else:
+            cwd = self.git_dir
+        start = time.time()
+        status, stdout, stderr = super(Git, self).execute(command,
+            with_extended_output=True, with_exceptions=False, **kwargs)
+        trace.record(command, cwd, time.time() - start, status, len(stdout))
+        if with_exceptions and status != 0:
+            raise GitCommandError(command, status, stderr)
+        if with_extended_output:
+            return status, stdout, stderr
+        return stdout
+
+
+class _BatchProcess(object):
+    """
+    A "git cat-file" batch process, restarted if it died.
+    """
+
+    def __init__(self, git_dir, option):
+        self.git_dir = git_dir
+        self.option = option
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            ['git', 'cat-file', self.option],
+            cwd=self.git_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE)
+        self.started = time.time()
+        self.output_size = 0
+
+    def stop(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except IOError:
+            pass
+        status = proc.wait()
+        proc.stdout.close()
+        trace = _trace
+        if trace is not None:
+            trace.record(['git', 'cat-file', self.option], self.git_dir,
+                time.time() - self.started, status, self.output_size)
+
+    def query(self, revs, read_answer):
+        """
+        Write the ``revs`` requests and read their answers with
+        ``read_answer(stdout, header)``; restart the process once if it
+        died on the way.
+        """
+        with self.lock:
+            for attempt in (0, 1):
+                if self.proc is None or self.proc.poll() is not None:
+                    self.stop()
+                    self.start()
+                try:
+                    self.proc.stdin.write(''.join([rev + '\n' for rev in revs]))
+                    self.proc.stdin.flush()
+                    answers = []
+                    for rev in revs:
+                        header = self.proc.stdout.readline()
+                        if not header:
+                            raise IOError('git cat-file exited')
+                        answer = read_answer(self.proc.stdout, header)
+                        self.output_size += len(header)
+                        if answer is not None and len(answer) > 3:
+                            self.output_size += answer[2] + 1
+                        answers.append(answer)
+                    return answers
+                except IOError:
+                    self.stop()
+                    if attempt:
+                        raise
+
+
+def _parse_header(header):
+    """
+    Return the (sha, type, size) of an object header, or None for a missing
+    object.
+    """
+    parts = header.rstrip('\n').split(' ')
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1], int(parts[2])
+
+
+def _read_info(stdout, header):
+    return _parse_header(header)
+
+
+def _read_object(stdout, header):
+    info = _parse_header(header)
+    if info is None:
+        return None
+    content = stdout.read(info[2])
+    stdout.read(1)
+    return info + (content,)
+
+
+def _chunks(revs):
+    chunk = []
+    size = 0
+    for rev in revs:
+        if '\n' in rev:
+            raise ValueError('Invalid object name: %r' % rev)
+        if chunk and size + len(rev) + 1 > CHUNK_SIZE:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(rev)
+        size += len(rev) + 1
+    if chunk:
+        yield chunk
+
+
+class CatFile(object):
+    """
+    Object reader of a repository, running long-lived "git cat-file"
+    processes.
+
+    The objects are named by anything ``git rev-parse`` understands
+    ("HEAD", "HEAD:docs/index.rst", a sha...). Missing objects are
+    returned as None.
+    """
+
+    def __init__(self, git_dir):
+        self.git_dir = git_dir
+        self._check = _BatchProcess(git_dir, '--batch-check')
+        self._batch = _BatchProcess(git_dir, '--batch')
+
+    def info(self, rev):
+        """
+        Return the (sha, type, size) of an object.
+        """
+        return self.info_many([rev])[0]
+
+    def info_many(self, revs):
+        """
+        Return the (sha, type, size) of many objects.
+        """
+        answers = []
+        for chunk in _chunks(revs):
+            answers.extend(self._check.query(chunk, _read_info))
+        return answers
+
+    def read(self, rev):
+        """
+        Return the (sha, type, size, content) of an object.
+        """
+        return self.read_many([rev])[0]
+
+    def read_many(self, revs):
+        """
+        Return the (sha, type, size, content) of many objects.
+        """
+        answers = []
+        for chunk in _chunks(revs):
+            answers.extend(self._batch.query(chunk, _read_object))
+        return answers
+
+    def close(self):
+        """
+        Stop the git processes; they are started again when needed.
+        """
+        for process in (self._check, self._batch):
+            with process.lock:
+                process.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class FastImport(object):
+    """
+    A ``git fast-import`` process writing in a repository.
+
+    The refs are only updated once the whole stream is read: ``close``
+    waits for git and raises GitCommandError if the import failed,
+    ``abort`` kills git and leaves the refs untouched.
+    """
+
+    def __init__(self, git_dir, *options):
+        self.git_dir = git_dir
+        self.command = ['git', 'fast-import', '--quiet'] + list(options)
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(self.command,
+            cwd=git_dir,
+            bufsize=CHUNK_SIZE * 16,
+            stdin=subprocess.PIPE,
+            stderr=self._stderr)
+        self.started = time.time()
+        self.size = 0
+
+    def write(self, data):
+        """
+        Write a part of the command stream.
+        """
+        try:
+            self.proc.stdin.write(data)
+        except IOError:
+            # git stopped reading: report its error
+            self.close()
+            raise
+        self.size += len(data)
+
+    def _wait(self):
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except IOError:
+            pass
+        status = proc.wait()
+        self._stderr.seek(0)
+        stderr = self._stderr.read()
+        self._stderr.close()
+        trace = _trace
+        if trace is not None:
+            trace.record(self.command, self.git_dir,
+                time.time() - self.started, status, self.size)
+        return status, stderr
+
+    def close(self):
+        """
+        End the stream and wait for git to update the refs.
+        """
+        if self.proc is None:
+            return
+        status, stderr = self._wait()
+        if status != 0:
+            raise GitCommandError(self.command, status, stderr)
+
+    def abort(self):
+        """
+        Kill git before it updates the refs.
+        """
+        if self.proc is None:
+            return
+        try:
+            os.kill(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self._wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            self.abort()
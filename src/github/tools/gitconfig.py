@@ -0,0 +1,743 @@
+"""
+:Description: Cached access to git config values.
+
+All the config values visible from a repository are loaded at once, either
+with a single ``git config --list -z`` call or, when the
+``GITHUB_TOOLS_GIT_CONFIG`` environment variable is set to ``python``,
+with an in-process parser of git's config files. The snapshot is cached per
+repository and reloaded only when one of the config files changed.
+"""
+import os
+import re
+
+from github.tools.gitcmd import Git
+
+__all__ = [
+    'GitConfig', 'ConfigReader', 'ConfigError', 'UnsupportedConfig',
+    'iter_config', 'get_config', 'clear_cache', 'find_git_dir']
+
+# "git" to read config values with "git config --list",
+# "python" to parse the config files in-process.
+PARSER = os.environ.get('GITHUB_TOOLS_GIT_CONFIG', 'git')
+
+
+class ConfigError(ValueError):
+    """
+    Invalid git config file.
+    """
+
+
+class UnsupportedConfig(Exception):
+    """
+    Config feature not supported by the in-process reader.
+    """
+
+
+def find_git_dir(path):
+    """
+    Return the git directory of the repository holding ``path``,
+    or None if ``path`` is not inside a repository.
+
+    Follow the "gitdir: <path>" indirection used by submodules and worktrees.
+    """
+    curpath = os.path.abspath(path)
+    while True:
+        if _is_git_dir(curpath):
+            return curpath
+        dot_git = os.path.join(curpath, '.git')
+        if os.path.isdir(dot_git) and _is_git_dir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            git_dir = _read_gitdir_file(dot_git)
+            if git_dir is not None:
+                return git_dir
+        curpath, tail = os.path.split(curpath)
+        if not tail:
+            return None
+
+
+def _is_git_dir(path):
+    return os.path.isfile(os.path.join(path, 'HEAD')) \
+        and os.path.isdir(os.path.join(path, 'objects'))
+
+
+def _read_gitdir_file(dot_git):
+    f = open(dot_git)
+    try:
+        content = f.read().strip()
+    finally:
+        f.close()
+    if not content.startswith('gitdir:'):
+        return None
+    git_dir = content[len('gitdir:'):].strip()
+    if not os.path.isabs(git_dir):
+        git_dir = os.path.join(os.path.dirname(dot_git), git_dir)
+    return os.path.normpath(git_dir)
+
+
+def _common_dir(git_dir):
+    """
+    Return the directory shared by all the worktrees of a repository.
+    """
+    commondir = os.path.join(git_dir, 'commondir')
+    if not os.path.isfile(commondir):
+        return git_dir
+    f = open(commondir)
+    try:
+        common_dir = f.read().strip()
+    finally:
+        f.close()
+    if not os.path.isabs(common_dir):
+        common_dir = os.path.join(git_dir, common_dir)
+    return os.path.normpath(common_dir)
+
+
+def _parse_bool(value):
+    if value is None:
+        return True
+    value = value.strip().lower()
+    if value in ('true', 'yes', 'on'):
+        return True
+    if value in ('false', 'no', 'off', ''):
+        return False
+    try:
+        return int(value) != 0
+    except ValueError:
+        raise ConfigError('Invalid boolean value: %r' % value)
+
+
+def _global_files():
+    """
+    List the system and global config files, in the order git reads them.
+    """
+    files = []
+    if not _parse_bool(os.environ.get('GIT_CONFIG_NOSYSTEM', 'false')):
+        files.append(os.environ.get('GIT_CONFIG_SYSTEM', '/etc/gitconfig'))
+    if 'GIT_CONFIG_GLOBAL' in os.environ:
+        files.append(os.environ['GIT_CONFIG_GLOBAL'])
+    else:
+        xdg_home = os.environ.get('XDG_CONFIG_HOME') \
+            or os.path.join(os.path.expanduser('~'), '.config')
+        files.append(os.path.join(xdg_home, 'git', 'config'))
+        files.append(os.path.join(os.path.expanduser('~'), '.gitconfig'))
+    return files
+
+
+def _config_files(git_dir):
+    """
+    List the config files git would read for a repository.
+    """
+    files = _global_files()
+    if git_dir is not None:
+        files.append(os.path.join(_common_dir(git_dir), 'config'))
+    return files
+
+
+def _file_stamp(file_path):
+    """
+    Identify the state of a config file.
+
+    git rewrites a config file with a lock file and a rename, so the
+    inode changes even when the mtime resolution is too coarse.
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+def _env_stamp():
+    # "git -c" and GIT_CONFIG_* environment values are part of the config,
+    # HOME and XDG_CONFIG_HOME define which global files are read.
+    env = [(k, v) for k, v in os.environ.items()
+        if k.startswith('GIT_CONFIG') or k in ('HOME', 'XDG_CONFIG_HOME')]
+    env.sort()
+    return tuple(env)
+
+
+def _stamp(files):
+    return tuple([_file_stamp(f) for f in files] + [_env_stamp()])
+
+
+def _include_path(value, source):
+    """
+    Return the path of the file included by an ``include.path`` value,
+    or None if it is relative and not set in a config file.
+    """
+    include_path = os.path.expanduser(value)
+    if not os.path.isabs(include_path):
+        if source is None:
+            return None
+        include_path = os.path.join(os.path.dirname(source), include_path)
+    return os.path.normpath(include_path)
+
+
+def _is_include_key(key):
+    return key == 'include.path' \
+        or (key.startswith('includeif.') and key.endswith('.path'))
+
+
+def _normalize_key(key):
+    """
+    Lower case the section and the variable names of a config key;
+    the subsection name is case sensitive.
+    """
+    section, dot, rest = key.partition('.')
+    if not dot:
+        return key.lower()
+    subsection, dot, name = rest.rpartition('.')
+    if not dot:
+        return '%s.%s' % (section.lower(), name.lower())
+    return '%s.%s.%s' % (section.lower(), subsection, name.lower())
+
+
+def _wildmatch_regex(pattern, icase=False):
+    """
+    Translate a git wildmatch pattern (with "**" support and "/" only
+    matched explicitly) to a compiled regular expression.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 2] == '**':
+                if pattern[i + 2:i + 3] == '/' \
+                        and (i == 0 or pattern[i - 1] == '/'):
+                    out.append('(?:.*/)?')
+                    i += 3
+                else:
+                    out.append('.*')
+                    i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                chars = pattern[i + 1:end].replace('\\', '\\\\')
+                if chars[:1] in ('!', '^'):
+                    chars = '^' + chars[1:]
+                out.append('[%s]' % chars)
+                i = end + 1
+                continue
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    flags = 0
+    if icase:
+        flags = re.IGNORECASE
+    return re.compile(''.join(out) + r'\Z', flags)
+
+
+_BLANK = re.compile(r'(?:[ \t\r\n]+|[#;][^\n]*)*')
+_NAME = re.compile(r'[A-Za-z][A-Za-z0-9-]*')
+_NO_VALUE = re.compile(r'[ \t]*(?:\n|\Z)')
+_SIMPLE_VALUE = re.compile(
+    r'[ \t]*=[ \t]*([^"\\#;\n\r]*?)[ \t]*(?:[#;][^\n]*)?(?:\n|\Z)')
+_VALUE_START = re.compile(r'[ \t]*=')
+_SIMPLE_SECTION = re.compile(r'([A-Za-z0-9.-]+)(?:[ \t]+"([^"\\\n]*)")?\]')
+_SECTION_NAME = re.compile(r'[A-Za-z0-9.-]+')
+_SUBSECTION_START = re.compile(r'[ \t]+"')
+_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '\\': '\\', '"': '"'}
+
+
+def _parse_value(text, pos):
+    """
+    Parse a value the way git does: "#" and ";" start a comment outside of
+    double quotes, each white space inside the value is kept as a single
+    space, "\\n", "\\t", "\\b", "\\\\" and "\\"" are unescaped and a
+    backslash at the end of a line continues the value on the next one.
+
+    Return the value and the position of the next line.
+    """
+    out = []
+    quote = False
+    comment = False
+    space = 0
+    n = len(text)
+    while True:
+        if pos < n:
+            c = text[pos]
+        else:
+            c = '\n'
+        pos += 1
+        if c == '\n':
+            if quote:
+                raise ConfigError('Unterminated quoted value')
+            return ''.join(out), pos
+        if comment:
+            continue
+        if not quote and c in ' \t\r':
+            if out:
+                space += 1
+            continue
+        if not quote and c in '#;':
+            comment = True
+            continue
+        if space:
+            out.append(' ' * space)
+            space = 0
+        if c == '\\':
+            if pos < n:
+                c = text[pos]
+            else:
+                c = '\n'
+            pos += 1
+            if c == '\n':
+                continue
+            if c not in _ESCAPES:
+                raise ConfigError('Invalid escape sequence: \\%s' % c)
+            out.append(_ESCAPES[c])
+        elif c == '"':
+            quote = not quote
+        else:
+            out.append(c)
+
+
+def _parse_section(text, pos):
+    """
+    Parse a section header (``pos`` is just after the opening bracket).
+
+    Return the section name, joined to its subsection name,
+    and the position after the closing bracket.
+    """
+    m = _SIMPLE_SECTION.match(text, pos)
+    if m is not None:
+        name, subsection = m.groups()
+        if subsection is None:
+            return name.lower(), m.end()
+        return '%s.%s' % (name.lower(), subsection), m.end()
+
+    m = _SECTION_NAME.match(text, pos)
+    if m is None:
+        raise ConfigError('Invalid section name at %d' % pos)
+    name = m.group().lower()
+    m = _SUBSECTION_START.match(text, m.end())
+    if m is None:
+        raise ConfigError('Invalid section header at %d' % pos)
+    pos = m.end()
+    chars = []
+    n = len(text)
+    while True:
+        if pos >= n or text[pos] == '\n':
+            raise ConfigError('Unterminated subsection name')
+        c = text[pos]
+        if c == '"':
+            break
+        if c == '\\':
+            pos += 1
+            if pos >= n or text[pos] == '\n':
+                raise ConfigError('Unterminated subsection name')
+            c = text[pos]
+        chars.append(c)
+        pos += 1
+    if text[pos + 1:pos + 2] != ']':
+        raise ConfigError('Invalid section header at %d' % pos)
+    return '%s.%s' % (name, ''.join(chars)), pos + 2
+
+
+def iter_config(text):
+    """
+    Parse the content of a config file.
+
+    Yield (key, value) tuples; the value is None for variables set
+    without a value.
+    """
+    if text.startswith('\xef\xbb\xbf'):
+        text = text[3:]
+    text = text.replace('\r\n', '\n')
+    n = len(text)
+    pos = 0
+    section = None
+    while True:
+        pos = _BLANK.match(text, pos).end()
+        if pos >= n:
+            return
+        if text[pos] == '[':
+            section, pos = _parse_section(text, pos + 1)
+            continue
+        m = _NAME.match(text, pos)
+        if m is None or section is None:
+            raise ConfigError('Invalid config line at %d' % pos)
+        key = '%s.%s' % (section, m.group().lower())
+        pos = m.end()
+        m = _SIMPLE_VALUE.match(text, pos)
+        if m is not None:
+            yield key, m.group(1).replace('\t', ' ')
+            pos = m.end()
+            continue
+        m = _NO_VALUE.match(text, pos)
+        if m is not None:
+            yield key, None
+            pos = m.end()
+            continue
+        m = _VALUE_START.match(text, pos)
+        if m is None:
+            raise ConfigError('Invalid config line at %d' % pos)
+        value, pos = _parse_value(text, m.end())
+        yield key, value
+
+
+def _sq_dequote(text, pos):
+    """
+    Read a shell single-quoted token (the format git uses for
+    GIT_CONFIG_PARAMETERS).
+    """
+    if text[pos:pos + 1] != "'":
+        raise UnsupportedConfig('Invalid GIT_CONFIG_PARAMETERS')
+    out = []
+    pos += 1
+    while True:
+        end = text.find("'", pos)
+        if end < 0:
+            raise UnsupportedConfig('Invalid GIT_CONFIG_PARAMETERS')
+        out.append(text[pos:end])
+        pos = end + 1
+        if text[pos:pos + 3] in ("\\''", "\\!'"):
+            out.append(text[pos + 1])
+            pos += 3
+            continue
+        return ''.join(out), pos
+
+
+def _iter_parameters(text):
+    """
+    Parse GIT_CONFIG_PARAMETERS ("git -c" values).
+    """
+    pos = 0
+    n = len(text)
+    while True:
+        while pos < n and text[pos].isspace():
+            pos += 1
+        if pos >= n:
+            return
+        key, pos = _sq_dequote(text, pos)
+        if text[pos:pos + 1] == '=':
+            value = ''
+            if text[pos + 1:pos + 2] == "'":
+                value, pos = _sq_dequote(text, pos + 1)
+            else:
+                pos += 1
+            yield key, value
+        else:
+            key, sep, value = key.partition('=')
+            if not sep:
+                value = None
+            yield key, value
+
+
+class ConfigReader(object):
+    """
+    In-process reader of git config files.
+
+    Read the system, global and repository config files, following
+    ``include.path`` and ``includeIf.<condition>.path`` directives, and then
+    the GIT_CONFIG_COUNT and GIT_CONFIG_PARAMETERS environment values, in
+    the order git reads them.
+
+    Raise UnsupportedConfig for the few features it doesn't implement
+    ("hasconfig:" include conditions and the GIT_CONFIG and GIT_DIR
+    environment variables).
+    """
+
+    max_include_depth = 10
+
+    def __init__(self, git_dir=None):
+        self.git_dir = git_dir
+        self.values = {}
+        self.files = []
+        self._stamps = []
+
+    @property
+    def stamp(self):
+        return tuple(self._stamps + [_env_stamp()])
+
+    def read(self):
+        for name in ('GIT_CONFIG', 'GIT_DIR'):
+            if name in os.environ:
+                raise UnsupportedConfig('%s is set.' % name)
+        for file_path in _global_files():
+            self.read_file(file_path)
+        if self.git_dir is not None:
+            self.read_file(os.path.join(_common_dir(self.git_dir), 'config'))
+            worktree_config = self.values.get('extensions.worktreeconfig')
+            if worktree_config and _parse_bool(worktree_config[-1]):
+                self.read_file(os.path.join(self.git_dir, 'config.worktree'))
+        self.read_environment()
+        return self
+
+    def read_file(self, file_path, depth=0):
+        self.files.append(file_path)
+        self._stamps.append(_file_stamp(file_path))
+        try:
+            f = open(file_path, 'rb')
+        except IOError:
+            return
+        try:
+            text = f.read()
+        finally:
+            f.close()
+        for key, value in iter_config(text):
+            self._add(key, value, file_path, depth)
+
+    def read_environment(self):
+        try:
+            count = int(os.environ.get('GIT_CONFIG_COUNT', 0))
+        except ValueError:
+            raise ConfigError('Invalid GIT_CONFIG_COUNT')
+        for i in range(count):
+            try:
+                key = os.environ['GIT_CONFIG_KEY_%d' % i]
+                value = os.environ['GIT_CONFIG_VALUE_%d' % i]
+            except KeyError, e:
+                raise ConfigError('Missing config environment value %s' % e)
+            self._add(_normalize_key(key), value, None, 0)
+        params = os.environ.get('GIT_CONFIG_PARAMETERS')
+        if params:
+            for key, value in _iter_parameters(params):
+                self._add(_normalize_key(key), value, None, 0)
+
+    def _add(self, key, value, source, depth):
+        self.values.setdefault(key, []).append(value)
+        if not key.endswith('.path'):
+            return
+        if key == 'include.path':
+            self._include(value, source, depth)
+        elif _is_include_key(key) \
+                and self._condition(key[len('includeif.'):-len('.path')],
+                    source):
+            self._include(value, source, depth)
+
+    def _include(self, value, source, depth):
+        if value is None:
+            raise ConfigError('Missing include path value.')
+        include_path = _include_path(value, source)
+        if include_path is None:
+            raise UnsupportedConfig(
+                'Relative include path outside of a config file.')
+        if depth >= self.max_include_depth:
+            raise ConfigError('Exceeded maximum include depth.')
+        self.read_file(include_path, depth + 1)
+
+    def _condition(self, condition, source):
+        if condition.startswith('gitdir:'):
+            return self._match_gitdir(
+                condition[len('gitdir:'):], source, False)
+        if condition.startswith('gitdir/i:'):
+            return self._match_gitdir(
+                condition[len('gitdir/i:'):], source, True)
+        if condition.startswith('onbranch:'):
+            return self._match_branch(condition[len('onbranch:'):])
+        if condition.startswith('hasconfig:'):
+            raise UnsupportedConfig('includeIf "%s"' % condition)
+        return False
+
+    def _match_gitdir(self, pattern, source, icase):
+        if self.git_dir is None:
+            return False
+        if pattern.startswith('~/'):
+            pattern = os.path.expanduser(pattern)
+        elif pattern.startswith('./'):
+            if source is None:
+                raise UnsupportedConfig(
+                    'Relative gitdir condition outside of a config file.')
+            pattern = os.path.join(os.path.dirname(source), pattern[2:])
+        if not os.path.isabs(pattern):
+            pattern = '**/' + pattern
+        if pattern.endswith('/'):
+            pattern += '**'
+        regex = _wildmatch_regex(pattern, icase)
+        git_dir = os.path.abspath(self.git_dir)
+        return bool(regex.match(os.path.realpath(git_dir))
+            or regex.match(git_dir))
+
+    def _match_branch(self, pattern):
+        if self.git_dir is None:
+            return False
+        try:
+            f = open(os.path.join(self.git_dir, 'HEAD'))
+        except IOError:
+            return False
+        try:
+            head = f.read().strip()
+        finally:
+            f.close()
+        prefix = 'ref: refs/heads/'
+        if not head.startswith(prefix):
+            return False
+        if pattern.endswith('/'):
+            pattern += '**'
+        return bool(_wildmatch_regex(pattern).match(head[len(prefix):]))
+
+
+class GitConfig(object):
+    """
+    Snapshot of the config values of a repository.
+
+    The keys use git's "section.subsection.name" notation.
+    A variable set without a value (implicit boolean true) has a None value.
+    """
+
+    def __init__(self, values=None, files=None, stamp=None):
+        self._values = values or {}
+        self.files = files
+        self.stamp = stamp
+
+    @classmethod
+    def from_list(cls, output):
+        """
+        Parse the output of ``git config --list -z``.
+        """
+        values = {}
+        for entry in output.split('\0'):
+            if not entry:
+                continue
+            key, sep, value = entry.partition('\n')
+            if not sep:
+                value = None
+            values.setdefault(_normalize_key(key), []).append(value)
+        return cls(values)
+
+    @classmethod
+    def from_git(cls, path):
+        """
+        Load the config values with ``git config --list -z --show-origin``.
+
+        The files included with ``include.path`` and
+        ``includeIf.<condition>.path`` are part of the snapshot stamp.
+        """
+        path = os.path.abspath(path)
+        files = _config_files(find_git_dir(path))
+        output = Git(path).config('--list', '-z', '--show-origin',
+            with_exceptions=False, with_raw_output=True)
+        # each entry is preceded by its origin
+        entries = output.split('\0')
+        config = cls.from_list('\0'.join(entries[1::2]))
+        for origin, entry in zip(entries[0::2], entries[1::2]):
+            key, sep, value = entry.partition('\n')
+            if not sep or not _is_include_key(_normalize_key(key)):
+                continue
+            source = None
+            if origin.startswith('file:'):
+                source = os.path.join(path, origin[len('file:'):])
+            include_path = _include_path(value, source)
+            if include_path is not None and include_path not in files:
+                files.append(include_path)
+        config.files = files
+        config.stamp = _stamp(files)
+        return config
+
+    @classmethod
+    def read(cls, path):
+        """
+        Load the config values with the in-process reader.
+        """
+        reader = ConfigReader(find_git_dir(path)).read()
+        return cls(reader.values, reader.files, reader.stamp)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the config values visible from the repository at ``path``.
+
+        Use the in-process reader if PARSER is set to "python", and fall back
+        to git for the configurations it cannot handle.
+        """
+        if PARSER == 'python':
+            try:
+                return cls.read(path)
+            except (UnsupportedConfig, ConfigError):
+                pass
+        return cls.from_git(path)
+
+    def is_current(self):
+        """
+        Check the config files haven't changed since the snapshot was taken.
+        """
+        return self.files is not None and _stamp(self.files) == self.stamp
+
+    def get(self, key, default=None):
+        """
+        Return the last value set for the key.
+        """
+        values = self._values.get(_normalize_key(key))
+        if not values:
+            return default
+        return values[-1]
+
+    def get_all(self, key):
+        """
+        Return every value set for the key (multi-valued variables).
+        """
+        return list(self._values.get(_normalize_key(key), ()))
+
+    def items(self):
+        """
+        Return the (key, values) pairs of the snapshot.
+        """
+        return [(k, list(v)) for k, v in self._values.items()]
+
+    def keys(self):
+        return self._values.keys()
+
+    def __contains__(self, key):
+        return _normalize_key(key) in self._values
+
+    def __getitem__(self, key):
+        values = self._values.get(_normalize_key(key))
+        if not values:
+            raise KeyError(key)
+        return values[-1]
+
+    def __len__(self):
+        return len(self._values)
+
+
+_cache = {}
+# The git directory of the paths get_config was called with.
+_git_dirs = {}
+
+
+def get_config(path=None):
+    """
+    Return the config snapshot of the repository holding ``path``
+    (default to the current working directory).
+
+    The snapshot is shared until one of the config files is modified.
+    The git directory of ``path`` is remembered, and only looked up again
+    when the snapshot is reloaded.
+    """
+    path = os.path.abspath(path or os.getcwd())
+    git_dir = _git_dirs.get(path)
+    remembered = git_dir is not None
+    if not remembered:
+        git_dir = find_git_dir(path)
+    config = _cache.get(git_dir or path)
+    if config is None or not config.is_current():
+        if remembered:
+            # the repository might have been moved
+            git_dir = find_git_dir(path)
+        config = GitConfig.load(path)
+        _cache[git_dir or path] = config
+    if git_dir is None:
+        _git_dirs.pop(path, None)
+    else:
+        _git_dirs[path] = git_dir
+    return config
+
+
+def clear_cache():
+    """
+    Drop every cached config snapshot.
+    """
+    _cache.clear()
+    _git_dirs.clear()
@@ -0,0 +1,452 @@
+"""
+:Description: Read git data structures straight from the repository files.
+
+The git index is memory-mapped and walked in-process to get the gitlink
+(submodule) entries, and a submodule status is derived from the checked out
+HEAD of its repository, without spawning git. The functions raise
+``UnsupportedIndex`` for the index formats they cannot read; callers are
+expected to fall back to git.
+
+Refs and HEAD are resolved from the loose ref files and a cached, sorted
+index of the packed-refs file (``UnsupportedRefs`` is raised for the
+reftable storage).
+
+.gitmodules files are parsed in a single pass into ``Gitmodule`` records,
+and records formatted back to .gitmodules sections.
+"""
+from __future__ import with_statement
+import bisect
+import mmap
+import os
+import re
+import struct
+
+from github.tools.gitconfig import iter_config, _common_dir, _read_gitdir_file,\
+    _file_stamp
+
+__all__ = [
+    'UnsupportedIndex', 'MAX_ENTRIES', 'read_gitlinks',
+    'UnsupportedRefs', 'work_git_dir', 'PackedRefs', 'get_packed_refs',
+    'read_ref', 'resolve_ref', 'symbolic_ref', 'active_branch', 'read_head',
+    'Gitmodule', 'parse_gitmodules', 'read_gitmodules', 'format_gitmodules']
+
+GITLINK_MODE = 0160000
+
+# Walking the index in Python costs about 0.5 usec per entry; past this
+# number of entries, a "git submodule status" call is faster.
+MAX_ENTRIES = 50000
+
+# git gives up after 5 levels of symbolic refs
+MAX_SYMREF_DEPTH = 5
+
+_HEADER = struct.Struct('>4sII')
+# mode and flags of an entry, read at once
+_MODE_FLAGS = struct.Struct('>I32xH')
+# ctime, mtime, dev, ino, mode, uid, gid, size (32 bits each) and the sha.
+_ENTRY_SIZE = 62
+_MODE_OFFSET = 24
+_SHA_OFFSET = 40
+_NAME_MASK = 0x0fff
+_STAGE_MASK = 0x3000
+_EXTENDED = 0x4000
+_CHECKSUM_SIZE = 20
+
+
+class UnsupportedIndex(Exception):
+    """
+    Index format not supported by the in-process reader.
+    """
+
+
+def _add_gitlink(gitlinks, data, pos, flags, name):
+    if flags & _STAGE_MASK:
+        gitlinks[name] = None
+    else:
+        gitlinks[name] = data[pos + _SHA_OFFSET:pos + _SHA_OFFSET + 20].encode(
+            'hex')
+
+
+def _parse_entries(data, max_entries=None):
+    """
+    Walk the index entries and return the gitlinks as a dict of path/sha;
+    the sha is None for the conflicting entries.
+    """
+    size = len(data)
+    if size < _HEADER.size + _CHECKSUM_SIZE:
+        raise UnsupportedIndex('Truncated index')
+    signature, version, count = _HEADER.unpack_from(data, 0)
+    if signature != 'DIRC':
+        raise UnsupportedIndex('Not a git index')
+    if version not in (2, 3):
+        raise UnsupportedIndex('Unsupported index version %d' % version)
+    if max_entries is not None and count > max_entries:
+        raise UnsupportedIndex('Index with more than %d entries' % max_entries)
+
+    unpack = _MODE_FLAGS.unpack_from
+    # the constants are bound to locals: the loop runs once per file
+    # of the working copy.
+    entry_size, mode_offset, gitlink_mode = (
+        _ENTRY_SIZE, _MODE_OFFSET, GITLINK_MODE)
+    name_mask, extended = _NAME_MASK, _EXTENDED
+    gitlinks = {}
+    pos = _HEADER.size
+    try:
+        for i in xrange(count):
+            mode, flags = unpack(data, pos + mode_offset)
+            name_start = pos + entry_size
+            if flags & extended:
+                if version < 3:
+                    raise UnsupportedIndex(
+                        'Extended flags in a version 2 index')
+                name_start += 2
+            name_len = flags & name_mask
+            if name_len == name_mask:
+                name_len = data.find('\0', name_start) - name_start
+                if name_len < 0:
+                    raise UnsupportedIndex('Truncated index')
+            if mode == gitlink_mode:
+                _add_gitlink(gitlinks, data, pos, flags,
+                    data[name_start:name_start + name_len])
+            # entries are padded with 1 to 8 NUL bytes
+            pos = (name_start + name_len + 8 - pos & ~7) + pos
+    except struct.error:
+        raise UnsupportedIndex('Truncated index')
+    end = size - _CHECKSUM_SIZE
+    if pos > end:
+        raise UnsupportedIndex('Truncated index')
+
+    # Optional extensions (cache tree, resolve undo...) have an upper case
+    # signature; the others (split index, sparse directories...) change
+    # the meaning of the entries.
+    while pos + 8 <= end:
+        ext_signature = data[pos:pos + 4]
+        if not 'A' <= ext_signature[0] <= 'Z':
+            raise UnsupportedIndex(
+                'Unsupported index extension "%s"' % ext_signature)
+        pos += 8 + struct.unpack_from('>I', data, pos + 4)[0]
+    return gitlinks
+
+
+def read_gitlinks(git_dir, max_entries=None):
+    """
+    Return the gitlinks of the index of a repository as a dict of path/sha;
+    the sha is None for a conflicting entry.
+
+    Raise UnsupportedIndex if the index has more than ``max_entries``
+    entries.
+    """
+    index = os.path.join(git_dir, 'index')
+    try:
+        f = open(index, 'rb')
+    except IOError:
+        return {}
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise UnsupportedIndex('Empty index')
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return _parse_entries(data, max_entries)
+        finally:
+            data.close()
+
+
+def _read_file(file_path):
+    try:
+        with open(file_path) as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+class UnsupportedRefs(Exception):
+    """
+    Ref storage not supported by the in-process resolver.
+    """
+
+
+def work_git_dir(path):
+    """
+    Return the git directory of the working copy at ``path`` (following
+    a "gitdir:" file), ``path`` itself if it's a git directory, or None.
+
+    Unlike github.tools.gitconfig.find_git_dir, the parent directories
+    aren't searched: a submodule not checked out has no git directory.
+    """
+    dot_git = os.path.join(path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
+    if os.path.isfile(dot_git):
+        return _read_gitdir_file(dot_git)
+    if os.path.isfile(os.path.join(path, 'HEAD')) \
+            and os.path.isdir(os.path.join(path, 'objects')):
+        return path
+    return None
+
+
+class PackedRefs(object):
+    """
+    Sorted index of a packed-refs file, looked up by bisection.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stamp = _file_stamp(file_path)
+        names = []
+        shas = []
+        content = _read_file(file_path) or ''
+        for line in content.splitlines():
+            if not line or line[0] in '#^':
+                continue
+            sha, sep, name = line.partition(' ')
+            if sep:
+                names.append(name)
+                shas.append(sha)
+        if names != sorted(names):
+            refs = sorted(zip(names, shas))
+            names = [name for name, sha in refs]
+            shas = [sha for name, sha in refs]
+        self.names = names
+        self.shas = shas
+
+    def is_current(self):
+        return _file_stamp(self.file_path) == self.stamp
+
+    def get(self, name):
+        """
+        Return the sha of a packed ref, or None.
+        """
+        i = bisect.bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            return self.shas[i]
+        return None
+
+
+_packed_refs = {}
+
+
+def get_packed_refs(common_dir):
+    """
+    Return the PackedRefs of a repository, parsed again only when the
+    packed-refs file changes.
+    """
+    file_path = os.path.join(common_dir, 'packed-refs')
+    packed = _packed_refs.get(file_path)
+    if packed is None or not packed.is_current():
+        packed = _packed_refs[file_path] = PackedRefs(file_path)
+    return packed
+
+
+def _check_ref_name(name):
+    if name.startswith('/') or '..' in name or '\0' in name:
+        raise ValueError('Invalid ref name: %r' % name)
+
+
+def read_ref(git_dir, name):
+    """
+    Return the content of a ref: ('ref', target) for a symbolic ref,
+    ('sha', sha) otherwise, or None if it doesn't exist.
+
+    Loose refs are looked up in the git directory, then in the directory
+    shared by the worktrees; packed refs in the packed-refs index.
+    """
+    _check_ref_name(name)
+    common_dir = _common_dir(git_dir)
+    if os.path.isdir(os.path.join(common_dir, 'reftable')):
+        raise UnsupportedRefs('reftable ref storage')
+    ref_dirs = [git_dir]
+    if common_dir != git_dir:
+        ref_dirs.append(common_dir)
+    for ref_dir in ref_dirs:
+        content = _read_file(os.path.join(ref_dir, name))
+        if content is None:
+            continue
+        content = content.strip()
+        if content.startswith('ref:'):
+            return 'ref', content[4:].strip()
+        if content:
+            return 'sha', content
+    sha = get_packed_refs(common_dir).get(name)
+    if sha is not None:
+        return 'sha', sha
+    return None
+
+
+def resolve_ref(git_dir, name='HEAD'):
+    """
+    Return the sha a ref points to, following symbolic refs,
+    or None if it doesn't exist.
+    """
+    for depth in range(MAX_SYMREF_DEPTH):
+        ref = read_ref(git_dir, name)
+        if ref is None:
+            return None
+        kind, value = ref
+        if kind == 'sha':
+            return value
+        name = value
+    raise ValueError('Too many levels of symbolic refs')
+
+
+def symbolic_ref(git_dir, name='HEAD'):
+    """
+    Return the ref a symbolic ref points to, or None if it isn't
+    symbolic (a detached HEAD).
+    """
+    ref = read_ref(git_dir, name)
+    if ref is None or ref[0] != 'ref':
+        return None
+    return ref[1]
+
+
+def active_branch(path):
+    """
+    Return the branch checked out in the working copy at ``path``, or None
+    if HEAD is detached or ``path`` isn't a working copy.
+    """
+    git_dir = work_git_dir(path)
+    if git_dir is None:
+        return None
+    ref = symbolic_ref(git_dir)
+    if ref is None or not ref.startswith('refs/heads/'):
+        return None
+    return ref[len('refs/heads/'):]
+
+
+def read_head(path):
+    """
+    Return the sha of the commit checked out in the working copy at
+    ``path``, or None if it isn't checked out.
+    """
+    git_dir = work_git_dir(path)
+    if git_dir is None:
+        return None
+    return resolve_ref(git_dir)
+
+
+class Gitmodule(object):
+    """
+    A submodule declared in .gitmodules.
+
+    The values are the strings of the file, True for a variable set without
+    value (implicit boolean), and None for the variables not set.
+    """
+    __slots__ = ('name', 'path', 'url', 'branch', 'update', 'shallow')
+
+    def __init__(self, name, path=None, url=None, branch=None, update=None,
+            shallow=None):
+        self.name = name
+        self.path = path
+        self.url = url
+        self.branch = branch
+        self.update = update
+        self.shallow = shallow
+
+    def __repr__(self):
+        return '<Gitmodule %r path=%r url=%r>' % (self.name, self.path, self.url)
+
+
+# One line of a .gitmodules file in its common form: a "submodule" section
+# header, a variable with an unquoted value, a comment or a blank line.
+_GITMODULES_LINE = re.compile(
+    r'[ \t]*(?:'
+    r'\[submodule[ \t]+"([^"\\\n]*)"\]'
+    r'|([A-Za-z][A-Za-z0-9-]*)(?:[ \t]*(=)[ \t]*'
+    r'([^\s"\\#;](?:[^"\\#;\n\t\r]*[^\s"\\#;])?)?)?'
+    r'|[#;][^\n]*'
+    r')?[ \t]*(?:\n|\Z)')
+
+
+def _iter_simple_gitmodules(text):
+    """
+    Yield the (name, variable, value) of a .gitmodules file; raise
+    ValueError at the first line that isn't in its common form.
+    """
+    name = None
+    pos = 0
+    n = len(text)
+    for m in _GITMODULES_LINE.finditer(text):
+        if m.start() != pos:
+            raise ValueError('Line not supported at %d' % pos)
+        pos = m.end()
+        section, var, equal, value = m.groups()
+        if section is not None:
+            name = section
+        elif var is not None:
+            if name is None:
+                raise ValueError('Variable outside of a section at %d' % pos)
+            if equal is not None and value is None:
+                value = ''
+            yield name, var.lower(), value
+        if pos >= n:
+            return
+
+
+def _iter_config_gitmodules(text):
+    for key, value in iter_config(text):
+        if key.startswith('submodule.'):
+            name, dot, var = key[len('submodule.'):].rpartition('.')
+            if dot:
+                yield name, var, value
+
+
+def parse_gitmodules(text):
+    """
+    Parse the content of a .gitmodules file and return its Gitmodule
+    records, in the order they are declared.
+
+    The common form of the file is read with a line regex; any other
+    syntax (quoted or continued values, escapes...) goes through the
+    complete parser of github.tools.gitconfig.
+    """
+    try:
+        values = list(_iter_simple_gitmodules(text))
+    except ValueError:
+        values = _iter_config_gitmodules(text)
+    modules = {}
+    order = []
+    fields = Gitmodule.__slots__
+    for name, var, value in values:
+        module = modules.get(name)
+        if module is None:
+            module = modules[name] = Gitmodule(name)
+            order.append(module)
+        if var in fields and var != 'name':
+            if value is None:
+                value = True
+            setattr(module, var, value)
+    return order
+
+
+def read_gitmodules(path):
+    """
+    Parse a .gitmodules file; return an empty list if it doesn't exist.
+    """
+    content = _read_file(path)
+    if content is None:
+        return []
+    return parse_gitmodules(content)
+
+
+def _quote(value):
+    value = value.replace('\\', '\\\\').replace('"', '\\"')
+    value = value.replace('\n', '\\n').replace('\t', '\\t')
+    if value != value.strip() or '#' in value or ';' in value:
+        return '"%s"' % value
+    return value
+
+
+def format_gitmodules(modules):
+    """
+    Return the .gitmodules sections of Gitmodule records.
+    """
+    lines = []
+    for module in modules:
+        name = module.name.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append('[submodule "%s"]\n' % name)
+        for var in Gitmodule.__slots__[1:]:
+            value = getattr(module, var)
+            if value is True:
+                lines.append('\t%s\n' % var)
+            elif value is not None:
+                lines.append('\t%s = %s\n' % (var, _quote(value)))
+    return ''.join(lines)
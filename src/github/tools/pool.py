@@ -0,0 +1,61 @@
+"""
+:Description: Run calls concurrently on a bounded pool of threads.
+"""
+import sys
+import threading
+from Queue import Queue, Empty
+
+__all__ = ['map_concurrently']
+
+
+def map_concurrently(func, items, jobs=8, callback=None):
+    """
+    Call ``func`` with each item, on at most ``jobs`` threads.
+    
+    Return the results in the order of ``items``. The result of a call
+    which raised an exception is the exception instance.
+    
+    ``callback``, if set, is called with each item and its result as soon
+    as the call returns (from the worker thread). If it raises an exception,
+    the remaining items are still processed, and the first exception is
+    raised once they all are.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    callback_errors = []
+    queue = Queue()
+    for i in range(len(items)):
+        queue.put(i)
+    
+    def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except Empty:
+                return
+            try:
+                result = func(items[i])
+            except Exception, e:
+                result = e
+            results[i] = result
+            if callback is None:
+                continue
+            try:
+                callback(items[i], result)
+            except:
+                callback_errors.append(sys.exc_info())
+    
+    jobs = max(1, min(jobs, len(items)))
+    if jobs == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(jobs)]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if callback_errors:
+        exc_type, exc_value, tb = callback_errors[0]
+        raise exc_type, exc_value, tb
+    return results
@@ -0,0 +1,462 @@
+"""
+:Description: Publish a built html tree from a gh-pages working copy.
+
+``stage_changes`` replaces ``git add .``: git would stat, and possibly hash,
+every file of the site. A manifest of the files' size, mtime and blob sha is
+saved in the git directory between runs; the files whose size and mtime
+haven't changed aren't read, the others are hashed in-process, and only the
+paths whose content differs from the index are passed to a single
+``git update-index`` call.
+
+``hash_tree`` computes the git tree sha of a directory in-process, hashing
+the files on a pool of threads, to tell if a rebuilt site differs from the
+published one without staging it.
+
+``import_tree`` commits a directory on a branch through a single
+``git fast-import`` process, without a working copy or an index: the files
+already stored in the repository are referred to by their sha, the others
+are streamed to git.
+"""
+from __future__ import with_statement
+import hashlib
+import os
+import stat
+import tempfile
+import time
+
+from github.tools.gitcmd import CatFile, FastImport, Git
+from github.tools.gitconfig import get_config, ConfigError, _parse_bool
+from github.tools.gitfs import GITLINK_MODE, UnsupportedRefs, resolve_ref,\
+    work_git_dir
+from github.tools.pool import map_concurrently
+
+__all__ = [
+    'MANIFEST_NAME', 'blob_sha', 'file_mode', 'Manifest', 'read_index',
+    'scan_changes', 'stage_changes', 'iter_files', 'hash_tree', 'import_tree']
+
+# Name of the manifest file, in the git directory of the working copy.
+MANIFEST_NAME = 'github-tools-manifest'
+
+_MANIFEST_HEADER = '# github-tools manifest 1\n'
+_READ_SIZE = 65536
+_SYMLINK_MODE = 0120000
+_TREE_MODE = 040000
+# Files hashed per pool task.
+_HASH_BATCH = 64
+
+
+def blob_sha(file_path, st=None):
+    """
+    Return the git blob sha of a file (of its target for a symlink),
+    reading it by chunks.
+    """
+    if st is None:
+        st = os.lstat(file_path)
+    if stat.S_ISLNK(st.st_mode):
+        target = os.readlink(file_path)
+        return hashlib.sha1('blob %d\0%s' % (len(target), target)).hexdigest()
+    sha = hashlib.sha1('blob %d\0' % st.st_size)
+    with open(file_path, 'rb') as f:
+        read = f.read
+        update = sha.update
+        chunk = read(_READ_SIZE)
+        while chunk:
+            update(chunk)
+            chunk = read(_READ_SIZE)
+    return sha.hexdigest()
+
+
+def file_mode(st):
+    """
+    Return the git mode of a file.
+    """
+    if stat.S_ISLNK(st.st_mode):
+        return _SYMLINK_MODE
+    if st.st_mode & 0111:
+        return 0100755
+    return 0100644
+
+
+class Manifest(object):
+    """
+    Blob shas of the files of a working copy, with the size and mtime they
+    were computed for.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Read a manifest; a missing or unreadable one is empty.
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                if f.readline() != _MANIFEST_HEADER:
+                    return cls()
+                lines = f.read().split('\n')
+        except IOError:
+            return cls()
+        entries = {}
+        try:
+            for line in lines[:-1]:
+                sha, size, mtime_path = line.split(' ', 2)
+                mtime, path = mtime_path.split('\t', 1)
+                entries[path] = (int(size), float(mtime), sha)
+        except ValueError:
+            return cls()
+        return cls(entries)
+
+    def save(self, file_path):
+        """
+        Write the manifest, replacing the file atomically.
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(file_path), dir=os.path.dirname(file_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_MANIFEST_HEADER)
+                f.writelines(['%s %d %r\t%s\n' % (sha, size, mtime, path)
+                    for path, (size, mtime, sha) in self.entries.iteritems()
+                    if '\n' not in path])
+            os.rename(tmp_path, file_path)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+    def lookup(self, path, st):
+        """
+        Return the sha of ``path`` if its size and mtime are unchanged.
+        """
+        entry = self.entries.get(path)
+        if entry is not None and entry[:2] == (st.st_size, st.st_mtime):
+            return entry[2]
+        return None
+
+    def add(self, path, st, sha):
+        self.entries[path] = (st.st_size, st.st_mtime, sha)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __eq__(self, other):
+        return isinstance(other, Manifest) and self.entries == other.entries
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _split_z(output):
+    return [item for item in output.split('\0') if item]
+
+
+def read_index(git):
+    """
+    Return the index entries of a working copy as a dict of
+    path/(mode, sha); the sha is None for conflicting entries.
+    """
+    entries = {}
+    for line in _split_z(git.ls_files('-s', '-z')):
+        info, path = line.split('\t', 1)
+        mode, sha, stage = info.split(' ')
+        if stage != '0':
+            entries[path] = (int(mode, 8), None)
+        else:
+            entries[path] = (int(mode, 8), sha)
+    return entries
+
+
+def _trust_filemode(work_dir):
+    try:
+        return _parse_bool(get_config(work_dir).get('core.filemode', 'true'))
+    except ConfigError:
+        return True
+
+
+def scan_changes(work_dir, git=None, manifest=None):
+    """
+    Compare the files of a working copy with its index.
+
+    Return the sorted list of the paths to stage (modified, untracked
+    and deleted files; ignored files are left out like ``git add .`` does)
+    and the updated manifest.
+    """
+    if git is None:
+        git = Git(work_dir)
+    if manifest is None:
+        manifest = Manifest()
+    index = read_index(git)
+    untracked = [path for path in _split_z(
+            git.ls_files('-o', '--exclude-standard', '-z'))
+        if not path.endswith('/')]
+    filemode = _trust_filemode(work_dir)
+    # A file modified in the second the scan started could be modified
+    # again without its mtime changing: it isn't recorded.
+    racy = int(time.time())
+    updated = Manifest()
+    changes = []
+    # the names are bound to locals: the loop runs once per file of
+    # the working copy.
+    lstat, join, lookup, add = os.lstat, os.path.join, manifest.lookup,\
+        updated.add
+    for path in index.keys() + untracked:
+        mode, sha = index.get(path, (None, None))
+        if mode == GITLINK_MODE:
+            continue
+        file_path = join(work_dir, path)
+        try:
+            st = lstat(file_path)
+        except OSError:
+            changes.append(path)
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            changes.append(path)
+            continue
+        current_sha = lookup(path, st)
+        if current_sha is None:
+            current_sha = blob_sha(file_path, st)
+        if st.st_mtime < racy:
+            add(path, st, current_sha)
+        current_mode = file_mode(st)
+        if not filemode and mode is not None \
+                and current_mode != _SYMLINK_MODE and mode != _SYMLINK_MODE:
+            current_mode = mode
+        if current_sha != sha or current_mode != mode:
+            changes.append(path)
+    changes.sort()
+    return changes, updated
+
+
+def stage_changes(work_dir, git=None, manifest_path=None):
+    """
+    Stage the modified, untracked and deleted files of a working copy
+    with a single ``git update-index`` call; return the staged paths.
+
+    The manifest is saved, by default, in the git directory of the
+    working copy.
+    """
+    if git is None:
+        git = Git(work_dir)
+    if manifest_path is None:
+        git_dir = work_git_dir(work_dir)
+        if git_dir is None:
+            raise ValueError('"%s" is not a git working copy.' % work_dir)
+        manifest_path = os.path.join(git_dir, MANIFEST_NAME)
+    previous = Manifest.load(manifest_path)
+    changes, manifest = scan_changes(work_dir, git, previous)
+    if changes:
+        paths = tempfile.TemporaryFile()
+        try:
+            paths.write(''.join([path + '\0' for path in changes]))
+            paths.seek(0)
+            git.update_index(
+                '--add', '--remove', '--replace', '-z', '--stdin',
+                istream=paths)
+        finally:
+            paths.close()
+    if manifest != previous:
+        manifest.save(manifest_path)
+    return changes
+
+
+def iter_files(root):
+    """
+    Yield the (path, file path) of the files and symlinks under ``root``,
+    directory by directory; ".git" entries are skipped.
+    """
+    root = os.path.normpath(root)
+    for dir_path, dir_names, file_names in os.walk(root):
+        links = [name for name in dir_names
+            if os.path.islink(os.path.join(dir_path, name))]
+        dir_names[:] = sorted([name for name in dir_names
+            if name != '.git' and name not in links])
+        prefix = dir_path[len(root):].lstrip(os.sep).replace(os.sep, '/')
+        if prefix:
+            prefix += '/'
+        for name in sorted(file_names + links):
+            if name != '.git':
+                yield prefix + name, os.path.join(dir_path, name)
+
+
+def _hash_files(files):
+    return [blob_sha(file_path, st) for file_path, st in files]
+
+
+def _tree_entry(mode, name, sha):
+    return '%o %s\0%s' % (mode, name, sha.decode('hex'))
+
+
+def _scan_tree(root, manifest=None, jobs=8):
+    """
+    Return the [path, file path, stat, sha] entries of the files under
+    ``root``; the files are hashed on ``jobs`` threads, unless their size and
+    mtime match the ``manifest`` entry.
+    """
+    entries = []
+    missing = []
+    for path, file_path in iter_files(root):
+        st = os.lstat(file_path)
+        sha = None
+        if manifest is not None:
+            sha = manifest.lookup(path, st)
+        if sha is None:
+            missing.append(len(entries))
+        entries.append([path, file_path, st, sha])
+    batches = [missing[i:i + _HASH_BATCH]
+        for i in xrange(0, len(missing), _HASH_BATCH)]
+    results = map_concurrently(_hash_files,
+        [[entries[i][1:3] for i in batch] for batch in batches], jobs=jobs)
+    for batch, shas in zip(batches, results):
+        if isinstance(shas, Exception):
+            raise shas
+        for i, sha in zip(batch, shas):
+            entries[i][3] = sha
+    return entries
+
+
+def _save_manifest(manifest_path, manifest, entries, racy):
+    """
+    Save the shas of the scanned entries at ``manifest_path``, if they
+    differ from ``manifest``; the files modified since ``racy`` are left out.
+    """
+    updated = Manifest()
+    for path, file_path, st, sha in entries:
+        if st.st_mtime < racy:
+            updated.add(path, st, sha)
+    if updated != manifest:
+        updated.save(manifest_path)
+
+
+def hash_tree(root, jobs=8, manifest=None, manifest_path=None):
+    """
+    Return the sha of the git tree of the files under ``root``, as
+    ``git add`` would stage them (the ignore rules aside); the ".git"
+    entries are skipped.
+
+    The files are hashed on ``jobs`` threads, unless their size and mtime
+    match the ``manifest`` entry. With ``manifest_path``, the manifest is
+    loaded from that file (unless given) and saved back if it changed.
+    """
+    if manifest_path is not None and manifest is None:
+        manifest = Manifest.load(manifest_path)
+    racy = int(time.time())
+    entries = _scan_tree(root, manifest, jobs)
+    if manifest_path is not None:
+        _save_manifest(manifest_path, manifest, entries, racy)
+    return _tree_sha([(path, file_mode(st), sha)
+        for path, file_path, st, sha in entries])
+
+
+def _tree_sha(entries):
+    """
+    Return the sha of the root tree holding the (path, mode, sha) entries.
+    """
+    # the entries of each directory, keyed by name; a directory is keyed by
+    # its name and a "/", as git sorts them.
+    trees = {'': {}}
+    for path, mode, sha in entries:
+        parent, sep, name = path.rpartition('/')
+        directory = parent
+        while directory not in trees:
+            trees[directory] = {}
+            directory = directory.rpartition('/')[0]
+        trees[parent][name] = _tree_entry(mode, name, sha)
+    # the deepest directories first: their parent needs their sha
+    for directory in sorted(trees, key=lambda d: d.count('/') + bool(d),
+            reverse=True):
+        children = trees[directory]
+        content = ''.join([children[key] for key in sorted(children)])
+        sha = hashlib.sha1('tree %d\0%s' % (len(content), content)).hexdigest()
+        if not directory:
+            return sha
+        parent, sep, name = directory.rpartition('/')
+        trees[parent][name + '/'] = _tree_entry(_TREE_MODE, name, sha)
+
+
+def _quote_path(path):
+    """
+    Quote a path for a fast-import command, if needed.
+    """
+    if '\n' not in path and not path.startswith('"'):
+        return path
+    return '"%s"' % path.replace('\\', '\\\\').replace('"', '\\"')\
+        .replace('\n', '\\n')
+
+
+def _read_content(file_path, st):
+    if stat.S_ISLNK(st.st_mode):
+        return os.readlink(file_path)
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def _tip(git_dir, ref):
+    try:
+        return resolve_ref(git_dir, ref)
+    except UnsupportedRefs:
+        return Git(git_dir).rev_parse(
+            '-q', '--verify', ref, with_exceptions=False) or None
+
+
+def import_tree(git_dir, root, branch='gh-pages', message=None, parent=None,
+        manifest_path=None, objects=None, jobs=8):
+    """
+    Commit the files under ``root`` as the whole tree of a new commit
+    on ``branch``, with a single ``git fast-import`` process; return the
+    commit sha. If the files match the parent tree, no commit is made and
+    the parent sha is returned.
+
+    The commit parent defaults to the tip of the branch (none if it doesn't
+    exist yet). The files are hashed on ``jobs`` threads and their shas
+    cached in the manifest at ``manifest_path``, if set; ``objects`` is
+    a CatFile of the repository.
+    """
+    ref = 'refs/heads/%s' % branch
+    if parent is None:
+        parent = _tip(git_dir, ref)
+    if message is None:
+        message = 'Update %s' % branch
+    if manifest_path is None:
+        manifest = Manifest()
+    else:
+        manifest = Manifest.load(manifest_path)
+    racy = int(time.time())
+    entries = _scan_tree(root, manifest, jobs)
+    if manifest_path is not None:
+        _save_manifest(manifest_path, manifest, entries, racy)
+
+    close_objects = objects is None
+    if close_objects:
+        objects = CatFile(git_dir)
+    try:
+        if parent is not None:
+            tree = _tree_sha([(path, file_mode(st), sha)
+                for path, file_path, st, sha in entries])
+            parent_tree = objects.info('%s^{tree}' % parent)
+            if parent_tree is not None and parent_tree[0] == tree:
+                return parent
+        stored = objects.info_many([sha for path, file_path, st, sha in entries])
+    finally:
+        if close_objects:
+            objects.close()
+
+    committer = Git(git_dir).var('GIT_COMMITTER_IDENT')
+    with FastImport(git_dir, '--date-format=raw') as stream:
+        stream.write('commit %s\ncommitter %s\ndata %d\n%s\n' % (
+            ref, committer, len(message), message))
+        if parent is not None:
+            stream.write('from %s\n' % parent)
+        stream.write('deleteall\n')
+        for (path, file_path, st, sha), info in zip(entries, stored):
+            if info is not None:
+                stream.write('M %o %s %s\n' % (
+                    file_mode(st), sha, _quote_path(path)))
+            else:
+                content = _read_content(file_path, st)
+                stream.write('M %o inline %s\ndata %d\n' % (
+                    file_mode(st), _quote_path(path), len(content)))
+                stream.write(content)
+                stream.write('\n')
+
+    return _tip(git_dir, ref)
@@ -19,6 +19,25 @@ These tasks use:
  * ``options.gh_pages.remote_name``, set by default to ``origin` and used for
    your github repository remote name.
  * ``options.gh_pages.master_branch``, set by default to ``master``.
+ * ``options.gh_pages.incremental``, stage the documentation changes from
+   a manifest of the files' size, mtime and sha kept between runs, with a
+   single ``git update-index`` call, instead of ``git add .``; set by default
+   to False.
+ * ``options.gh_pages.sync``, build the documentation in
+   ``<options.sphinx.docroot>``/``<options.sphinx.build>/html-staging`` and
+   only move the new and modified files into the sphinx html directory
+   (removing the stale ones), instead of removing every file before the
+   build; the unchanged files keep their mtime and git doesn't hash them
+   again. Set by default to False.
+ * ``options.gh_pages.clean_jobs``, number of threads removing the files of
+   the documentation; set by default to 8.
+ * ``options.gh_pages.clean_in_background``, move the old documentation
+   files aside, to the git directory of the gh-pages working copy, and remove
+   them while the new documentation is built; set by default to False.
+ * ``options.gh_pages.trace_git``, print a summary of the git commands run
+   by each task (count, total and slowest time, output size); set by default
+   to False. Setting the ``GITHUB_TOOLS_TRACE_GIT`` environment variable has
+   the same effect.
  
 ``options.gh_pages.root`` and ``options.gh_pages.htmlroot`` will only be of
 any used if you are using something else than Sphinx (and don't want to use 
@@ -26,15 +45,24 @@ Sphinx options).
 """
 
 from __future__ import with_statement
+import functools
 import webbrowser
 import sys
 import os
+import time
 
 from paver.easy import task, options, sh, Bunch, path, needs, cmdopts, dry, info
+from paver import tasks
 from git import Git
 
 from github.tools.gh_pages import GitHubRepo, Credentials
-from git.errors import GitCommandError
+from github.tools.fsutils import move_aside, remove_in_background,\
+    remove_paths, sync_tree
+from github.tools import gitcmd
+from github.tools.gitcmd import CatFile
+from github.tools.gitfs import work_git_dir
+from github.tools.publish import MANIFEST_NAME, Manifest, hash_tree,\
+    import_tree, stage_changes, _tip
 
 
 def _adjust_options():
@@ -45,6 +73,7 @@ def _adjust_options():
         options.setdefault('sphinx', Bunch())
         options.setdefault('gh_pages', Bunch())
         options.setdefault('gh_pages_update', Bunch())
+        options.setdefault('gh_pages_import', Bunch())
         
         options.sphinx.docroot = docroot \
             = path( options.sphinx.get('docroot', 'docs'))
@@ -55,6 +84,7 @@ def _adjust_options():
         options.sphinx._doctrees = buildir / "doctrees"
         options.sphinx._htmldir = htmldir = \
             buildir / 'html'
+        options.sphinx._stagingdir = buildir / 'html-staging'
         
         gh_pages_root = options.gh_pages.get('root', None)
         if gh_pages_root is None:
@@ -72,18 +102,39 @@ def _adjust_options():
         
         options._github_tools_options_adjusted = True
 
+def _traced(func):
+    """
+    Print the summary of the git commands run by a task, if tracing
+    is enabled.
+    """
+    @functools.wraps(func)
+    def wrapper():
+        _adjust_options()
+        if options.gh_pages.get('trace_git'):
+            gitcmd.enable_trace()
+        trace = gitcmd.get_trace()
+        if trace is None:
+            return func()
+        trace.clear()
+        try:
+            return func()
+        finally:
+            info(trace.format_summary('git commands of %s' % func.__name__))
+    return wrapper
+
 def _get_repo(working_copy):
     """
     Check that a directory is a git working copy.
     
-    return a GitHubRepo instance or exit.
+    return the shared GitHubRepo instance or exit.
     """
     git_dir = os.path.join(working_copy, '.git')
     if os.path.exists(git_dir) and os.path.isdir(git_dir):
-        return GitHubRepo(working_copy)
+        return GitHubRepo.get(working_copy)
     sys.exit('%s is not a git directory.' % os.getcwd())
 
 @task
+@_traced
 def gh_register():
     """Create a repository at GitHub and push it your local repository."""
     _adjust_options()
@@ -111,6 +162,7 @@ def gh_register():
         webbrowser.open(project.url.http)
 
 @task
+@_traced
 def gh_pages_create():
     """Create a submodule to host your documentation."""
     _adjust_options()
@@ -124,10 +176,36 @@ def gh_pages_create():
         gh_pages_path=gh_pages_root,
         remote_name=remote_name)
 
+def _is_committed(git_dir, work_dir, head):
+    """
+    Tell if the files of the submodule working copy match the tree of its
+    ``head`` commit, hashing them in-process; the shas are kept in the
+    manifest, unless it's a dry run.
+    """
+    if head is None:
+        return False
+    with CatFile(git_dir) as objects:
+        head_tree = objects.info('%s^{tree}' % head)
+    if head_tree is None:
+        return False
+    manifest_path = os.path.join(git_dir, MANIFEST_NAME)
+    manifest = Manifest.load(manifest_path)
+    if tasks.environment.dry_run:
+        manifest_path = None
+    return hash_tree(work_dir, manifest=manifest,
+        manifest_path=manifest_path) == head_tree[0]
+
+def _is_pushed(git_dir, remote_name, sha):
+    """
+    Tell if the remote gh-pages branch is at ``sha``.
+    """
+    return _tip(git_dir, 'refs/remotes/%s/gh-pages' % remote_name) == sha
+
 @task
 @cmdopts([
     ('commit-message=', 'm', 'commit message for the doc update')
 ])
+@_traced
 def gh_pages_update():
     """Push your documentation it to GitHub."""
     _adjust_options()
@@ -146,15 +224,34 @@ def gh_pages_update():
                  '(cd %s; git checkout -t origin/gh-pages) '
                  'and rebuild the documentation.' % gh_pages_root)
     
-    dry("Add modified and untracked content to git index", gh_pages.git.add, '.')
-    if options.gh_pages_update.get('commit_message') is None:
+    work_dir = os.path.join(repo.wd, gh_pages.path)
+    git_dir = work_git_dir(work_dir)
+    head = _tip(git_dir, 'HEAD')
+    commit_message = options.gh_pages_update.get('commit_message')
+    if _is_committed(git_dir, work_dir, head):
+        info("The documentation is unchanged.")
+        if commit_message is None \
+                or _is_pushed(git_dir, remote_name, head):
+            return
+        dry("Push the gh-pages branch.",
+            gh_pages.git.push, remote_name, 'gh-pages')
+        return
+    
+    if options.gh_pages.get('incremental'):
+        staged = dry("Add modified and untracked content to git index",
+            stage_changes, work_dir, gh_pages.git)
+        if staged is not None:
+            info('%d files staged.' % len(staged))
+    else:
+        dry("Add modified and untracked content to git index",
+            gh_pages.git.add, '.')
+    if commit_message is None:
         info("No commit message set... "
             "You will have to commit the last changes "
             "and push them to GitHub")
         return
-    msg = options.gh_pages_update.commit_message
-    dry('"Commit any changes with message "%s".' % msg,
-        gh_pages.git.commit, '-m', msg)
+    dry('"Commit any changes with message "%s".' % commit_message,
+        gh_pages.git.commit, '-m', commit_message)
     dry("Push any changes on the gh-pages branch.",
         gh_pages.git.push, remote_name, 'gh-pages')
     info('You might want to update your submodule reference:\n\t'
@@ -162,11 +259,76 @@ def gh_pages_update():
         % options.gh_pages.root)
 
 @task
+@needs('github.tools.task.gh_pages_html')
+@cmdopts([
+    ('commit-message=', 'm', 'commit message for the doc update')
+])
+@_traced
+def gh_pages_import():
+    """Build your documentation, commit it on the gh-pages branch and push it.
+    
+    The html output is committed with git fast-import on the gh-pages branch
+    of your repository; the gh-pages submodule doesn't need to be checked
+    out (gh_pages_html builds the documentation without updating it).
+    """
+    _adjust_options()
+    repo = _get_repo(os.getcwd())
+    remote_name = options.gh_pages.remote_name
+    htmlroot = options.gh_pages.htmlroot
+    if not htmlroot.isdir():
+        sys.exit('%s not found. Build your documentation first.' % htmlroot)
+    
+    parent = _tip(repo.path, 'refs/heads/gh-pages') \
+        or _tip(repo.path, 'refs/remotes/%s/gh-pages' % remote_name)
+    msg = options.gh_pages_import.get('commit_message') \
+        or 'Update the documentation'
+    sha = dry('Commit %s on the gh-pages branch' % htmlroot,
+        import_tree, repo.path, str(htmlroot), 'gh-pages', msg, parent,
+        os.path.join(repo.path, '%s-gh-pages' % MANIFEST_NAME), repo.objects)
+    if sha is not None and sha == parent:
+        info("The documentation is unchanged.")
+        if _is_pushed(repo.path, remote_name, sha):
+            return
+    elif sha is not None:
+        info('gh-pages is at %s.' % sha)
+    dry("Push the gh-pages branch.",
+        repo.git.push, remote_name, 'gh-pages')
+
+def _report_removal(start):
+    """
+    Return a callback logging the number of files removed since ``start``.
+    """
+    def report(count):
+        if isinstance(count, Exception):
+            info('Failed to remove the old documentation: %s' % count)
+        else:
+            info('%d files removed in %.2fs.' % (count, time.time() - start))
+    return report
+
+def _remove(paths, jobs):
+    """
+    Remove files and directories, logging the progress every second.
+    """
+    start = time.time()
+    last = [start]
+    def progress(count):
+        now = time.time()
+        if now - last[0] >= 1:
+            last[0] = now
+            info('%d files removed...' % count)
+    count = remove_paths(paths, jobs=jobs, callback=progress)
+    _report_removal(start)(count)
+
+@task
+@_traced
 def gh_pages_clean():
     """Clean your documentation.
     
     Update the submodule (every changes not committed and pushed will be lost),
     pull any changes and remove any file in options.gh_pages.docroot.
+    
+    With options.gh_pages.sync set, the files are kept; gh_pages_build
+    synchronises them with the new build.
     """
     _adjust_options()
     remote_name = options.gh_pages.remote_name
@@ -177,33 +339,98 @@ def gh_pages_clean():
         return
     
     module.update()
-    try:
+    if module.has_branch('gh-pages'):
         dry('Checkout the gh-pages branch', module.git.checkout, 'gh-pages') 
-    except GitCommandError:
-        dry('Checkout the gh-pages remote branch', 
-            module.git.checkout, '-t', '%s/gh-pages' % remote_name)
-    else:
         dry('Fetch any changes on the gh-pages remote branch',
             module.git.pull, remote_name, 'gh-pages')
+    else:
+        dry('Checkout the gh-pages remote branch', 
+            module.git.checkout, '-t', '%s/gh-pages' % remote_name)
+    
+    if options.gh_pages.get('sync'):
+        staging = options.sphinx._stagingdir
+        if staging.exists():
+            dry('Remove %s' % staging, staging.rmtree)
+        return
     
-    for dir_entry in options.gh_pages.htmlroot.listdir():
-        if dir_entry.isdir():
-            if dir_entry.basename() != '.git':
-                dry("Remove %s" % dir_entry, dir_entry.rmtree)
+    htmlroot = options.gh_pages.htmlroot
+    jobs = options.gh_pages.get('clean_jobs', 8)
+    # The old files are moved aside to the git directory of the working
+    # copy, where they can't be staged with the new documentation.
+    trash_dir = path(work_git_dir(os.path.join(repo.wd, module.path)))
+    # trees left by an interrupted background removal
+    trashes = trash_dir.glob('.%s-trash-*' % htmlroot.basename())
+    if trashes:
+        dry('Remove %s' % ', '.join(trashes), _remove, trashes, jobs)
+    if options.gh_pages.get('clean_in_background'):
+        try:
+            trash = dry('Move the content of %s aside' % htmlroot,
+                move_aside, htmlroot, trash_dir=trash_dir)
+        except OSError, e:
+            # a partly filled trash is removed by the next clean
+            info('Failed to move the content of %s aside: %s' % (htmlroot, e))
         else:
-            dry('Remove %s' % dir_entry, dir_entry.unlink)
+            if trash is not None:
+                info('Removing %s in the background...' % trash)
+                remove_in_background(
+                    [trash], jobs, _report_removal(time.time()))
+            return
+    dry('Remove the content of %s' % htmlroot, _remove,
+        [entry for entry in htmlroot.listdir() if entry.basename() != '.git'],
+        jobs)
 
 @task
 @needs('github.tools.task.gh_pages_clean', 'setuptools.command.egg_info')
 def gh_pages_build():
     """Build your documentation with sphinx."""
     _adjust_options()
+    _build_html()
+
+@task
+@needs('setuptools.command.egg_info')
+def gh_pages_html():
+    """Build your documentation with sphinx, for gh_pages_import.
+    
+    Unlike gh_pages_build, the gh-pages submodule is neither updated nor
+    checked out: the old html files are removed (or, with
+    options.gh_pages.sync set, synchronised with the new build).
+    """
+    _adjust_options()
+    htmldir = options.sphinx._htmldir
+    if not options.gh_pages.get('sync') and htmldir.isdir():
+        entries = [entry for entry in htmldir.listdir()
+            if entry.basename() != '.git']
+        dry('Remove the content of %s' % htmldir, _remove, entries,
+            options.gh_pages.get('clean_jobs', 8))
+    _build_html()
+
+def _build_html():
+    """
+    Build the html documentation; with options.gh_pages.sync set, build it
+    in the staging directory and synchronise the html directory with it.
+    """
+    sync = options.gh_pages.get('sync')
+    htmldir = options.sphinx._htmldir
+    if sync:
+        htmldir = options.sphinx._stagingdir
     sh('sphinx-build -d %s -b html %s %s' % (
         options.sphinx._doctrees,
         options.sphinx._sourcedir,
-        options.sphinx._htmldir))
+        htmldir))
     # a .nojekyll file at the root of the gh-pages repository disable
     # Jekyll (http://github.com/blog/572-bypassing-jekyll-on-github-pages)
     no_jekyll = options.gh_pages.htmlroot / '.nojekyll'
-    no_jekyll.touch()
+    if sync:
+        if options.gh_pages.htmlroot == options.sphinx._htmldir:
+            (htmldir / '.nojekyll').touch()
+        counts = dry('Synchronise %s with %s' % (
+                options.sphinx._htmldir, htmldir),
+            sync_tree, htmldir, options.sphinx._htmldir)
+        if counts is not None:
+            info('%d files unchanged, %d updated, %d removed.' % counts)
+        dry('Remove %s' % htmldir, htmldir.rmtree)
+        if not no_jekyll.exists():
+            no_jekyll.touch()
+    else:
+        no_jekyll.touch()
     
\ No newline at end of file
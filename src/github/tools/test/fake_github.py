@@ -0,0 +1,235 @@
+"""
+In-process fake of the GitHub API (v2, JSON), for tests and benchmarks.
+
+It implements the repository create, show and list endpoints, with
+configurable latency, error rate and rate limit::
+
+    with FakeGitHub(latency=0.01, rate_limit=100) as github:
+        client = GitHubClient(github.url)
+        GitHubProject.get_project('foo', 'damien', client=client)
+"""
+from __future__ import with_statement
+from BaseHTTPServer import BaseHTTPRequestHandler
+import cgi
+import gzip
+import hashlib
+import math
+import random
+import threading
+import time
+import urlparse
+import StringIO
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+from github.tools.test.utils import _ThreadingHTTPServer
+
+__all__ = ['FakeGitHub']
+
+
+class _FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def do_GET(self):
+        self._handle()
+
+    do_POST = do_GET
+
+    def _handle(self):
+        github = self.server.github
+        length = int(self.headers.get('content-length', 0))
+        body = self.rfile.read(length)
+
+        latency = github.latency
+        if callable(latency):
+            latency = latency()
+        if latency:
+            time.sleep(latency)
+
+        status, headers, content = github.dispatch(
+            self.command, self.path, body, self.headers)
+
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if status == 200 and self.command == 'GET':
+            headers['ETag'] = etag
+            if self.headers.get('if-none-match') == etag:
+                status, content = 304, ''
+        if content and github.gzip \
+                and 'gzip' in self.headers.get('accept-encoding', ''):
+            buf = StringIO.StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(content)
+            f.close()
+            content = buf.getvalue()
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(content))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGitHub(object):
+    """
+    Fake GitHub API server, running in a background thread.
+
+    :param users: dict of login/token; if set, creating a repository
+        requires valid credentials.
+    :param latency: delay, in seconds, before each response; it can
+        be a function returning the delay.
+    :param error_rate: probability of a "500 Internal Server Error" response.
+    :param rate_limit: number of requests allowed per ``rate_window``
+        seconds; once exhausted, requests get a "403 Forbidden" response.
+    :param page_size: number of repositories per page of a listing.
+    :param gzip: compress the responses when the client accepts it.
+
+    ``repos`` maps (owner, name) to the repository details, and
+    ``requests`` counts the requests received.
+    """
+
+    def __init__(self, users=None, latency=0, error_rate=0,
+            rate_limit=5000, rate_window=3600, page_size=30, gzip=True,
+            seed=None):
+        self.users = users
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.page_size = page_size
+        self.gzip = gzip
+        self.repos = {}
+        self.requests = 0
+        self.remaining = rate_limit
+        self.reset = time.time() + rate_window
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/api/v2/json/' % (
+            self.server.server_address[1],)
+
+    def add_repo(self, owner, name, description='', is_public=True):
+        """
+        Create a repository, without going through the API.
+        """
+        details = {
+            'name': name,
+            'owner': owner,
+            'description': description,
+            'private': not is_public,
+            'url': 'http://github.com/%s/%s' % (owner, name),
+            'homepage': '',
+            'watchers': 1,
+            'forks': 0,
+            'fork': False,
+            }
+        with self._lock:
+            self.repos[(owner, name)] = details
+        return details
+
+    def dispatch(self, method, path, body, headers):
+        """
+        Return the (status, headers, body) response to a request.
+        """
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            if now >= self.reset:
+                self.remaining = self.rate_limit
+                self.reset = now + self.rate_window
+            resp_headers = {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Reset': '%d' % math.ceil(self.reset),
+                }
+            if self.remaining <= 0:
+                resp_headers['X-RateLimit-Remaining'] = '0'
+                return 403, resp_headers, json.dumps(
+                    {'error': 'API rate limit exceeded'})
+            self.remaining -= 1
+            resp_headers['X-RateLimit-Remaining'] = str(self.remaining)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 500, resp_headers, json.dumps({'error': 'Server error'})
+
+        url = urlparse.urlsplit(path)
+        parts = url.path.strip('/').split('/')
+        if parts[:3] != ['api', 'v2', 'json']:
+            return 404, resp_headers, json.dumps({'error': 'Not found'})
+        parts = parts[3:]
+        query = dict(cgi.parse_qsl(url.query))
+
+        if method == 'POST' and parts == ['repos', 'create']:
+            status, data = self._create(dict(cgi.parse_qsl(body)))
+        elif method == 'GET' and parts[:2] == ['repos', 'show'] \
+                and len(parts) == 4:
+            status, data = self._show(parts[2], parts[3])
+        elif method == 'GET' and parts[:2] == ['repos', 'show'] \
+                and len(parts) == 3:
+            status, data = self._list(
+                parts[2], query, url.path, resp_headers)
+        else:
+            status, data = 404, {'error': 'Not found'}
+        return status, resp_headers, json.dumps(data)
+
+    def _create(self, data):
+        login = data.get('login')
+        if self.users is not None \
+                and (login not in self.users
+                or self.users[login] != data.get('token')):
+            return 401, {'error': 'Not authorized'}
+        name = data.get('name')
+        if not name:
+            return 422, {'error': 'Name is required'}
+        if (login, name) in self.repos:
+            return 422, {'error': 'Name has already been taken'}
+        details = self.add_repo(login, name,
+            description=data.get('description', ''),
+            is_public=data.get('public', '1') != '0')
+        return 200, {'repository': details}
+
+    def _show(self, owner, name):
+        details = self.repos.get((owner, name))
+        if details is None:
+            return 404, {'error': 'Repository not found'}
+        return 200, {'repository': details}
+
+    def _list(self, owner, query, path, headers):
+        with self._lock:
+            repos = [details for key, details in sorted(self.repos.items())
+                if key[0] == owner]
+        try:
+            page = max(1, int(query.get('page', 1)))
+        except ValueError:
+            page = 1
+        last_page = max(1, (len(repos) - 1) // self.page_size + 1)
+        start = (page - 1) * self.page_size
+        if page < last_page:
+            base = 'http://%s:%d%s' % (
+                self.server.server_address + (path,))
+            headers['Link'] = '<%s?page=%d>; rel="next", ' \
+                '<%s?page=%d>; rel="last"' % (base, page + 1, base, last_page)
+        return 200, {'repositories': repos[start:start + self.page_size]}
+
+    def __enter__(self):
+        self.server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), _FakeGitHubHandler)
+        self.server.github = self
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,))
+        self.thread.setDaemon(True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,322 @@
+from __future__ import with_statement
+import httplib
+import os
+import socket
+import threading
+import time
+import unittest
+import urllib2
+
+from mock import Mock
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+from github.tools.test.utils import eq_, ok_, StubServer, TempDir
+from github.tools.client import GitHubClient, ResponseCache, RateLimiter
+
+
+class TestGitHubClient(unittest.TestCase):
+    
+    def test_url(self):
+        client = GitHubClient('http://localhost/api/v2/json')
+        eq_('http://localhost/api/v2/json/repos/show/damien/foo',
+            client.url('repos/show/damien/foo'))
+    
+    def test_keep_alive(self):
+        with StubServer((200, {}, '{}')) as server:
+            client = GitHubClient(server.url)
+            client.get('repos/show/damien/foo')
+            client.get('repos/show/damien/bar')
+            client.post('repos/create', {'name': 'foo'})
+        ports = set([request[4] for request in server.requests])
+        eq_(3, len(server.requests))
+        eq_(1, len(ports))
+    
+    def test_gzip(self):
+        with StubServer((200, {}, '{"foo": "bar"}'), gzip=True) as server:
+            response = GitHubClient(server.url).get('foo')
+        eq_('gzip', response.getheader('Content-Encoding'))
+        eq_('{"foo": "bar"}', response.read())
+    
+    def test_error(self):
+        with StubServer((404, {}, '{"error": "not found"}')) as server:
+            client = GitHubClient(server.url)
+            try:
+                client.get('repos/show/damien/foo')
+            except urllib2.HTTPError, e:
+                eq_(404, e.code)
+                eq_('{"error": "not found"}', e.read())
+            else:
+                ok_(False, 'HTTPError not raised')
+            # the connection is still usable
+            server.default = (200, {}, '{}')
+            eq_('{}', client.get('repos/show/damien/foo').read())
+    
+    def test_reconnect(self):
+        with StubServer((200, {'Connection': 'close'}, '{}')) as server:
+            client = GitHubClient(server.url)
+            client.get('foo')
+            client.get('foo')
+        eq_(2, len(server.requests))
+    
+    def test_stale_connection(self):
+        with StubServer((200, {}, '{}')) as server:
+            client = GitHubClient(server.url)
+            key = ('http', '127.0.0.1:%d' % server.server.server_address[1])
+            def stale(error, method):
+                conn = Mock()
+                getattr(conn, method).side_effect = error
+                client._idle[key] = [conn]
+            
+            # an idempotent request is sent again
+            stale(httplib.BadStatusLine(''), 'getresponse')
+            eq_('{}', client.get('foo').read())
+            
+            # a POST request might have been processed
+            stale(httplib.BadStatusLine(''), 'getresponse')
+            self.assertRaises(httplib.BadStatusLine,
+                client.post, 'repos/create', {'name': 'foo'})
+            
+            # unless it could not be sent
+            stale(httplib.CannotSendRequest(), 'request')
+            client.post('repos/create', {'name': 'foo'})
+        eq_(['GET', 'POST'], [request[0] for request in server.requests])
+    
+    def test_timeout(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        try:
+            client = GitHubClient(
+                'http://127.0.0.1:%d/' % listener.getsockname()[1],
+                timeout=0.1)
+            start = time.time()
+            self.assertRaises(socket.timeout, client.get, 'foo')
+            ok_(time.time() - start < 5)
+        finally:
+            listener.close()
+
+
+class TestResponseCache(unittest.TestCase):
+    
+    def test_revalidate(self):
+        with TempDir() as tmp:
+            cache = ResponseCache(tmp / 'cache')
+            with StubServer() as server:
+                server.responses = [
+                    (200, {'ETag': '"abc"'}, '{"foo": "bar"}'),
+                    (304, {}, ''),
+                    ]
+                client = GitHubClient(server.url, cache=cache)
+                eq_('{"foo": "bar"}', client.get('foo').read())
+                response = client.get('foo')
+            eq_(200, response.status)
+            eq_('{"foo": "bar"}', response.read())
+            eq_(None, server.requests[0][3].get('if-none-match'))
+            eq_('"abc"', server.requests[1][3].get('if-none-match'))
+            eq_(1, cache.hits)
+            eq_(1, cache.misses)
+    
+    def test_last_modified(self):
+        last_modified = 'Sat, 01 Jan 2011 00:00:00 GMT'
+        with TempDir() as tmp:
+            cache = ResponseCache(tmp)
+            with StubServer() as server:
+                server.responses = [
+                    (200, {'Last-Modified': last_modified}, '{}'),
+                    (304, {}, ''),
+                    ]
+                client = GitHubClient(server.url, cache=cache)
+                client.get('foo')
+                client.get('foo')
+            eq_(last_modified,
+                server.requests[1][3].get('if-modified-since'))
+            eq_(1, cache.hits)
+    
+    def test_not_cached(self):
+        with TempDir() as tmp:
+            cache = ResponseCache(tmp)
+            with StubServer((200, {}, '{}')) as server:
+                client = GitHubClient(server.url, cache=cache)
+                client.get('foo')
+                client.get('foo')
+            eq_(None, server.requests[1][3].get('if-none-match'))
+            eq_(0, cache.hits)
+            eq_(2, cache.misses)
+    
+    def test_eviction(self):
+        with TempDir() as tmp:
+            cache = ResponseCache(tmp, max_size=1500)
+            with StubServer((200, {'ETag': '"abc"'}, 'x' * 400)) as server:
+                client = GitHubClient(server.url, cache=cache)
+                client.get('foo')
+                client.get('bar')
+                # "foo" is revalidated, "bar" is the least recently used
+                server.default = (304, {}, '')
+                client.get('foo')
+                server.default = (200, {'ETag': '"abc"'}, 'x' * 400)
+                client.get('baz')
+            ok_(cache.get(client.url('foo')) is not None)
+            ok_(cache.get(client.url('bar')) is None)
+            ok_(cache.get(client.url('baz')) is not None)
+            
+            # a new instance finds the cached files
+            eq_('x' * 400, ResponseCache(tmp).get(client.url('baz')).read())
+    
+    def test_storage(self):
+        with TempDir() as tmp:
+            cache = ResponseCache(tmp / 'cache')
+            with StubServer() as server:
+                server.responses = [
+                    (200, {'ETag': '"abc"'}, '{"name": "caf\xc3\xa9"}'),
+                    (200, {'ETag': '"def"'}, '\xff\xfe'),
+                    ]
+                client = GitHubClient(server.url, cache=cache)
+                client.get('foo')
+                client.get('bar')
+            eq_(0700, os.stat(tmp / 'cache').st_mode & 0777)
+            file_path = cache._path(client.url('foo'))
+            with open(file_path) as f:
+                entry = json.load(f)
+            eq_(200, entry['status'])
+            eq_('"abc"', entry['headers']['etag'])
+            response = cache.get(client.url('foo'))
+            eq_('{"name": "caf\xc3\xa9"}', response.read())
+            eq_('"abc"', response.getheader('ETag'))
+            ok_(isinstance(response.getheader('ETag'), str))
+            # a body that isn't UTF-8 encoded isn't cached
+            eq_(None, cache.get(client.url('bar')))
+            
+            # files in another format are ignored
+            with open(file_path, 'w') as f:
+                f.write('garbage')
+            eq_(None, cache.get(client.url('foo')))
+
+
+class TestRateLimiter(unittest.TestCase):
+    
+    def test_pacing(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        start = time.time()
+        for _ in range(11):
+            limiter.acquire()
+        ok_(time.time() - start >= 0.09)
+        eq_(11, limiter.requests)
+        ok_(limiter.wait_time > 0)
+    
+    def test_priority(self):
+        limiter = RateLimiter(rate=1000, burst=1)
+        limiter.paused_until = time.time() + 0.2
+        served = []
+        def request(priority):
+            limiter.acquire(priority)
+            served.append(priority)
+        threads = []
+        for priority in (RateLimiter.PRIORITY_BULK,
+                RateLimiter.PRIORITY_NORMAL, RateLimiter.PRIORITY_HIGH):
+            thread = threading.Thread(target=request, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        eq_([RateLimiter.PRIORITY_HIGH, RateLimiter.PRIORITY_NORMAL,
+            RateLimiter.PRIORITY_BULK], served)
+        eq_(3, limiter.waits)
+    
+    def test_quota_exhausted(self):
+        limiter = RateLimiter()
+        ok_(not limiter.update(200, {
+            'x-ratelimit-remaining': '0',
+            'x-ratelimit-reset': str(time.time() + 0.2)}))
+        start = time.time()
+        limiter.acquire()
+        ok_(time.time() - start >= 0.1)
+    
+    def test_permission_error(self):
+        ok_(not RateLimiter().update(403, {}))
+    
+    def test_permission_error_with_quota(self):
+        limiter = RateLimiter(rate=10)
+        ok_(not limiter.update(403, {
+            'x-ratelimit-limit': '5000',
+            'x-ratelimit-remaining': '4990',
+            'x-ratelimit-reset': str(time.time() + 3600)},
+            '{"message": "Resource not accessible by integration"}'))
+        eq_(0, limiter.throttled)
+        eq_(10, limiter.rate)
+        eq_(0, limiter.paused_until)
+        
+        # a secondary rate limit is reported in the body
+        ok_(limiter.update(403, {
+            'x-ratelimit-limit': '5000',
+            'x-ratelimit-remaining': '4989',
+            'x-ratelimit-reset': str(time.time() + 3600)},
+            '{"message": "You have exceeded a secondary rate limit."}'))
+        eq_(1, limiter.throttled)
+        ok_(limiter.rate < 10)
+    
+    def test_permission_error_not_retried(self):
+        with StubServer((403, {
+                'X-RateLimit-Remaining': '4990',
+                'X-RateLimit-Reset': str(int(time.time() + 3600))},
+                '{"message": "Must have admin rights"}')) as server:
+            client = GitHubClient(server.url, limiter=RateLimiter())
+            try:
+                client.get('foo')
+            except urllib2.HTTPError, e:
+                eq_(403, e.code)
+            else:
+                ok_(False, 'HTTPError not raised')
+        eq_(1, len(server.requests))
+    
+    def test_secondary_limit(self):
+        with StubServer() as server:
+            server.responses = [
+                (403, {'Retry-After': '0'}, '{"message": "slow down"}'),
+                (429, {'Retry-After': '0'}, '{"message": "slow down"}'),
+                (200, {}, '{}'),
+                ]
+            limiter = RateLimiter(rate=10)
+            client = GitHubClient(server.url, limiter=limiter)
+            eq_('{}', client.get('foo').read())
+        eq_(3, len(server.requests))
+        eq_(2, limiter.throttled)
+        ok_(limiter.rate < 10)
+    
+    def test_max_retries(self):
+        with StubServer((429, {'Retry-After': '0'}, '{}')) as server:
+            client = GitHubClient(
+                server.url, limiter=RateLimiter(), max_retries=2)
+            try:
+                client.get('foo')
+            except urllib2.HTTPError, e:
+                eq_(429, e.code)
+            else:
+                ok_(False, 'HTTPError not raised')
+        eq_(3, len(server.requests))
+
+
+class TestPagination(unittest.TestCase):
+    
+    def test_iter_pages(self):
+        def reply(path):
+            page = int(path.split('=')[-1])
+            headers = {}
+            if page < 3:
+                headers['Link'] = (
+                    '<%spages?page=%d>; rel="next", '
+                    '<%spages?page=3>; rel="last"' % (
+                        server.url, page + 1, server.url))
+            return 200, headers, '[%d]' % page
+        with StubServer(reply, latency=0.05) as server:
+            client = GitHubClient(server.url)
+            pages = client.iter_pages('pages?page=1')
+            eq_('[1]', pages.next().body)
+            # the second page is fetched in the background
+            time.sleep(0.1)
+            eq_(2, len(server.requests))
+            eq_(['[2]', '[3]'], [page.body for page in pages])
@@ -0,0 +1,72 @@
+import unittest
+
+from mock import Mock, patch
+
+try:
+    import json #@UnresolvedImport
+except ImportError:
+    import simplejson as json
+
+from github.tools.test.utils import eq_, ok_
+from github.tools import decoder
+
+
+class TestDecoder(unittest.TestCase):
+
+    def tearDown(self):
+        decoder.set_backend()
+
+    def test_set_backend(self):
+        ok_('json' in decoder.available_backends())
+        decoder.set_backend('json')
+        eq_('json', decoder.backend)
+        eq_({'name': 'foo'}, decoder.loads('{"name": "foo"}'))
+        self.assertRaises(ValueError, decoder.set_backend, 'missing')
+        eq_('json', decoder.backend)
+
+    def test_iter_json_items(self):
+        text = ('{"total": {"count": [1, 2]}, "repositories" : '
+            '[ {"name": "foo"} , {"name": "bar"}], "other": 1}')
+        eq_([{'name': 'foo'}, {'name': 'bar'}],
+            list(decoder.iter_json_items(text, 'repositories')))
+        eq_([1, "2", None], list(decoder.iter_json_items(' [1, "2", null] ')))
+        eq_([], list(decoder.iter_json_items(
+            '{"repositories": []}', 'repositories')))
+        eq_([], list(decoder.iter_json_items('{"other": [1]}', 'repositories')))
+
+    def test_project(self):
+        text = ('{"repository": {"name": "foo", "owner": {"login": "damien"},'
+            ' "url": "http://github.com/damien/foo", "private": false}}')
+        eq_({'name': 'foo', 'owner': {'login': 'damien'}, 'private': False},
+            decoder.project(text, ('name', 'owner', 'private', 'description'),
+                'repository'))
+        self.assertRaises(KeyError, decoder.project, text, ('name',), 'other')
+
+    def test_iter_projected_items(self):
+        text = ('{"repositories": [{"name": "foo", "fork": true},'
+            ' {"name": "bar", "watchers": 3}]}')
+        eq_([{'name': 'foo'}, {'name': 'bar'}],
+            list(decoder.iter_projected_items(text, ('name',), 'repositories')))
+
+    def test_listing_backend(self):
+        text = '{"repositories": [{"name": "foo"}, {"name": "bar"}]}'
+        stdlib = json.JSONDecoder()
+        raw_decode = Mock(side_effect=stdlib.raw_decode)
+        whole = Mock(side_effect=json.loads)
+        backends = [('raw', json.loads, raw_decode), ('whole', whole, None)]
+        with patch.object(decoder, '_BACKENDS', backends):
+            # the listings are decoded with the selected backend
+            decoder.set_backend('raw')
+            eq_([{'name': 'foo'}, {'name': 'bar'}],
+                list(decoder.iter_json_items(text, 'repositories')))
+            ok_(raw_decode.call_count > 2)
+
+            # or at once, if it has no raw decoder
+            decoder.set_backend('whole')
+            eq_([{'name': 'foo'}, {'name': 'bar'}],
+                list(decoder.iter_json_items(text, 'repositories')))
+            eq_(1, whole.call_count)
+            eq_([], list(decoder.iter_json_items(text, 'other')))
+            eq_([1, 2], list(decoder.iter_json_items('[1, 2]')))
+            self.assertRaises(ValueError, list,
+                decoder.iter_json_items('[1]', 'repositories'))
@@ -0,0 +1,184 @@
+from __future__ import with_statement
+import errno
+import os
+import unittest
+
+from mock import patch
+
+from github.tools.test.utils import eq_, ok_, TempDir
+
+from github.tools import fsutils
+from github.tools.fsutils import same_file, sync_tree
+
+
+def _write(file_path, content):
+    with open(file_path, 'w') as f:
+        f.write(content)
+
+
+def _tree(root, files):
+    root.mkdir()
+    for name, content in files.items():
+        file_path = root / name
+        if not file_path.parent.exists():
+            file_path.parent.makedirs()
+        _write(file_path, content)
+
+
+def _read_tree(root):
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in file_names:
+            file_path = os.path.join(dir_path, name)
+            with open(file_path) as f:
+                files[file_path[len(root) + 1:]] = f.read()
+    return files
+
+
+class TestSameFile(unittest.TestCase):
+
+    def test_same_file(self):
+        with TempDir() as tmp:
+            _write(tmp / 'a', 'content')
+            _write(tmp / 'b', 'content')
+            _write(tmp / 'c', 'contenT')
+            ok_(same_file(tmp / 'a', tmp / 'b'))
+            ok_(not same_file(tmp / 'a', tmp / 'c'))
+            os.chmod(tmp / 'b', 0755)
+            ok_(not same_file(tmp / 'a', tmp / 'b'))
+            os.symlink('a', tmp / 'link-a')
+            os.symlink('a', tmp / 'link-b')
+            os.symlink('c', tmp / 'link-c')
+            ok_(same_file(tmp / 'link-a', tmp / 'link-b'))
+            ok_(not same_file(tmp / 'link-a', tmp / 'link-c'))
+            ok_(not same_file(tmp / 'a', tmp / 'link-a'))
+
+
+class TestSyncTree(unittest.TestCase):
+
+    def test_sync_tree(self):
+        with TempDir() as tmp:
+            _tree(tmp / 'dest', {
+                'index.html': 'index',
+                'stale.html': 'stale',
+                'page.html': 'old page',
+                'file-to-dir': 'file',
+                'dir-to-file/x': 'x',
+                '_static/style.css': 'style',
+                '_static/stale.js': 'stale',
+                '.git': 'gitdir: ../.git/modules/html'})
+            _tree(tmp / 'source', {
+                'index.html': 'index',
+                'page.html': 'new page',
+                'new/page.html': 'new',
+                'file-to-dir/x': 'x',
+                'dir-to-file': 'file',
+                '_static/style.css': 'style'})
+            index_st = os.lstat(tmp / 'dest' / 'index.html')
+            style_st = os.lstat(tmp / 'dest' / '_static' / 'style.css')
+
+            eq_((2, 4, 2), sync_tree(tmp / 'source', tmp / 'dest'))
+            eq_({'index.html': 'index',
+                'page.html': 'new page',
+                'new/page.html': 'new',
+                'file-to-dir/x': 'x',
+                'dir-to-file': 'file',
+                '_static/style.css': 'style',
+                '.git': 'gitdir: ../.git/modules/html'},
+                _read_tree(tmp / 'dest'))
+            for name, st in (('index.html', index_st),
+                    ('_static/style.css', style_st)):
+                new_st = os.lstat(tmp / 'dest' / name)
+                eq_((st.st_ino, st.st_mtime), (new_st.st_ino, new_st.st_mtime))
+            eq_((6, 0, 0), sync_tree(tmp / 'dest', tmp / 'dest'))
+
+    def test_new_dest(self):
+        with TempDir() as tmp:
+            _tree(tmp / 'source', {'index.html': 'index'})
+            eq_((0, 1, 0), sync_tree(tmp / 'source', tmp / 'build' / 'html'))
+            eq_({'index.html': 'index'}, _read_tree(tmp / 'build' / 'html'))
+
+    def test_other_file_system(self):
+        with TempDir() as tmp:
+            _tree(tmp / 'dest', {'index.html': 'index'})
+            _tree(tmp / 'source', {'index.html': 'new index',
+                'new/page.html': 'new'})
+            os.symlink('index.html', tmp / 'source' / 'link.html')
+            with patch('os.rename') as rename:
+                rename.side_effect = OSError(errno.EXDEV, 'Cross-device link')
+                eq_((0, 3, 0), sync_tree(tmp / 'source', tmp / 'dest'))
+            eq_({'index.html': 'new index', 'new/page.html': 'new',
+                'link.html': 'new index'}, _read_tree(tmp / 'dest'))
+            ok_(os.path.islink(tmp / 'dest' / 'link.html'))
+
+
+class TestRemovePaths(unittest.TestCase):
+
+    def _tree(self, root):
+        _tree(root, {
+            'index.html': 'index',
+            '.git': 'gitdir: ../.git/modules/html',
+            '_static/style.css': 'style',
+            '_static/js/a.js': 'a',
+            '_static/js/b.js': 'b'})
+        for i in range(600):
+            _write(root / '_static' / ('%d.png' % i), 'png')
+        os.symlink('_static', root / 'static')
+
+    def test_remove_paths(self):
+        with TempDir() as tmp:
+            self._tree(tmp / 'html')
+            _tree(tmp / 'other', {'kept.html': 'kept'})
+            os.symlink(tmp / 'other', tmp / 'html' / 'other')
+            counts = []
+            paths = [tmp / 'html' / name for name in os.listdir(tmp / 'html')
+                if name != '.git']
+            eq_(606, fsutils.remove_paths(paths, jobs=4,
+                callback=counts.append))
+            eq_(['.git'], os.listdir(tmp / 'html'))
+            eq_(['kept.html'], os.listdir(tmp / 'other'))
+            eq_(606, counts[-1])
+            eq_(sorted(counts), counts)
+
+    def test_without_scandir(self):
+        with TempDir() as tmp:
+            self._tree(tmp / 'html')
+            with patch('github.tools.fsutils._scandir', None):
+                eq_(606, fsutils.remove_paths([tmp / 'html'], jobs=1))
+            ok_(not os.path.exists(tmp / 'html'))
+
+    def test_error(self):
+        with TempDir() as tmp:
+            self._tree(tmp / 'html')
+            with patch('os.unlink') as unlink:
+                unlink.side_effect = OSError(errno.EACCES, 'Permission denied')
+                self.assertRaises(OSError,
+                    fsutils.remove_paths, [tmp / 'html'])
+            ok_(os.path.exists(tmp / 'html' / 'index.html'))
+
+    def test_move_aside(self):
+        with TempDir() as tmp:
+            self._tree(tmp / 'html')
+            trash = fsutils.move_aside(tmp / 'html')
+            eq_(tmp, os.path.dirname(trash))
+            ok_(os.path.basename(trash).startswith('.html-trash-'))
+            eq_(['.git'], os.listdir(tmp / 'html'))
+            eq_(['_static', 'index.html', 'static'], sorted(os.listdir(trash)))
+
+            results = []
+            thread = fsutils.remove_in_background([trash],
+                callback=results.append)
+            thread.join()
+            eq_([605], results)
+            ok_(not os.path.exists(trash))
+
+    def test_move_aside_trash_dir(self):
+        with TempDir() as tmp:
+            self._tree(tmp / 'html')
+            git_dir = tmp / '.git' / 'modules' / 'html'
+            git_dir.makedirs()
+            trash = fsutils.move_aside(tmp / 'html', trash_dir=git_dir)
+            eq_(git_dir, os.path.dirname(trash))
+            ok_(os.path.basename(trash).startswith('.html-trash-'))
+            eq_(['.git'], os.listdir(tmp / 'html'))
+            eq_(['_static', 'index.html', 'static'], sorted(os.listdir(trash)))
@@ -5,16 +5,19 @@ Created on 19 Apr 2009
 """
 from __future__ import with_statement
 from StringIO import StringIO
-from ConfigParser import RawConfigParser
 import os
 import unittest
+import urllib2
 import cgi
 
+from git import Git
 from mock import patch, Mock
 
-from github.tools.test.utils import eq_, ok_,TempDir, path
+from github.tools.test.utils import eq_, ok_,TempDir, path, StubServer
+from github.tools.client import GitHubClient, RateLimiter
+from github.tools.test.fake_github import FakeGitHub
 from github.tools.gh_pages import Credentials, GitHubRepo, GitHubProject,\
-    GitmoduleReader, Submodule, Repo
+    Submodule, Repo
 
 
 class TestCredentials(unittest.TestCase):
@@ -59,6 +62,19 @@ class TestProject(unittest.TestCase):
         eq_('git://github.com/damien/foo.git',project.url.git)
         eq_('http://github.com/damien/foo/issues',project.url.issue)
 
+    def test_url_memoized(self):
+        project = GitHubProject(name='foo', owner='damien')
+        ok_(not hasattr(project, '__dict__'))
+        ok_(project._url is None)
+        url = project.url
+        ok_(url is project.url)
+        eq_('http://github.com/damien/foo', url.http)
+        project.name = 'bar'
+        eq_('http://github.com/damien/bar', url.http)
+        project.owner = 'bob'
+        eq_('git@github.com:bob/bar.git', url.ssh)
+        eq_('http://github.com/bob/bar', url.http)
+
     def test_get_project_from_json(self):
         project = GitHubProject.get_project_from_json(
                 StringIO(self.GITHUB_JSON_RESPONSE))
@@ -68,29 +84,65 @@ class TestProject(unittest.TestCase):
         eq_(True, project.is_public)
         eq_('git@github.com:damien/foo.git',project.url.ssh)
         
-    @patch('urllib2.urlopen')
-    def test_get_project(self, urlopen_mock):
-        urlopen_mock.return_value = StringIO(self.GITHUB_JSON_RESPONSE)
-        
-        project = GitHubProject.get_project('foo', 'damien')
-        urlopen_mock.assert_called_with('http://github.com/api/v2/json/repos/show/damien/foo')
+    def test_get_project(self):
+        with StubServer((200, {}, self.GITHUB_JSON_RESPONSE)) as server:
+            client = GitHubClient(server.url)
+            project = GitHubProject.get_project('foo', 'damien', client=client)
+        eq_('GET', server.requests[0][0])
+        eq_('/repos/show/damien/foo', server.requests[0][1])
         eq_('foo', project.name)
         eq_('damien', project.owner)
         eq_('just a test' , project.description)
         eq_(True, project.is_public)
         eq_('git@github.com:damien/foo.git',project.url.ssh)
     
-    @patch('urllib2.urlopen')    
-    def test_create(self, urlopen_mock):
-        urlopen_mock.return_value = StringIO(self.GITHUB_JSON_RESPONSE)
+    def test_get_projects(self):
+        def reply(url):
+            owner, name = url.split('/')[-2:]
+            if name == 'missing':
+                return 404, {}, '{"error": "not found"}'
+            return 200, {}, self.GITHUB_JSON_RESPONSE.replace(
+                '"foo"', '"%s"' % name)
+        names = [('damien', 'foo'), ('damien', 'missing'), ('damien', 'bar')]
+        with StubServer(reply) as server:
+            projects = GitHubProject.get_projects(
+                names, client=GitHubClient(server.url), jobs=2)
+        eq_(3, len(projects))
+        eq_('foo', projects[0].name)
+        ok_(isinstance(projects[1], urllib2.HTTPError))
+        eq_(404, projects[1].code)
+        eq_('bar', projects[2].name)
+    
+    def test_iter_projects(self):
+        def reply(path):
+            page = int(path.partition('page=')[2] or 1)
+            headers = {}
+            if page == 1:
+                headers['Link'] = '<%srepos/show/damien?page=2>; rel="next"' % (
+                    server.url,)
+            projects = ['{"name": "foo-%d-%d", "owner": "damien", '
+                '"description": "", "private": false}' % (page, i)
+                for i in range(2)]
+            return 200, headers, '{"repositories": [%s]}' % ', '.join(projects)
+        with StubServer(reply) as server:
+            projects = GitHubProject.iter_projects(
+                'damien', client=GitHubClient(server.url))
+            eq_(['foo-1-0', 'foo-1-1', 'foo-2-0', 'foo-2-1'],
+                [project.name for project in projects])
+        eq_('/repos/show/damien', server.requests[0][1])
+    
+    def test_create(self):
         credentials = Credentials('damien', 'xyz')
-        project = GitHubProject.create(
-            'foo', credentials, description='just a test', is_public=True)
+        with StubServer((200, {}, self.GITHUB_JSON_RESPONSE)) as server:
+            project = GitHubProject.create(
+                'foo', credentials, description='just a test', is_public=True,
+                client=GitHubClient(server.url))
         
         # test request to github
-        url, data = urlopen_mock.call_args[0]
+        method, url, data = server.requests[0][:3]
         data_dict = dict(cgi.parse_qsl(data))
-        eq_('http://github.com/api/v2/json/repos/create', url)
+        eq_('POST', method)
+        eq_('/repos/create', url)
         eq_('foo', data_dict['name'])
         eq_('just a test', data_dict['description'])
         eq_('1', data_dict['public'])
@@ -104,6 +156,65 @@ class TestProject(unittest.TestCase):
         eq_(True, project.is_public)
         eq_('git@github.com:damien/foo.git',project.url.ssh)
         
+
+
+class TestProjectAPI(unittest.TestCase):
+    """
+    Test the GitHubProject API calls against the fake GitHub API.
+    """
+    
+    def test_create_and_get(self):
+        with FakeGitHub(users={'damien': 'xyz'}) as github:
+            client = GitHubClient(github.url)
+            GitHubProject.create('foo', Credentials('damien', 'xyz'),
+                description='just a test', client=client)
+            project = GitHubProject.get_project('foo', 'damien', client=client)
+            eq_('just a test', project.description)
+            eq_(True, project.is_public)
+            try:
+                GitHubProject.create('foo', Credentials('damien', 'xyz'),
+                    client=client)
+            except urllib2.HTTPError, e:
+                eq_(422, e.code)
+            else:
+                ok_(False, 'HTTPError not raised')
+    
+    def test_bad_credentials(self):
+        with FakeGitHub(users={'damien': 'xyz'}) as github:
+            client = GitHubClient(github.url)
+            self.assertRaises(urllib2.HTTPError, GitHubProject.create,
+                'foo', Credentials('damien', 'abc'), client=client)
+            eq_({}, github.repos)
+    
+    def test_iter_projects(self):
+        with FakeGitHub(page_size=2) as github:
+            for i in range(5):
+                github.add_repo('damien', 'foo-%d' % i)
+            github.add_repo('bob', 'bar')
+            client = GitHubClient(github.url)
+            names = [p.name for p in
+                GitHubProject.iter_projects('damien', client=client)]
+        eq_(['foo-%d' % i for i in range(5)], names)
+        eq_(3, github.requests)
+    
+    def test_errors(self):
+        with FakeGitHub(error_rate=1) as github:
+            github.add_repo('damien', 'foo')
+            projects = GitHubProject.get_projects(
+                [('damien', 'foo')], client=GitHubClient(github.url))
+        eq_(500, projects[0].code)
+    
+    def test_rate_limit(self):
+        with FakeGitHub(rate_limit=2, rate_window=0.3) as github:
+            github.add_repo('damien', 'foo')
+            limiter = RateLimiter()
+            client = GitHubClient(github.url, limiter=limiter)
+            projects = GitHubProject.get_projects(
+                [('damien', 'foo')] * 4, client=client, jobs=1)
+        eq_(['foo'] * 4, [p.name for p in projects])
+        eq_(4, github.requests)
+        ok_(limiter.wait_time > 0.1)
+        
         
 class TestRepo(unittest.TestCase):
     
@@ -125,23 +236,24 @@ class TestRepo(unittest.TestCase):
 
 class TestGitHubRepo():
     
-    @patch('urllib2.urlopen')
-    def test_register(self, urlopen_mock):
-        urlopen_mock.return_value = \
-            StringIO(TestProject.GITHUB_JSON_RESPONSE)
+    def test_register(self):
+        response = (200, {}, TestProject.GITHUB_JSON_RESPONSE)
         with TempDir() as tmp:
             repo = GitHubRepo.create(tmp)
             git_mock = Mock()
             repo.git = git_mock
             credentials = Credentials('damien', 'xyz')
-            repo.register(
-                'foo', credentials=credentials,
-                description='just a test', is_public=True)
+            with StubServer(response) as server:
+                with patch.object(
+                        GitHubProject, 'client', GitHubClient(server.url)):
+                    repo.register(
+                        'foo', credentials=credentials,
+                        description='just a test', is_public=True)
             
             # test project creation 
-            url, data = urlopen_mock.call_args[0]
+            url, data = server.requests[0][1:3]
             data_dict = dict(cgi.parse_qsl(data))
-            eq_('http://github.com/api/v2/json/repos/create', url)
+            eq_('/repos/create', url)
             eq_('foo', data_dict['name'])
             eq_('just a test', data_dict['description'])
             eq_('1', data_dict['public'])
@@ -154,8 +266,41 @@ class TestGitHubRepo():
             eq_(('origin', 'master'), git_mock.push.call_args[0])
             
     def test_add_gh_pages_submodule(self):
-        #assert False
-        pass
+        with TempDir() as tmp:
+            remote_path = tmp / 'remote.git'
+            os.mkdir(remote_path)
+            Git(remote_path).init('--bare')
+            local_path = tmp / 'local-repo'
+            repo = GitHubRepo.create(local_path, mk_dir=True)
+            with open(local_path / 'README', 'w') as f:
+                f.write('testing...')
+            repo.git.add('README')
+            repo.git.commit('-m', 'testing...')
+            repo.git.remote('add', 'origin', 'file://%s' % remote_path)
+            repo.git.push('origin', 'master')
+            
+            cwd = os.getcwd()
+            os.chdir(local_path)
+            try:
+                repo.add_gh_pages_submodule('docs')
+                module = repo.validate_gh_pages_submodule('docs')
+            finally:
+                os.chdir(cwd)
+            eq_(' ', module.status)
+            eq_(Git(remote_path).rev_parse('gh-pages'), module.sha)
+            eq_('', Git(remote_path).ls_tree('gh-pages', 'README'))
+    
+    def test_get(self):
+        with TempDir() as tmp:
+            Repo.create(tmp)
+            repo = GitHubRepo.get(tmp)
+            ok_(repo is GitHubRepo.get(tmp / '.'))
+            ok_(repo is not Repo.get(tmp))
+            ok_(isinstance(Repo.get(tmp), Repo))
+            eq_(None, repo.submodules._stamp)
+            Repo.invalidate(tmp)
+            ok_(repo is not GitHubRepo.get(tmp))
+            Repo.invalidate()
         
         
 
@@ -174,6 +319,10 @@ class TestSubmodule(unittest.TestCase):
             eq_('test', module.path)
             eq_('a'*40, module.sha)
             eq_(' ', module.status)
+            ok_(not hasattr(module, '__dict__'))
+            eq_(None, module._git)
+            eq_(local_path / 'test', module.git.get_dir)
+            ok_(module.git is module.git)
 
     def test_init(self):
         with TempDir() as tmp:
@@ -216,24 +365,141 @@ class TestSubmoduleDict(unittest.TestCase):
             ok_(os.path.exists(local_path / '.gitmodules'))
             eq_(1, len(local_repo.submodules))
             eq_('file://%s' % remote_path, local_repo.submodules['test'].url)
+            eq_(' ', local_repo.submodules['test'].status)
+            eq_(local_repo.git.rev_parse('HEAD:test'),
+                local_repo.submodules['test'].sha)
 
-class TestGitmoduleReader(unittest.TestCase):
-    
-    def test_readline(self):
-        cfg_txt = (
-            '[submodule "docs/build/html"]\n'
-            '\tpath = docs/build/html\n'
-            '\turl = git@github.com:damien/foo.git\n'
-            )
+    def test_cached(self):
         with TempDir() as tmp:
-            cfg_path = os.path.join(tmp, 'config')
-            with open(cfg_path, 'w') as f:
-                f.write(cfg_txt)
-            fp = GitmoduleReader(cfg_path)
-            cfg = RawConfigParser()
-            cfg.readfp(fp)
-            section_name = 'submodule "docs/build/html"'
-            eq_(section_name, cfg.sections()[0])
-            eq_('docs/build/html', cfg.get(section_name, 'path'))
-            eq_('git@github.com:damien/foo.git',
-                cfg.get(section_name, 'url'))
\ No newline at end of file
+            repo = Repo.create(tmp)
+            with open(tmp / '.gitmodules', 'w') as f:
+                f.write('[submodule "docs"]\n\tpath = docs\n'
+                    '\turl = git@github.com:damien/foo.git\n')
+            repo.submodules.clear()
+            with patch.object(repo.git, 'submodule') as submodule_mock:
+                ok_('docs/' in repo.submodules)
+                eq_('git@github.com:damien/foo.git',
+                    repo.submodules['docs'].url)
+                eq_(0, submodule_mock.call_count)
+            docs = repo.submodules['docs']
+            
+            with open(tmp / '.gitmodules', 'a') as f:
+                f.write('[submodule "other"]\n\tpath = other\n'
+                    '\turl = git@github.com:damien/bar.git\n')
+            os.utime(tmp / '.gitmodules', (0, 0))
+            eq_(['docs', 'other'], sorted(repo.submodules.keys()))
+            eq_(None, repo.submodules['other'].status)
+            ok_(docs is repo.submodules['docs'])
+            eq_(['docs', 'other'], sorted(repo.submodules.viewkeys()))
+
+    def _remotes(self, tmp, count):
+        urls = []
+        for i in range(count):
+            remote_path = tmp / ('remote-%d' % i)
+            remote_repo = Repo.create(remote_path, mk_dir=True)
+            with open(remote_path / 'test.txt', 'w') as f:
+                f.write('testing...')
+            remote_repo.git.add('test.txt')
+            remote_repo.git.commit('-m', 'testing...')
+            urls.append('file://%s' % remote_path)
+        return urls
+
+    def test_init_all(self):
+        with TempDir() as tmp:
+            urls = self._remotes(tmp, 3)
+            local_path = tmp / 'local-repo'
+            local_repo = Repo.create(local_path, mk_dir=True)
+            with open(local_path / '.gitmodules', 'w') as f:
+                for i, url in enumerate(urls):
+                    f.write('[submodule "mod%d"]\n\tpath = mod%d\n'
+                        '\turl = %s\n' % (i, i, url))
+                f.write('[submodule "bad"]\n\tpath = bad\n'
+                    '\turl = file://%s\n' % (tmp / 'missing'))
+            reported = []
+            results = local_repo.submodules.init_all(
+                jobs=4, callback=lambda path, error: reported.append(path))
+            eq_(['bad', 'mod0', 'mod1', 'mod2'], sorted(reported))
+            eq_([None] * 3, [results['mod%d' % i] for i in range(3)])
+            ok_(results['bad'] is not None)
+            for i in range(3):
+                eq_(' ', local_repo.submodules['mod%d' % i].status)
+                ok_(os.path.exists(local_path / ('mod%d/test.txt' % i)))
+            eq_('1', local_repo.git.rev_list('--count', 'HEAD'))
+
+    def test_active_branch(self):
+        with TempDir() as tmp:
+            urls = self._remotes(tmp, 1)
+            local_path = tmp / 'local-repo'
+            local_repo = GitHubRepo(Repo.create(local_path, mk_dir=True).wd)
+            local_repo.submodules.add(urls[0], 'docs')
+            module = local_repo.submodules['docs']
+            eq_('master', module.active_branch)
+            ok_(module.has_branch('master'))
+            ok_(not module.has_branch('gh-pages'))
+            self.assertRaises(ValueError,
+                local_repo.validate_gh_pages_submodule, 'docs')
+            Git(local_path / 'docs').checkout('-b', 'gh-pages')
+            ok_(module.has_branch('gh-pages'))
+            with patch('subprocess.Popen') as popen_mock:
+                eq_(module, local_repo.validate_gh_pages_submodule('docs'))
+                eq_(0, popen_mock.call_count)
+
+    def test_add_many(self):
+        with TempDir() as tmp:
+            urls = self._remotes(tmp, 3)
+            local_path = tmp / 'local-repo'
+            local_repo = Repo.create(local_path, mk_dir=True)
+            local_repo.submodules.add(urls[0], 'mod0')
+            with patch.object(local_repo.git, 'commit',
+                    wraps=local_repo.git.commit) as commit_mock:
+                results = local_repo.submodules.add_many([
+                    (urls[0], 'mod0'),
+                    (urls[1], 'docs/mod1/'),
+                    (urls[2], 'mod2'),
+                    ('file://%s' % (tmp / 'missing'), 'bad')], jobs=3)
+                eq_(1, commit_mock.call_count)
+            eq_(['bad', 'docs/mod1', 'mod2'], sorted(results))
+            eq_(None, results['docs/mod1'])
+            ok_(results['bad'] is not None)
+            eq_(['docs/mod1', 'mod0', 'mod2'],
+                sorted(local_repo.submodules.keys()))
+            eq_([' '] * 3, [m.status for m in local_repo.submodules.values()])
+            eq_(urls[1], local_repo.config.get('submodule.docs/mod1.url'))
+            eq_('', local_repo.git.status('--porcelain'))
+            # the clones' git directories are moved to .git/modules
+            ok_(os.path.isfile(local_path / 'docs' / 'mod1' / '.git'))
+            ok_(os.path.isdir(local_path / '.git' / 'modules' / 'docs/mod1'))
+
+    def test_update_all(self):
+        with TempDir() as tmp:
+            urls = self._remotes(tmp, 3)
+            local_path = tmp / 'local-repo'
+            local_repo = Repo.create(local_path, mk_dir=True)
+            with open(local_path / '.gitmodules', 'w') as f:
+                for i, url in enumerate(urls):
+                    f.write('[submodule "mod%d"]\n\tpath = mod%d\n'
+                        '\turl = %s\n' % (i, i, url))
+            local_repo.submodules.init_all()
+            
+            clone_path = tmp / 'clone'
+            local_repo.git.clone(local_path, clone_path)
+            clone = Repo(clone_path)
+            eq_(['-'] * 3, [m.status for m in clone.submodules.values()])
+            reported = []
+            results = clone.submodules.update_all(
+                jobs=3, callback=lambda path, error: reported.append(path))
+            eq_({'mod0': None, 'mod1': None, 'mod2': None}, results)
+            eq_(['mod0', 'mod1', 'mod2'], sorted(reported))
+            eq_([' '] * 3, [m.status for m in clone.submodules.values()])
+            ok_(os.path.exists(clone_path / 'mod1/test.txt'))
+            
+            remote_repo = Repo(tmp / 'remote-1')
+            with open(tmp / 'remote-1' / 'new.txt', 'w') as f:
+                f.write('new')
+            remote_repo.git.add('new.txt')
+            remote_repo.git.commit('-m', 'new')
+            clone.submodules.update_all(remote=True)
+            eq_('2', clone.git.rev_list('--count', 'HEAD'))
+            eq_(remote_repo.git.rev_parse('HEAD'),
+                clone.submodules['mod1'].sha)
+            eq_([' '] * 3, [m.status for m in clone.submodules.values()])
@@ -0,0 +1,129 @@
+from __future__ import with_statement
+import unittest
+
+from github.tools.test.utils import eq_, ok_, TempDir
+from git.errors import GitCommandError
+
+from github.tools import gitcmd
+from github.tools.gitcmd import CatFile, FastImport, Git
+from github.tools.gh_pages import Repo
+
+
+def _repo(tmp, count=1):
+    repo = Repo.create(tmp)
+    for i in range(count):
+        with open(tmp / ('file-%d.txt' % i), 'w') as f:
+            f.write('content %d' % i)
+    repo.git.add('.')
+    repo.git.commit('-m', 'testing...')
+    return repo
+
+
+class TestCatFile(unittest.TestCase):
+
+    def test_info(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            with CatFile(repo.path) as objects:
+                sha = repo.git.rev_parse('HEAD:file-0.txt')
+                eq_((sha, 'blob', 9), objects.info('HEAD:file-0.txt'))
+                eq_('commit', objects.info('HEAD')[1])
+                eq_(None, objects.info('HEAD:missing file'))
+                eq_((sha, 'blob', 9, 'content 0'), objects.read(sha))
+                eq_(None, objects.read('missing'))
+                self.assertRaises(ValueError, objects.info, 'HEAD\nHEAD')
+
+    def test_many(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp, 500)
+            revs = ['HEAD:file-%d.txt' % i for i in range(500)]
+            with CatFile(repo.path) as objects:
+                eq_(['content %d' % i for i in range(500)],
+                    [obj[3] for obj in objects.read_many(revs * 2)][:500])
+                eq_([len('content %d' % i) for i in range(500)],
+                    [obj[2] for obj in objects.info_many(revs)])
+
+    def test_restart(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            objects = repo.objects
+            ok_(objects is repo.objects)
+            eq_('commit', objects.info('HEAD')[1])
+            proc = objects._check.proc
+            proc.kill()
+            proc.wait()
+            eq_('commit', objects.info('HEAD')[1])
+            ok_(objects._check.proc is not proc)
+            repo.close()
+            eq_(None, objects._check.proc)
+            eq_('commit', objects.info('HEAD')[1])
+            repo.close()
+
+
+class TestGitTrace(unittest.TestCase):
+
+    def tearDown(self):
+        gitcmd.disable_trace()
+
+    def test_trace(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            eq_(None, gitcmd.get_trace())
+            trace = gitcmd.enable_trace()
+            ok_(trace is gitcmd.get_trace())
+            ok_(isinstance(repo.git, Git))
+            eq_('master', repo.git.symbolic_ref('--short', 'HEAD'))
+            eq_((0, 'master', ''), repo.git.symbolic_ref(
+                '--short', 'HEAD', with_extended_output=True))
+            self.assertRaises(GitCommandError, repo.git.rev_parse, 'missing')
+            repo.git.rev_parse('missing', with_exceptions=False)
+            repo.objects.info('HEAD')
+            repo.close()
+
+            eq_(5, len(trace.records))
+            command, cwd, elapsed, status, size = trace.records[0]
+            eq_(['git', 'symbolic-ref', '--short', 'HEAD'], command)
+            eq_(tmp, cwd)
+            eq_((0, len('master')), (status, size))
+            ok_(trace.records[2][3] != 0)
+            eq_(['git', 'cat-file', '--batch-check'], trace.records[4][0])
+
+            summary = trace.summary()
+            counts = dict([(row[0], row[1]) for row in summary])
+            eq_({'symbolic-ref': 2, 'rev-parse': 2, 'cat-file': 1}, counts)
+            ok_(trace.format_summary('test').startswith('test: 5 processes'))
+            trace.clear()
+            eq_([], trace.records)
+
+
+class TestFastImport(unittest.TestCase):
+
+    def test_import(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            with FastImport(repo.path) as stream:
+                stream.write('blob\nmark :1\ndata 4\ntest\n')
+                stream.write('commit refs/heads/imported\n'
+                    'committer Test <test@example.com> 0 +0000\n'
+                    'data 4\ntest\nM 100644 :1 test.txt\n')
+            eq_('test', repo.git.show('imported:test.txt'))
+
+    def test_abort(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            try:
+                with FastImport(repo.path) as stream:
+                    stream.write('commit refs/heads/imported\n'
+                        'committer Test <test@example.com> 0 +0000\n'
+                        'data 4\ntest\n')
+                    raise ValueError()
+            except ValueError:
+                pass
+            eq_('', repo.git.branch('--list', 'imported'))
+
+    def test_error(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            stream = FastImport(repo.path)
+            stream.write('invalid command\n')
+            self.assertRaises(GitCommandError, stream.close)
@@ -0,0 +1,237 @@
+from __future__ import with_statement
+import os
+import unittest
+
+from mock import patch
+
+from github.tools.test.utils import eq_, ok_, TempDir
+from github.tools.gitconfig import GitConfig, get_config, clear_cache,\
+    find_git_dir
+from github.tools.gh_pages import Repo
+
+
+class TestGitConfig(unittest.TestCase):
+
+    def test_from_list(self):
+        config = GitConfig.from_list(
+            'github.user\ndamien\0'
+            'remote.Origin.url\ngit@github.com:damien/foo.git\0'
+            'core.bare\nfalse\0'
+            'core.bare\ntrue\0'
+            'foo.multi\nfirst line\nsecond line\0'
+            'foo.implicit\0')
+        eq_('damien', config.get('github.user'))
+        eq_('damien', config.get('GitHub.User'))
+        eq_('git@github.com:damien/foo.git', config.get('remote.Origin.url'))
+        eq_(None, config.get('remote.origin.url'))
+        eq_('true', config.get('core.bare'))
+        eq_(['false', 'true'], config.get_all('core.bare'))
+        eq_('first line\nsecond line', config.get('foo.multi'))
+        ok_('foo.implicit' in config)
+        eq_(None, config.get('foo.implicit', 'default'))
+        eq_('default', config.get('foo.missing', 'default'))
+
+
+class TestGetConfig(unittest.TestCase):
+
+    def setUp(self):
+        clear_cache()
+
+    def test_cached(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            repo.git.config('github.user', 'damien')
+            with patch.object(GitConfig, 'load',
+                    wraps=GitConfig.load) as load_mock:
+                eq_('damien', get_config(tmp).get('github.user'))
+                eq_('damien', get_config(tmp / 'sub').get('github.user'))
+                eq_(1, load_mock.call_count)
+
+    def test_invalidated(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            repo.git.config('github.user', 'damien')
+            eq_('damien', get_config(tmp).get('github.user'))
+            repo.git.config('github.user', 'bob')
+            eq_('bob', get_config(tmp).get('github.user'))
+
+    def test_git_dir_remembered(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            repo.git.config('github.user', 'damien')
+            get_config(tmp)
+            with patch('github.tools.gitconfig.find_git_dir') as find_mock:
+                eq_('damien', get_config(tmp).get('github.user'))
+                eq_(0, find_mock.call_count)
+
+    def test_included_files_stamped(self):
+        with TempDir() as tmp:
+            Repo.create(tmp / 'repo', mk_dir=True)
+            with open(tmp / 'repo' / '.git' / 'config', 'ab') as f:
+                f.write('[include]\n\tpath = ../../user.cfg\n'
+                    '[includeIf "onbranch:master"]\n\tpath = missing.cfg\n')
+            with open(tmp / 'user.cfg', 'w') as f:
+                f.write('[github]\n\tuser = damien\n')
+            config = GitConfig.from_git(tmp / 'repo')
+            eq_('damien', config.get('github.user'))
+            ok_(tmp / 'user.cfg' in config.files)
+            ok_(tmp / 'repo' / '.git' / 'missing.cfg' in config.files)
+            ok_(config.is_current())
+            with open(tmp / 'user.cfg', 'w') as f:
+                f.write('[github]\n\tuser = bob\n')
+            ok_(not config.is_current())
+
+
+class TestFindGitDir(unittest.TestCase):
+
+    def test_working_copy(self):
+        with TempDir() as tmp:
+            Repo.create(tmp)
+            os.mkdir(tmp / 'docs')
+            eq_(tmp / '.git', find_git_dir(tmp / 'docs'))
+
+    def test_gitdir_file(self):
+        with TempDir() as tmp:
+            Repo.create(tmp)
+            os.mkdir(tmp / 'module')
+            with open(tmp / 'module' / '.git', 'w') as f:
+                f.write('gitdir: ../.git\n')
+            eq_(tmp / '.git', find_git_dir(tmp / 'module'))
+
+
+# Conformance corpus: each config is parsed in-process and compared to
+# the "git config --list -z" output.
+CONFIG_CORPUS = [
+    # sections, subsections and comments
+    '[core]\n'
+    '\trepositoryformatversion = 0\n'
+    '; comment\n'
+    '# other comment\n'
+    '\tbare = false # trailing comment\n'
+    '[remote "origin"]\n'
+    '\turl = git@github.com:damien/foo.git\n'
+    '\tfetch = +refs/heads/*:refs/remotes/origin/*\n',
+    # case sensitivity and deprecated subsection syntax
+    '[Core]\n\tFileMode = true\n'
+    '[Remote "Origin"]\n\tURL = foo\n'
+    '[Branch.Master]\n\tRemote = origin\n',
+    # quoting, escapes and white spaces
+    '[foo]\n'
+    '\ta = "  spaced  " value\n'
+    '\tb = with\\ttab\n'
+    '\tc = "quoted # not a comment" ; comment\n'
+    '\td = line one \\\n  continued\n'
+    '\te = tab\there  and   spaces \t \n'
+    '\tf = "esc \\"q\\" \\\\"\n'
+    '\tg =\n'
+    '\th = "" after\n'
+    '\ti = new\\nline\n',
+    # implicit booleans and multi-valued variables
+    '[foo]\n\tbar\n\tbaz = 1\n\tbaz = 2\n\tbar\n',
+    # subsection escapes and section followed by a variable
+    '[remote "we\\"ird\\\\na\\me"] url = foo\n[foo] bar = baz\n',
+    # CRLF line endings
+    '[foo]\r\n\tbar = baz\r\n\tqux\r\n',
+    ]
+
+
+class TestConfigReader(unittest.TestCase):
+
+    def setUp(self):
+        clear_cache()
+
+    def assert_conform(self, tmp, cwd=None):
+        cwd = cwd or tmp
+        env = {
+            'HOME': str(tmp),
+            'XDG_CONFIG_HOME': str(tmp / 'xdg'),
+            'GIT_CONFIG_NOSYSTEM': '1',
+            }
+        with patch.dict(os.environ, env):
+            expected = sorted(GitConfig.from_git(cwd).items())
+            eq_(expected, sorted(GitConfig.read(cwd).items()))
+        return dict(expected)
+
+    def test_corpus(self):
+        for cfg_txt in CONFIG_CORPUS:
+            with TempDir() as tmp:
+                Repo.create(tmp)
+                with open(tmp / '.git' / 'config', 'ab') as f:
+                    f.write(cfg_txt)
+                self.assert_conform(tmp)
+
+    def test_global_files(self):
+        with TempDir() as tmp:
+            Repo.create(tmp / 'repo', mk_dir=True)
+            os.makedirs(tmp / 'xdg' / 'git')
+            with open(tmp / 'xdg' / 'git' / 'config', 'w') as f:
+                f.write('[github]\n\tuser = xdg\n\ttoken = xyz\n')
+            with open(tmp / '.gitconfig', 'w') as f:
+                f.write('[github]\n\tuser = damien\n')
+            values = self.assert_conform(tmp, tmp / 'repo')
+            eq_(['xdg', 'damien'], values['github.user'])
+
+    def test_includes(self):
+        with TempDir() as tmp:
+            Repo.create(tmp / 'repo', mk_dir=True)
+            os.mkdir(tmp / 'inc')
+            with open(tmp / '.gitconfig', 'w') as f:
+                f.write(
+                    '[github]\n\tuser = damien\n'
+                    '[include]\n\tpath = inc/user.cfg\n'
+                    '[includeIf "gitdir:~/repo/"]\n\tpath = inc/repo.cfg\n'
+                    '[includeIf "gitdir:/elsewhere/"]\n\tpath = inc/no.cfg\n'
+                    '[includeIf "onbranch:master"]\n\tpath = inc/br.cfg\n'
+                    '[github]\n\ttoken = xyz\n')
+            with open(tmp / 'inc' / 'user.cfg', 'w') as f:
+                f.write('[github]\n\tuser = included\n'
+                    '[include]\n\tpath = nested.cfg\n')
+            with open(tmp / 'inc' / 'nested.cfg', 'w') as f:
+                f.write('[github]\n\tnested = true\n')
+            with open(tmp / 'inc' / 'repo.cfg', 'w') as f:
+                f.write('[github]\n\trepo = yes\n')
+            with open(tmp / 'inc' / 'no.cfg', 'w') as f:
+                f.write('[github]\n\tno = yes\n')
+            with open(tmp / 'inc' / 'br.cfg', 'w') as f:
+                f.write('[github]\n\tbranch = master\n')
+            values = self.assert_conform(tmp, tmp / 'repo')
+            eq_(['damien', 'included'], values['github.user'])
+            eq_(['true'], values['github.nested'])
+            eq_(['yes'], values['github.repo'])
+            eq_(['master'], values['github.branch'])
+            ok_('github.no' not in values)
+
+    def test_environment(self):
+        with TempDir() as tmp:
+            Repo.create(tmp)
+            env = {
+                'GIT_CONFIG_COUNT': '1',
+                'GIT_CONFIG_KEY_0': 'GitHub.User',
+                'GIT_CONFIG_VALUE_0': 'damien',
+                'GIT_CONFIG_PARAMETERS': "'github.token'='x'\\''z' 'foo.bar'",
+                }
+            with patch.dict(os.environ, env):
+                values = self.assert_conform(tmp)
+            eq_(['damien'], values['github.user'])
+            eq_(["x'z"], values['github.token'])
+            eq_([None], values['foo.bar'])
+
+    def test_load_fallback(self):
+        with TempDir() as tmp:
+            Repo.create(tmp)
+            with open(tmp / '.git' / 'config', 'ab') as f:
+                f.write('[includeIf "hasconfig:remote.*.url:foo"]\n'
+                    '\tpath = foo.cfg\n')
+            with patch('github.tools.gitconfig.PARSER', 'python'):
+                with patch.object(GitConfig, 'from_git') as from_git_mock:
+                    GitConfig.load(tmp)
+                    eq_(1, from_git_mock.call_count)
+
+    def test_get_config_no_process(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            repo.git.config('github.user', 'damien')
+            with patch('github.tools.gitconfig.PARSER', 'python'):
+                with patch('subprocess.Popen') as popen_mock:
+                    eq_('damien', get_config(tmp).get('github.user'))
+                    eq_(0, popen_mock.call_count)
@@ -0,0 +1,224 @@
+from __future__ import with_statement
+import os
+import unittest
+
+from git import Git
+from mock import patch
+
+from github.tools.test.utils import eq_, ok_, TempDir
+from github.tools.gitfs import UnsupportedIndex, read_gitlinks, read_head,\
+    Gitmodule, parse_gitmodules, read_gitmodules, format_gitmodules,\
+    _iter_config_gitmodules, _iter_simple_gitmodules, resolve_ref,\
+    symbolic_ref, active_branch, work_git_dir, get_packed_refs
+from github.tools.gh_pages import Repo
+
+SHA = 'a' * 40
+
+
+def _commit(work_dir, file_name='test.txt', content='testing...'):
+    git = Git(work_dir)
+    with open(os.path.join(work_dir, file_name), 'w') as f:
+        f.write(content)
+    git.add(file_name)
+    git.commit('-m', content)
+    return git.rev_parse('HEAD')
+
+
+class TestReadGitlinks(unittest.TestCase):
+
+    def test_gitlinks(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            _commit(tmp)
+            long_path = 'long/' + 'x' * 5000
+            repo.git.update_index('--add', '--cacheinfo', '160000', SHA, 'foo')
+            repo.git.update_index(
+                '--add', '--cacheinfo', '160000', SHA, long_path)
+            repo.git.update_index('--index-version', '3')
+            eq_({'foo': SHA, long_path: SHA}, read_gitlinks(repo.path))
+            repo.git.update_index('--index-version', '2')
+            eq_({'foo': SHA, long_path: SHA}, read_gitlinks(repo.path))
+
+    def test_no_index(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            eq_({}, read_gitlinks(repo.path))
+
+    def test_unsupported(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            _commit(tmp)
+            repo.git.update_index('--index-version', '4')
+            self.assertRaises(UnsupportedIndex, read_gitlinks, repo.path)
+            repo.git.update_index('--index-version', '2')
+            self.assertRaises(UnsupportedIndex, read_gitlinks, repo.path, 0)
+            repo.git.update_index('--split-index')
+            self.assertRaises(UnsupportedIndex, read_gitlinks, repo.path)
+
+
+class TestRefs(unittest.TestCase):
+
+    def test_resolve(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            eq_(None, resolve_ref(repo.path))
+            eq_('master', active_branch(tmp))
+            sha = _commit(tmp)
+            repo.git.branch('gh-pages')
+            repo.git.tag('v1', '-m', 'version 1')
+            for packed in (False, True):
+                if packed:
+                    repo.git.pack_refs('--all')
+                    ok_(not os.path.exists(tmp / '.git/refs/heads/gh-pages'))
+                eq_(sha, resolve_ref(repo.path))
+                eq_(sha, resolve_ref(repo.path, 'refs/heads/gh-pages'))
+                eq_(repo.git.rev_parse('refs/tags/v1'),
+                    resolve_ref(repo.path, 'refs/tags/v1'))
+                eq_(None, resolve_ref(repo.path, 'refs/heads/missing'))
+                eq_('refs/heads/master', symbolic_ref(repo.path))
+            
+            # a loose ref overrides the packed one
+            new_sha = _commit(tmp, 'other.txt')
+            eq_(new_sha, resolve_ref(repo.path, 'refs/heads/master'))
+            repo.git.checkout('gh-pages')
+            eq_('gh-pages', active_branch(tmp))
+            repo.git.checkout(new_sha)
+            eq_(None, active_branch(tmp))
+            eq_(new_sha, resolve_ref(repo.path))
+            self.assertRaises(ValueError,
+                resolve_ref, repo.path, '../../etc/passwd')
+
+    def test_packed_refs_cache(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            sha = _commit(tmp)
+            repo.git.pack_refs('--all')
+            packed = get_packed_refs(repo.path)
+            ok_(packed is get_packed_refs(repo.path))
+            repo.git.branch('other')
+            repo.git.pack_refs('--all')
+            packed = get_packed_refs(repo.path)
+            eq_(sha, packed.get('refs/heads/other'))
+
+    def test_worktree(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp / 'repo', mk_dir=True)
+            sha = _commit(tmp / 'repo')
+            repo.git.pack_refs('--all')
+            repo.git.worktree('add', '-b', 'gh-pages', tmp / 'pages')
+            git_dir = work_git_dir(tmp / 'pages')
+            ok_(os.path.isfile(tmp / 'pages' / '.git'))
+            eq_('gh-pages', active_branch(tmp / 'pages'))
+            eq_(sha, resolve_ref(git_dir))
+            eq_(sha, read_head(tmp / 'pages'))
+            eq_(None, work_git_dir(tmp))
+
+
+GITMODULES = (
+    '[submodule "docs/build/html"]\n'
+    '\tpath = docs/build/html\n'
+    '\turl = git@github.com:damien/foo.git\n'
+    '# comment\n'
+    '\n'
+    '[submodule "with space"]\n'
+    '  path=with space\n'
+    '\tURL = first.git\n'
+    '\tbranch =\n'
+    '\tshallow\n'
+    '; comment\n'
+    '[submodule "docs/build/html"]\n'
+    '\tupdate = rebase\n'
+    '[submodule "with space"]\n'
+    '\turl = second.git')
+
+
+class TestParseGitmodules(unittest.TestCase):
+
+    def assert_modules(self, expected, text):
+        eq_(expected, [(m.name, m.path, m.url, m.branch, m.update, m.shallow)
+            for m in parse_gitmodules(text)])
+
+    def test_parse(self):
+        self.assert_modules([
+            ('docs/build/html', 'docs/build/html',
+                'git@github.com:damien/foo.git', None, 'rebase', None),
+            ('with space', 'with space', 'second.git', '', None, True),
+            ], GITMODULES)
+        eq_(list(_iter_config_gitmodules(GITMODULES)),
+            list(_iter_simple_gitmodules(GITMODULES)))
+
+    def test_complex_syntax(self):
+        self.assert_modules([
+            ('we"ird', 'quoted # path', 'foo.git', None, None, 'true'),
+            ], '[submodule "we\\"ird"]\n'
+            '\tpath = "quoted # path" ; comment\n'
+            '\turl = foo\\\n.git\n'
+            '\tshallow = true\n'
+            '[other]\n\tpath = ignored\n')
+
+    def test_format_gitmodules(self):
+        modules = [
+            Gitmodule('we"ird\\', 'docs #1', 'foo.git', shallow=True),
+            Gitmodule('docs', 'docs', 'bar.git', branch=' gh-pages')]
+        eq_([(m.name, m.path, m.url, m.branch, m.shallow) for m in modules],
+            [(m.name, m.path, m.url, m.branch, m.shallow)
+                for m in parse_gitmodules(format_gitmodules(modules))])
+
+    def test_read_gitmodules(self):
+        with TempDir() as tmp:
+            eq_([], read_gitmodules(tmp / '.gitmodules'))
+            with open(tmp / '.gitmodules', 'w') as f:
+                f.write(GITMODULES)
+            eq_(['docs/build/html', 'with space'],
+                [m.path for m in read_gitmodules(tmp / '.gitmodules')])
+
+
+class TestSubmoduleStatus(unittest.TestCase):
+
+    def test_conform(self):
+        with TempDir() as tmp:
+            remote_path = tmp / 'remote-repo'
+            remote_repo = Repo.create(remote_path, mk_dir=True)
+            sha = _commit(remote_path)
+
+            local_path = tmp / 'local-repo'
+            local_repo = Repo.create(local_path, mk_dir=True)
+            local_repo.submodules.add('file://%s' % remote_path, 'test')
+            local_repo.submodules.add('file://%s' % remote_path, 'changed')
+            with open(local_path / '.gitmodules', 'a') as f:
+                for name in ('new', 'inited'):
+                    f.write('[submodule "%s"]\n\tpath = %s\n'
+                        '\turl = file://%s\n' % (name, name, remote_path))
+                    local_repo.git.update_index(
+                        '--add', '--cacheinfo', '160000', sha, name)
+            # initialised, without a working tree
+            local_repo.git.submodule('init', '--', 'inited')
+            head = _commit(local_path / 'changed', 'other.txt')
+            eq_(head, read_head(local_path / 'changed'))
+            eq_(None, read_head(local_path / 'new'))
+
+            modules = local_repo.submodules
+            expected = modules._get_status()
+            eq_(' ', expected['test'][0])
+            eq_(('+', head), expected['changed'])
+            eq_(('-', sha), expected['new'])
+            eq_(('-', sha), expected['inited'])
+            eq_(expected, modules._read_status(
+                [('test', 'test'), ('changed', 'changed'), ('new', 'new'),
+                    ('inited', 'inited')]))
+            with patch.object(local_repo.git, 'submodule') as submodule_mock:
+                modules.clear()
+                eq_('+', modules['changed'].status)
+                eq_(0, submodule_mock.call_count)
+
+    def test_fallback(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            _commit(tmp)
+            repo.git.update_index('--add', '--cacheinfo', '160000', SHA, 'foo')
+            with open(tmp / '.gitmodules', 'w') as f:
+                f.write('[submodule "foo"]\n\tpath = foo\n\turl = foo.git\n')
+            repo.git.update_index('--index-version', '4')
+            repo.submodules.clear()
+            eq_('-', repo.submodules['foo'].status)
+            eq_(SHA, repo.submodules['foo'].sha)
@@ -0,0 +1,52 @@
+from __future__ import with_statement
+import threading
+import time
+import unittest
+
+from github.tools.test.utils import eq_, ok_
+from github.tools.pool import map_concurrently
+
+
+class TestMapConcurrently(unittest.TestCase):
+    
+    def test_order_and_errors(self):
+        def func(i):
+            if i == 3:
+                raise ValueError(i)
+            time.sleep(0.01 * (5 - i))
+            return i * 2
+        results = map_concurrently(func, range(5), jobs=3)
+        eq_([0, 2, 4], results[:3])
+        ok_(isinstance(results[3], ValueError))
+        eq_(8, results[4])
+    
+    def test_bounded(self):
+        lock = threading.Lock()
+        running = [0, 0]
+        def func(i):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        map_concurrently(func, range(20), jobs=4)
+        ok_(1 < running[1] <= 4)
+    
+    def test_callback(self):
+        done = []
+        map_concurrently(lambda i: i + 1, range(3), jobs=2,
+            callback=lambda item, result: done.append((item, result)))
+        eq_([(0, 1), (1, 2), (2, 3)], sorted(done))
+    
+    def test_callback_error(self):
+        for jobs in (1, 3):
+            done = []
+            def callback(item, result):
+                done.append(item)
+                if item == 1:
+                    raise ValueError(item)
+            self.assertRaises(ValueError, map_concurrently,
+                lambda i: i, range(5), jobs=jobs, callback=callback)
+            # the other items are still processed
+            eq_(range(5), sorted(done))
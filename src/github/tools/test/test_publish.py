@@ -0,0 +1,231 @@
+from __future__ import with_statement
+import os
+import time
+import unittest
+
+from github.tools.test.utils import eq_, ok_, TempDir
+from git.errors import GitCommandError
+
+from github.tools import gitcmd
+from github.tools.gh_pages import Repo
+from github.tools.publish import MANIFEST_NAME, Manifest, blob_sha,\
+    read_index, scan_changes, stage_changes, iter_files, hash_tree,\
+    import_tree
+
+
+def _write(file_path, content):
+    with open(file_path, 'w') as f:
+        f.write(content)
+
+
+def _repo(tmp):
+    repo = Repo.create(tmp)
+    (tmp / 'docs').mkdir()
+    _write(tmp / 'index.html', 'index')
+    _write(tmp / 'docs' / 'page.html', 'page')
+    _write(tmp / 'old.html', 'old')
+    _write(tmp / '.gitignore', '*.tmp\n')
+    repo.git.add('.')
+    repo.git.commit('-m', 'testing...')
+    return repo
+
+
+class TestBlobSha(unittest.TestCase):
+
+    def test_blob_sha(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            _write(tmp / 'large.html', 'x' * 200000)
+            os.symlink('index.html', tmp / 'link.html')
+            repo.git.add('large.html', 'link.html')
+            for name in ('index.html', 'large.html', 'link.html'):
+                eq_(read_index(repo.git)[name][1], blob_sha(tmp / name))
+
+
+class TestManifest(unittest.TestCase):
+
+    def test_save_load(self):
+        with TempDir() as tmp:
+            _write(tmp / 'index.html', 'index')
+            st = os.lstat(tmp / 'index.html')
+            manifest = Manifest()
+            manifest.add('index.html', st, 'a' * 40)
+            manifest.add('new\nline.html', st, 'b' * 40)
+            manifest.save(tmp / 'manifest')
+            loaded = Manifest.load(tmp / 'manifest')
+            eq_(1, len(loaded))
+            eq_('a' * 40, loaded.lookup('index.html', st))
+            _write(tmp / 'index.html', 'modified')
+            eq_(None, loaded.lookup('index.html', os.lstat(tmp / 'index.html')))
+            eq_(0, len(Manifest.load(tmp / 'missing')))
+            _write(tmp / 'manifest', 'garbage')
+            eq_(0, len(Manifest.load(tmp / 'manifest')))
+
+
+class TestStageChanges(unittest.TestCase):
+
+    def test_scan_changes(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            eq_([], scan_changes(tmp)[0])
+            _write(tmp / 'index.html', 'new index')
+            _write(tmp / 'docs' / 'new.html', 'new')
+            _write(tmp / 'ignored.tmp', 'ignored')
+            os.unlink(tmp / 'old.html')
+            os.chmod(tmp / 'docs' / 'page.html', 0755)
+            changes, manifest = scan_changes(tmp)
+            eq_(['docs/new.html', 'docs/page.html', 'index.html', 'old.html'],
+                changes)
+            repo.git.config('core.filemode', 'false')
+            eq_(['docs/new.html', 'index.html', 'old.html'],
+                scan_changes(tmp)[0])
+
+    def test_stage_changes(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            eq_([], stage_changes(tmp))
+            _write(tmp / 'index.html', 'new index')
+            _write(tmp / 'docs' / 'new.html', 'new')
+            os.unlink(tmp / 'old.html')
+            eq_(['docs/new.html', 'index.html', 'old.html'], stage_changes(tmp))
+            eq_('A\tdocs/new.html\nM\tindex.html\nD\told.html',
+                repo.git.diff('--cached', '--name-status'))
+            eq_([], stage_changes(tmp))
+
+    def test_manifest(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            past = time.time() - 10
+            for name in ('index.html', 'old.html', 'docs/page.html'):
+                os.utime(tmp / name, (past, past))
+            stage_changes(tmp)
+            manifest_path = os.path.join(repo.path, MANIFEST_NAME)
+            eq_(3, len(Manifest.load(manifest_path)))
+
+            # a file with an unchanged size and mtime isn't read again
+            manifest = Manifest.load(manifest_path)
+            manifest.entries['index.html'] = manifest.entries['index.html'][:2]\
+                + ('0' * 40,)
+            manifest.save(manifest_path)
+            eq_(['index.html'], stage_changes(tmp))
+
+
+class TestHashTree(unittest.TestCase):
+
+    def test_hash_tree(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            for directory in ('a', 'a/b', 'a/c', 'empty'):
+                (tmp / directory).mkdir()
+            for name in ('a.b', 'a-b', 'a0', 'a/b/page.html', 'a/c/x',
+                    'a/z', 'large'):
+                _write(tmp / name, name * (name == 'large' and 50000 or 1))
+            os.chmod(tmp / 'a0', 0755)
+            os.symlink('a/z', tmp / 'link')
+            repo.git.add('.')
+            eq_(repo.git.write_tree(), hash_tree(tmp))
+            eq_(repo.git.write_tree(), hash_tree(tmp, jobs=1))
+
+            # the manifest shas are trusted for unchanged files
+            manifest = Manifest()
+            manifest.add('a0', os.lstat(tmp / 'a0'), '0' * 40)
+            ok_(repo.git.write_tree() != hash_tree(tmp, manifest=manifest))
+
+    def test_manifest_path(self):
+        with TempDir() as tmp:
+            repo = _repo(tmp)
+            past = time.time() - 10
+            for name in ('index.html', 'old.html'):
+                os.utime(tmp / name, (past, past))
+            manifest_path = tmp / 'manifest'
+            eq_(repo.git.write_tree(),
+                hash_tree(tmp, manifest_path=manifest_path))
+            # the racy files are left out
+            manifest = Manifest.load(manifest_path)
+            eq_(2, len(manifest))
+            eq_(repo.git.rev_parse('HEAD:index.html'),
+                manifest.lookup('index.html', os.lstat(tmp / 'index.html')))
+
+    def test_empty(self):
+        with TempDir() as tmp:
+            repo = Repo.create(tmp)
+            eq_(repo.git.write_tree(), hash_tree(tmp))
+
+
+class TestImportTree(unittest.TestCase):
+
+    def tearDown(self):
+        gitcmd.disable_trace()
+
+    def _html(self, tmp):
+        html = tmp / 'html'
+        html.mkdir()
+        (html / '_static').mkdir()
+        _write(html / 'index.html', 'index')
+        _write(html / '_static' / 'style.css', 'style')
+        _write(html / '"quoted".html', 'quoted')
+        _write(html / '.git', 'gitdir: ../.git/modules/html')
+        os.symlink('index.html', html / 'link.html')
+        return html
+
+    def test_iter_files(self):
+        with TempDir() as tmp:
+            html = self._html(tmp)
+            eq_(['"quoted".html', 'index.html', 'link.html', '_static/style.css'],
+                [path for path, file_path in iter_files(html)])
+
+    def test_import_tree(self):
+        with TempDir() as tmp:
+            (tmp / 'repo').mkdir()
+            repo = _repo(tmp / 'repo')
+            html = self._html(tmp)
+            head = repo.git.rev_parse('HEAD')
+            manifest_path = tmp / 'manifest'
+
+            sha = import_tree(repo.path, html, message='first import',
+                manifest_path=manifest_path)
+            eq_(sha, repo.git.rev_parse('gh-pages'))
+            eq_('first import', repo.git.log('-1', '--format=%s', 'gh-pages'))
+            eq_('"\\"quoted\\".html"\n_static/style.css\nindex.html\nlink.html',
+                repo.git.ls_tree('-r', '--name-only', 'gh-pages'))
+            eq_('120000', repo.git.ls_tree('gh-pages', 'link.html').split()[0])
+            eq_('index', repo.git.show('gh-pages:index.html'))
+            # the working copy, its index and HEAD are untouched
+            eq_(head, repo.git.rev_parse('HEAD'))
+            eq_('', repo.git.status('--porcelain'))
+
+            # the stored blobs aren't sent again
+            trace = gitcmd.enable_trace()
+            _write(html / 'index.html', 'new index')
+            os.unlink(html / '"quoted".html')
+            second = import_tree(repo.path, html, manifest_path=manifest_path)
+            eq_(sha, repo.git.rev_parse('gh-pages^'))
+            eq_('M\tindex.html\nD\t"\\"quoted\\".html"',
+                '\n'.join(sorted(repo.git.diff('--name-status',
+                    'gh-pages^', 'gh-pages').splitlines(), reverse=True)))
+            imports = [record for record in trace.records
+                if record[0][1] == 'fast-import']
+            eq_(1, len(imports))
+            ok_('new index' in repo.git.show('%s:index.html' % second))
+            ok_(imports[0][4] < 400)
+
+    def test_unchanged(self):
+        with TempDir() as tmp:
+            (tmp / 'repo').mkdir()
+            repo = _repo(tmp / 'repo')
+            html = self._html(tmp)
+            sha = import_tree(repo.path, html)
+            trace = gitcmd.enable_trace()
+            eq_(sha, import_tree(repo.path, html))
+            eq_(sha, repo.git.rev_parse('gh-pages'))
+            eq_([], [record for record in trace.records
+                if record[0][1] == 'fast-import'])
+
+    def test_import_tree_error(self):
+        with TempDir() as tmp:
+            (tmp / 'repo').mkdir()
+            repo = _repo(tmp / 'repo')
+            html = self._html(tmp)
+            self.assertRaises(GitCommandError, import_tree, repo.path, html,
+                parent='1' * 40)
+            eq_('', repo.git.branch('--list', 'gh-pages'))
@@ -0,0 +1,268 @@
+from __future__ import with_statement
+import os
+import unittest
+
+from mock import patch, Mock
+from git import Git
+from paver import tasks
+from paver.easy import Bunch
+
+from github.tools.test.utils import eq_, ok_, path, TempDir
+from github.tools import task
+from github.tools.gh_pages import GitHubRepo, Repo
+from github.tools.gitfs import work_git_dir
+from github.tools.publish import MANIFEST_NAME, _tip
+
+HTMLDIR = 'docs/build/html'
+
+
+def _write(file_path, content):
+    file_path = path(file_path)
+    if not file_path.parent.exists():
+        file_path.parent.makedirs()
+    with open(file_path, 'w') as f:
+        f.write(content)
+
+
+def _project(tmp):
+    """
+    Create a project repository, its GitHub remote and its gh-pages
+    submodule (at docs/build/html); return the project path.
+    """
+    remote_path = tmp / 'remote.git'
+    remote_path.mkdir()
+    Git(remote_path).init('--bare')
+    project_path = tmp / 'project'
+    repo = GitHubRepo.create(project_path, mk_dir=True)
+    _write(project_path / 'README', 'testing...')
+    repo.git.add('README')
+    repo.git.commit('-m', 'testing...')
+    repo.git.remote('add', 'origin', 'file://%s' % remote_path)
+    repo.git.push('origin', 'master')
+    cwd = os.getcwd()
+    os.chdir(project_path)
+    try:
+        repo.add_gh_pages_submodule(HTMLDIR)
+    finally:
+        os.chdir(cwd)
+    repo.git.push('origin', 'master')
+    return project_path
+
+
+def _sphinx(files):
+    """
+    Return a fake ``sh`` writing the ``files`` in the sphinx-build
+    output directory.
+    """
+    def sh(command):
+        htmldir = path(command.split()[-1])
+        for name, content in files.items():
+            _write(htmldir / name, content)
+    return sh
+
+
+class TaskTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._environment = tasks.environment
+        tasks.environment = tasks.Environment()
+        tasks.environment.quiet = True
+        self._cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        tasks.environment = self._environment
+        Repo.invalidate()
+
+    @property
+    def options(self):
+        return tasks.environment.options
+
+    def build(self, files, build_task=task.gh_pages_html):
+        with patch('github.tools.task.sh', _sphinx(files)):
+            build_task.func()
+
+
+class TestGhPagesImport(TaskTestCase):
+
+    def test_uninitialised_submodule(self):
+        with TempDir() as tmp:
+            _project(tmp)
+            ci_path = tmp / 'ci'
+            Git(tmp).clone(tmp / 'remote.git', ci_path)
+            os.chdir(ci_path)
+            eq_('-', GitHubRepo.get(ci_path).submodules[HTMLDIR].status)
+
+            # the import builds the doc without going through gh_pages_clean
+            eq_(['github.tools.task.gh_pages_html'],
+                task.gh_pages_import.needs)
+            self.options.gh_pages_import = Bunch(commit_message='import')
+            self.build({'index.html': 'new doc', '_static/style.css': 'css'})
+            task.gh_pages_import.func()
+
+            remote = Git(tmp / 'remote.git')
+            eq_('import', remote.log('-1', '--format=%s', 'gh-pages'))
+            eq_('new doc', remote.show('gh-pages:index.html'))
+            eq_('.nojekyll\n_static/style.css\nindex.html',
+                remote.ls_tree('-r', '--name-only', 'gh-pages'))
+            # the submodule is left uninitialised
+            Repo.invalidate()
+            eq_('-', GitHubRepo.get(ci_path).submodules[HTMLDIR].status)
+            ok_(not os.path.exists(ci_path / HTMLDIR / '.git'))
+
+
+class TestGhPagesUpdate(TaskTestCase):
+    
+    def gh_pages(self, project_path):
+        work_dir = project_path / HTMLDIR
+        return work_dir, work_git_dir(work_dir)
+    
+    def is_committed(self, project_path):
+        work_dir, git_dir = self.gh_pages(project_path)
+        return task._is_committed(git_dir, work_dir, _tip(git_dir, 'HEAD'))
+    
+    def remote_log(self, tmp):
+        return Git(tmp / 'remote.git').log('--format=%s', 'gh-pages')
+    
+    def test_leftover_readme(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            work_dir, git_dir = self.gh_pages(project_path)
+            manifest_path = path(git_dir) / MANIFEST_NAME
+            # the README of the master branch checkout isn't tracked
+            # on the gh-pages branch
+            ok_((work_dir / 'README').exists())
+            # racily clean files would be left out of the manifest
+            for name in ('README', 'index.html'):
+                os.utime(work_dir / name, (1, 1))
+            tasks.environment.dry_run = True
+            ok_(not self.is_committed(project_path))
+            ok_(not manifest_path.exists())
+            
+            tasks.environment.dry_run = False
+            (work_dir / 'README').remove()
+            ok_(self.is_committed(project_path))
+            ok_(manifest_path.exists())
+    
+    def test_update(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            work_dir, git_dir = self.gh_pages(project_path)
+            (work_dir / 'README').remove()
+            os.chdir(project_path)
+            self.options.gh_pages_update = Bunch(commit_message='update')
+            
+            # unchanged tree
+            task.gh_pages_update.func()
+            eq_('initial commit', self.remote_log(tmp))
+            
+            # edited tree
+            _write(work_dir / 'index.html', 'new doc')
+            ok_(not self.is_committed(project_path))
+            task.gh_pages_update.func()
+            eq_('update\ninitial commit', self.remote_log(tmp))
+            ok_(task._is_pushed(git_dir, 'origin', _tip(git_dir, 'HEAD')))
+            
+            # reverted tree
+            _write(work_dir / 'index.html', 'Documentation coming soon...')
+            ok_(not self.is_committed(project_path))
+            task.gh_pages_update.func()
+            eq_('update\nupdate\ninitial commit', self.remote_log(tmp))
+            ok_(self.is_committed(project_path))
+            task.gh_pages_update.func()
+            eq_('update\nupdate\ninitial commit', self.remote_log(tmp))
+    
+    def test_unpushed_commit(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            work_dir, git_dir = self.gh_pages(project_path)
+            (work_dir / 'README').remove()
+            _write(work_dir / 'index.html', 'new doc')
+            gh_pages = Git(work_dir)
+            gh_pages.commit('-a', '-m', 'local commit')
+            head = _tip(git_dir, 'HEAD')
+            ok_(not task._is_pushed(git_dir, 'origin', head))
+            
+            # the tree is committed; without a commit message, nothing is
+            # pushed
+            os.chdir(project_path)
+            self.options.gh_pages_update = Bunch()
+            task.gh_pages_update.func()
+            eq_('initial commit', self.remote_log(tmp))
+            
+            self.options.gh_pages_update = Bunch(commit_message='update')
+            task.gh_pages_update.func()
+            eq_('local commit\ninitial commit', self.remote_log(tmp))
+            ok_(task._is_pushed(git_dir, 'origin', head))
+
+
+class TestGhPagesBuild(TaskTestCase):
+    
+    def test_sync(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            htmldir = project_path / HTMLDIR
+            os.chdir(project_path)
+            self.options.gh_pages = Bunch(sync=True)
+            files = {
+                'index.html': 'doc',
+                'search.html': 'search',
+                '_static/style.css': 'css'}
+            task.gh_pages_clean.func()
+            self.build(files, build_task=task.gh_pages_build)
+            eq_('doc', (htmldir / 'index.html').text())
+            os.utime(htmldir / '_static' / 'style.css', (1, 1))
+            unchanged = os.stat(htmldir / '_static' / 'style.css')
+            
+            files['index.html'] = 'new doc'
+            del files['search.html']
+            task.gh_pages_clean.func()
+            self.build(files, build_task=task.gh_pages_build)
+            eq_('new doc', (htmldir / 'index.html').text())
+            st = os.stat(htmldir / '_static' / 'style.css')
+            eq_(unchanged.st_mtime, st.st_mtime)
+            eq_(unchanged.st_ino, st.st_ino)
+            ok_(not (htmldir / 'search.html').exists())
+            ok_((htmldir / '.git').exists())
+            ok_((htmldir / '.nojekyll').exists())
+            ok_(not (project_path / 'docs/build/html-staging').exists())
+
+
+class TestGhPagesClean(TaskTestCase):
+    
+    def test_clean_in_background(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            htmldir = project_path / HTMLDIR
+            git_dir = path(work_git_dir(htmldir))
+            os.chdir(project_path)
+            self.options.gh_pages = Bunch(clean_in_background=True)
+            with patch('github.tools.task.remove_in_background') as remove:
+                task.gh_pages_clean.func()
+            eq_(['.git'], os.listdir(htmldir))
+            trash = path(remove.call_args[0][0][0])
+            eq_(git_dir, trash.parent)
+            ok_((trash / 'index.html').exists())
+            
+            # the trash left by an interrupted removal is found by
+            # the next clean
+            _write(htmldir / 'index.html', 'doc')
+            self.options.gh_pages.clean_in_background = False
+            task.gh_pages_clean.func()
+            ok_(not trash.exists())
+            eq_([], git_dir.glob('.html-trash-*'))
+            eq_(['.git'], os.listdir(htmldir))
+    
+    def test_clean_move_failure(self):
+        with TempDir() as tmp:
+            project_path = _project(tmp)
+            htmldir = project_path / HTMLDIR
+            os.chdir(project_path)
+            self.options.gh_pages = Bunch(clean_in_background=True)
+            move_aside = Mock(side_effect=OSError(18, 'cross-device link'))
+            with patch('github.tools.task.move_aside', move_aside):
+                with patch('github.tools.task.remove_in_background') as remove:
+                    task.gh_pages_clean.func()
+            ok_(move_aside.called)
+            ok_(not remove.called)
+            eq_(['.git'], os.listdir(htmldir))
@@ -3,13 +3,20 @@ Created on 19 Apr 2009
 
 @author: damien
 """
-from nose.tools import eq_, ok_
-
+from __future__ import with_statement
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import gzip
 import tempfile
+import threading
+import time
+import StringIO
+
+from nose.tools import eq_, ok_
 
 from paver.easy import path
 
-__all__ = ['eq_', 'ok_', 'path', 'TempDir']
+__all__ = ['eq_', 'ok_', 'path', 'TempDir', 'StubServer']
 
 class TempDir(object):
     
@@ -18,4 +25,92 @@ class TempDir(object):
         return self.tmp_dir
         
     def __exit__(self, type, value, traceback):
-        self.tmp_dir.rmtree()
\ No newline at end of file
+        self.tmp_dir.rmtree()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # buffer the response, flushed once the request is handled
+    wbufsize = -1
+    
+    def do_GET(self):
+        self._reply()
+    
+    do_POST = do_GET
+    
+    def _reply(self):
+        stub = self.server.stub
+        length = int(self.headers.get('content-length', 0))
+        body = self.rfile.read(length)
+        stub.requests.append(
+            (self.command, self.path, body, self.headers, self.client_address))
+        if stub.latency:
+            time.sleep(stub.latency)
+        status, headers, content = stub.next_response(self.path)
+        headers = dict(headers)
+        if stub.gzip and 'gzip' in self.headers.get('accept-encoding', ''):
+            buf = StringIO.StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(content)
+            f.close()
+            content = buf.getvalue()
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        headers.setdefault('Content-Type', 'application/json')
+        headers['Content-Length'] = str(len(content))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+    
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(object):
+    """
+    Local HTTP/1.1 server replying with canned responses.
+    
+    Each request gets the next (status, headers, body) of ``responses``,
+    or ``default`` once they are exhausted; ``default`` can also be a
+    function returning the response of a request path. The requests are
+    recorded as (method, path, body, headers, client_address) tuples.
+    
+    ``latency`` is the time, in seconds, the server waits before replying.
+    """
+    
+    def __init__(self, default=(200, {}, ''), gzip=False, latency=0):
+        self.default = default
+        self.responses = []
+        self.requests = []
+        self.gzip = gzip
+        self.latency = latency
+        
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/' % self.server.server_address[1]
+    
+    def next_response(self, path):
+        if self.responses:
+            return self.responses.pop(0)
+        if callable(self.default):
+            return self.default(path)
+        return self.default
+        
+    def __enter__(self):
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.stub = self
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,))
+        self.thread.setDaemon(True)
+        self.thread.start()
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.server.shutdown()
+        self.server.server_close()